@@ -0,0 +1,47 @@
+"""
+Kloset Kifayah Backend - Concurrent Queries
+
+Run independent database queries at the same time, so a route's latency is
+its slowest query rather than the sum of all of them.
+"""
+import asyncio
+from typing import Any, Awaitable, List, Optional, Union
+
+# A query builder (anything with .execute()) or a ready awaitable
+Query = Union[Awaitable[Any], Any]
+
+
+def _awaitable(query: Query) -> Awaitable[Any]:
+    execute = getattr(query, "execute", None)
+    return execute() if callable(execute) else query
+
+
+async def gather_queries(*queries: Query, limit: Optional[int] = None) -> List[Any]:
+    """
+    Execute queries concurrently and return their results in order.
+
+    Args:
+        queries: PostgREST request builders (executed here) or awaitables
+        limit: Maximum number in flight at once (default: all)
+
+    Returns:
+        List of results, one per query
+
+    If any query fails, the others are cancelled and the error is raised.
+    """
+    semaphore = asyncio.Semaphore(limit) if limit else None
+
+    async def run(query: Query) -> Any:
+        if semaphore is None:
+            return await _awaitable(query)
+        async with semaphore:
+            return await _awaitable(query)
+
+    tasks = [asyncio.ensure_future(run(query)) for query in queries]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
@@ -1,7 +1,7 @@
 """
 Kloset Kifayah Backend - API Dependencies
 """
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, status, Query
 from fastapi.security import HTTPAuthorizationCredentials
 from typing import Optional
 from uuid import UUID
@@ -39,6 +39,16 @@ async def get_current_user_optional(
         return None
 
 
+async def get_current_user_streaming(
+    token: Optional[str] = Query(None, description="Access token, for clients that can't set headers (EventSource)"),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+) -> dict:
+    """
+    Get current user from the Authorization header or a `token` query parameter.
+    """
+    return await verify_token(token or extract_token(credentials))
+
+
 async def get_current_user_id(
     current_user: dict = Depends(get_current_user)
 ) -> UUID:
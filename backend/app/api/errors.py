@@ -0,0 +1,42 @@
+"""
+Kloset Kifayah Backend - Database Error Helpers
+
+Recognise Postgres errors surfaced by PostgREST so routes can let the
+database enforce a rule and translate the violation into an HTTP response.
+"""
+from typing import NoReturn
+
+from fastapi import HTTPException, status
+from postgrest.exceptions import APIError
+
+
+# SQLSTATE codes
+EXCLUSION_VIOLATION = "23P01"
+UNIQUE_VIOLATION = "23505"
+NO_DATA_FOUND = "P0002"
+INSUFFICIENT_PRIVILEGE = "42501"
+RAISE_EXCEPTION = "P0001"
+
+# Errors our SQL functions raise on purpose, with a user-facing message
+FUNCTION_ERROR_STATUS = {
+    NO_DATA_FOUND: status.HTTP_404_NOT_FOUND,
+    INSUFFICIENT_PRIVILEGE: status.HTTP_403_FORBIDDEN,
+    RAISE_EXCEPTION: status.HTTP_400_BAD_REQUEST,
+}
+
+
+def violates_constraint(exc: APIError, constraint: str, code: str = EXCLUSION_VIOLATION) -> bool:
+    """Check whether an APIError was raised by the named constraint."""
+    return exc.code == code and constraint in (exc.message or "")
+
+
+def raise_for_function_error(exc: APIError) -> NoReturn:
+    """
+    Re-raise a database function error as an HTTPException.
+    
+    Errors without a known SQLSTATE are re-raised unchanged.
+    """
+    status_code = FUNCTION_ERROR_STATUS.get(exc.code)
+    if status_code is None:
+        raise exc
+    raise HTTPException(status_code=status_code, detail=exc.message)
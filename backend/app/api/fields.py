@@ -0,0 +1,81 @@
+"""
+Kloset Kifayah Backend - Column Projection
+
+Explicit column sets per endpoint instead of `select("*")`, and the
+`fields=` sparse fieldset parameter accepted by list endpoints.
+"""
+from typing import Iterable, Optional, Sequence
+
+from fastapi import HTTPException, status
+
+
+# Listings without search_vector (internal to full-text search)
+LISTING_COLUMNS = (
+    "id", "owner_id", "title", "description", "category", "subcategory",
+    "size", "color", "brand", "condition", "price_per_day", "sell_price",
+    "deposit_amount", "min_rental_days", "max_rental_days", "is_cleaned",
+    "is_smoke_free", "is_pet_free", "is_modest", "tags", "location",
+    "latitude", "longitude", "pickup_instructions", "women_only_pickup",
+    "shipping_available", "status", "is_approved", "view_count",
+    "created_at", "updated_at",
+)
+
+# Rentals without contract_html (served only by the contract endpoint)
+# and period (derived from the dates)
+RENTAL_COLUMNS = (
+    "id", "listing_id", "renter_id", "owner_id", "start_date", "end_date",
+    "total_days", "daily_rate", "deposit_amount", "cleaning_fee",
+    "service_fee", "total_amount", "status", "payment_intent_id",
+    "payment_status", "contract_status", "contract_requested_at",
+    "contract_signed_at",
+    "owner_notes", "renter_notes", "cancellation_reason", "picked_up_at",
+    "returned_at", "add_cleaning_service", "created_at", "updated_at",
+)
+
+# Reviews without is_visible (endpoints only return visible ones)
+REVIEW_COLUMNS = (
+    "id", "rental_id", "reviewer_id", "reviewee_id", "rating", "comment",
+    "review_type", "created_at",
+)
+
+# Messages without is_read (derived from the read watermarks, migration 019)
+MESSAGE_COLUMNS = ("id", "conversation_id", "sender_id", "content", "created_at")
+
+# Image columns embedded in listing responses
+LISTING_IMAGE_COLUMNS = "id, image_url, display_order"
+
+
+def columns(names: Iterable[str]) -> str:
+    """Join column names into a PostgREST select list."""
+    return ", ".join(names)
+
+
+def sparse_columns(
+    fields: Optional[str],
+    allowed: Sequence[str],
+    required: Iterable[str] = ("id",)
+) -> str:
+    """
+    Resolve a `fields=` query parameter to a select list.
+
+    Args:
+        fields: Comma-separated column names from the request (None = all allowed)
+        allowed: Columns the endpoint may return, in output order
+        required: Columns the endpoint needs itself (ids, sort keys), always included
+
+    Returns:
+        Select list for the base table
+    """
+    if not fields:
+        return columns(allowed)
+
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+        )
+
+    wanted = requested.union(required)
+    return columns(name for name in allowed if name in wanted)
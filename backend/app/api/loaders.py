@@ -0,0 +1,114 @@
+"""
+Kloset Kifayah Backend - Request-Scoped Batch Loaders
+
+DataLoader-style batching: every `load(id)` issued in the same event-loop
+tick is coalesced into one `in_("id", [...])` query per table, and repeated
+ids within a request are served from the loader's memo.
+"""
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from app.core.supabase import get_supabase_admin_async
+from app.api.fields import LISTING_COLUMNS, columns
+
+
+# Keep each in_() list well inside URL length limits
+MAX_BATCH_SIZE = 100
+
+# Server-side only: routes pick the fields they expose
+PROFILE_COLUMNS = "id, full_name, avatar_url, email, phone, location, is_verified_email, is_verified_phone, is_verified_community, response_rate"
+
+
+class BatchLoader:
+    """Loads rows of one table by a key column, batching and deduplicating."""
+
+    def __init__(self, table: str, columns: str = "*", key: str = "id"):
+        self.table = table
+        self.columns = columns
+        self.key = key
+        self._results: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+        self._scheduled = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def load(self, key: Any) -> Optional[Dict[str, Any]]:
+        """Load one row by key (None if it does not exist)."""
+        key = str(key)
+        future = self._results.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._results[key] = future
+            self._queue.append(key)
+            if not self._scheduled:
+                # Dispatch after every load queued in this tick has joined
+                self._scheduled = True
+                loop.call_soon(self._start_dispatch)
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: Iterable[Any]) -> List[Optional[Dict[str, Any]]]:
+        """Load several rows, in the order of `keys`."""
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(self, row: Dict[str, Any]) -> None:
+        """Seed the memo with a row the caller already has."""
+        key = str(row[self.key])
+        if key not in self._results:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(row)
+            self._results[key] = future
+
+    def _start_dispatch(self) -> None:
+        # Hold a reference so the task isn't collected mid-flight
+        task = asyncio.get_running_loop().create_task(self._dispatch())
+        self._tasks.add(task)
+        task.add_done_callback(self._dispatch_done)
+
+    def _dispatch_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ Batch load from {self.table} failed: {task.exception()}")
+
+    async def _dispatch(self) -> None:
+        keys, self._queue = self._queue, []
+        self._scheduled = False
+        admin = get_supabase_admin_async()
+
+        for start in range(0, len(keys), MAX_BATCH_SIZE):
+            batch = keys[start:start + MAX_BATCH_SIZE]
+            try:
+                response = await admin.table(self.table).select(self.columns).in_(
+                    self.key, batch
+                ).execute()
+            except Exception as exc:
+                for key in batch:
+                    # Forget the failure so a later load can retry
+                    future = self._results.pop(key)
+                    if not future.done():
+                        future.set_exception(exc)
+                        future.exception()
+                continue
+
+            rows = {str(row[self.key]): row for row in response.data or []}
+            for key in batch:
+                future = self._results[key]
+                if not future.done():
+                    future.set_result(rows.get(key))
+
+
+class Loaders:
+    """The batch loaders for one request."""
+
+    def __init__(self):
+        self.profiles = BatchLoader("profiles", PROFILE_COLUMNS)
+        self.listings = BatchLoader("listings", columns(LISTING_COLUMNS))
+
+
+def get_loaders() -> Loaders:
+    """
+    FastAPI dependency: a fresh set of loaders per request.
+
+    FastAPI caches dependencies per request, so every `Depends(get_loaders)`
+    in one request shares the same instance.
+    """
+    return Loaders()
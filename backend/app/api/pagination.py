@@ -0,0 +1,185 @@
+"""
+Kloset Kifayah Backend - Pagination Helpers
+
+Offset and keyset (cursor) pagination for list endpoints.
+"""
+from fastapi import HTTPException, status
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+import base64
+import json
+
+
+# Tie-breakers for seeking to a bare sort value (no row id)
+MIN_UUID = "00000000-0000-0000-0000-000000000000"
+MAX_UUID = "ffffffff-ffff-ffff-ffff-ffffffffffff"
+
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    """Encode cursor values as an opaque URL-safe string."""
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Decode a cursor produced by `encode_cursor`.
+    
+    Raises:
+        HTTPException: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        values = None
+    
+    if not isinstance(values, dict):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return values
+
+
+def quote_filter_value(value: Any) -> str:
+    """Quote a value for use inside a PostgREST `or`/`and` filter."""
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+class Pagination:
+    """
+    Pagination state for one list request.
+    
+    Without a cursor the request is served by offset (`page`). With a
+    cursor, rows after the last seen `(sort_column, id)` are returned, so
+    every page costs the same regardless of depth. Both modes hand back a
+    `next_cursor`. The exact count is only computed when `include_total`
+    is set (defaults to on for offset pages, off for cursor pages).
+    
+    Orders that can't be expressed as a keyset (e.g. search relevance) pass
+    `keyset=False`; their cursor then carries the next offset instead.
+    """
+    
+    def __init__(
+        self,
+        page: int,
+        per_page: int,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None,
+        sort_column: str = "created_at",
+        descending: bool = True,
+        keyset: bool = True
+    ):
+        self.page = page
+        self.per_page = per_page
+        self.sort_column = sort_column
+        self.descending = descending
+        self.keyset = keyset
+        self.cursor = decode_cursor(cursor) if cursor else None
+        
+        if self.cursor is not None:
+            if self.cursor.get("s") != sort_column:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Cursor does not match the requested sort order"
+                )
+            try:
+                if keyset:
+                    self.cursor["id"] = str(UUID(str(self.cursor.get("id"))))
+                else:
+                    self.cursor["o"] = max(int(self.cursor.get("o")), 0)
+            except (TypeError, ValueError):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Invalid cursor"
+                )
+        
+        self.include_total = include_total if include_total is not None else self.cursor is None
+    
+    def seek(self, value: Any, row_id: Optional[str] = None) -> None:
+        """
+        Start after a known position instead of a cursor, e.g. the newest
+        message a client already holds.
+        
+        Without `row_id`, rows tied with `value` are skipped as well.
+        """
+        if row_id is None:
+            row_id = MIN_UUID if self.descending else MAX_UUID
+        self.cursor = {"s": self.sort_column, "v": value, "id": str(row_id)}
+    
+    @property
+    def count(self) -> Optional[str]:
+        """Count method to pass to `select()`."""
+        return "exact" if self.include_total else None
+    
+    @property
+    def offset(self) -> int:
+        """Row offset (0 for keyset cursors)."""
+        if self.cursor is not None:
+            return 0 if self.keyset else self.cursor["o"]
+        return (self.page - 1) * self.per_page
+    
+    @property
+    def cursor_value(self) -> Any:
+        """Sort key value of the last row seen, if paging by keyset cursor."""
+        return self.cursor["v"] if self.cursor is not None and self.keyset else None
+    
+    @property
+    def cursor_id(self) -> Optional[str]:
+        """Id of the last row seen, if paging by keyset cursor."""
+        return self.cursor["id"] if self.cursor is not None and self.keyset else None
+    
+    def window(self, query):
+        """Apply just the row window (for queries that are already ordered)."""
+        # One extra row tells us whether there is a next page
+        return query.range(self.offset, self.offset + self.per_page)
+    
+    def apply(self, query):
+        """Apply ordering, the keyset filter and the row window to a query."""
+        column = self.sort_column
+        
+        if self.cursor_id is not None:
+            op = "lt" if self.descending else "gt"
+            value = quote_filter_value(self.cursor_value)
+            query = query.or_(
+                f"{column}.{op}.{value},"
+                f"and({column}.eq.{value},id.{op}.{self.cursor_id})"
+            )
+        
+        query = query.order(column, desc=self.descending).order("id", desc=self.descending)
+        
+        return self.window(query)
+    
+    def response(self, rows: Optional[List[dict]], total: Optional[int] = None) -> dict:
+        """Build the list response, trimming the look-ahead row."""
+        rows = rows or []
+        items = rows[:self.per_page]
+        
+        next_cursor = None
+        if len(rows) > self.per_page and items:
+            if self.keyset:
+                last = items[-1]
+                value = last.get(self.sort_column)
+                if value is None:
+                    # A NULL key can't be compared; it would restart from the top
+                    raise ValueError(f"Keyset sort column {self.sort_column} is NULL for row {last['id']}")
+                next_cursor = encode_cursor({
+                    "s": self.sort_column,
+                    "v": value,
+                    "id": last["id"]
+                })
+            else:
+                next_cursor = encode_cursor({
+                    "s": self.sort_column,
+                    "o": self.offset + self.per_page
+                })
+        
+        return {
+            "items": items,
+            "total": (total or 0) if self.include_total else None,
+            "page": self.page,
+            "per_page": self.per_page,
+            "next_cursor": next_cursor
+        }
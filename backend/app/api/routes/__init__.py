@@ -9,3 +9,4 @@ from .messages import router as messages_router
 from .reviews import router as reviews_router
 from .uploads import router as uploads_router
 from .admin import router as admin_router
+from .events import router as events_router
@@ -4,10 +4,15 @@ Kloset Kifayah Backend - Admin Routes
 from fastapi import APIRouter, HTTPException, status, Depends, Query
 from typing import Optional
 from uuid import UUID
+from datetime import datetime, timezone
 from pydantic import BaseModel
 
-from app.core.supabase import get_supabase_admin
+from app.core.supabase import get_supabase_admin_async
+from app.core.config import get_settings
+from app.core.cache import get_cache
 from app.api.deps import require_admin
+from app.api.pagination import Pagination
+from app.api.fields import LISTING_COLUMNS, LISTING_IMAGE_COLUMNS, columns
 from app.schemas.common import SuccessResponse
 
 
@@ -24,30 +29,27 @@ class CommunityCodeCreate(BaseModel):
 async def get_pending_listings(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
+    include_total: Optional[bool] = Query(None),
     _: dict = Depends(require_admin())
 ):
     """
     Get listings pending approval (admin only).
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
+    pagination = Pagination(page, per_page, cursor, include_total)
     
     query = admin.table("listings").select(
-        "*, listing_images(*), profiles!owner_id(full_name, email)",
-        count="exact"
+        f"{columns(LISTING_COLUMNS)}, listing_images({LISTING_IMAGE_COLUMNS}), "
+        "profiles!owner_id(full_name, email)",
+        count=pagination.count
     ).eq("is_approved", False).eq("status", "pending")
     
-    offset = (page - 1) * per_page
-    query = query.range(offset, offset + per_page - 1)
-    query = query.order("created_at", desc=True)
+    query = pagination.apply(query)
     
-    response = query.execute()
+    response = await query.execute()
     
-    return {
-        "items": response.data,
-        "total": response.count or 0,
-        "page": page,
-        "per_page": per_page
-    }
+    return pagination.response(response.data, response.count)
 
 
 @router.post("/listings/{listing_id}/approve", response_model=SuccessResponse)
@@ -58,10 +60,10 @@ async def approve_listing(
     """
     Approve a pending listing (admin only).
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
     # Check listing exists
-    existing = admin.table("listings").select("id, status").eq(
+    existing = await admin.table("listings").select("id, status, owner_id").eq(
         "id", str(listing_id)
     ).single().execute()
     
@@ -77,11 +79,15 @@ async def approve_listing(
             detail="Listing is not pending approval"
         )
     
-    admin.table("listings").update({
+    await admin.table("listings").update({
         "is_approved": True,
         "status": "active"
     }).eq("id", str(listing_id)).execute()
     
+    await get_cache().invalidate(
+        f"listing:{listing_id}", "listings", f"user:{existing.data['owner_id']}"
+    )
+    
     return SuccessResponse(message="Listing approved")
 
 
@@ -94,9 +100,9 @@ async def reject_listing(
     """
     Reject a pending listing (admin only).
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
-    existing = admin.table("listings").select("id").eq(
+    existing = await admin.table("listings").select("id, owner_id").eq(
         "id", str(listing_id)
     ).single().execute()
     
@@ -106,11 +112,15 @@ async def reject_listing(
             detail="Listing not found"
         )
     
-    admin.table("listings").update({
+    await admin.table("listings").update({
         "is_approved": False,
         "status": "inactive"
     }).eq("id", str(listing_id)).execute()
     
+    await get_cache().invalidate(
+        f"listing:{listing_id}", "listings", f"user:{existing.data['owner_id']}"
+    )
+    
     # TODO: Send notification to user with reason
     
     return SuccessResponse(message="Listing rejected")
@@ -120,27 +130,23 @@ async def reject_listing(
 async def get_community_codes(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
+    include_total: Optional[bool] = Query(None),
     _: dict = Depends(require_admin())
 ):
     """
     Get all community invite codes (admin only).
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
+    pagination = Pagination(page, per_page, cursor, include_total)
     
-    query = admin.table("community_codes").select("*", count="exact")
+    query = admin.table("community_codes").select("*", count=pagination.count)
     
-    offset = (page - 1) * per_page
-    query = query.range(offset, offset + per_page - 1)
-    query = query.order("created_at", desc=True)
+    query = pagination.apply(query)
     
-    response = query.execute()
+    response = await query.execute()
     
-    return {
-        "items": response.data,
-        "total": response.count or 0,
-        "page": page,
-        "per_page": per_page
-    }
+    return pagination.response(response.data, response.count)
 
 
 @router.post("/codes")
@@ -151,10 +157,10 @@ async def create_community_code(
     """
     Create a new community invite code (admin only).
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
     # Check if code already exists
-    existing = admin.table("community_codes").select("id").eq(
+    existing = await admin.table("community_codes").select("id").eq(
         "code", code_data.code
     ).execute()
     
@@ -164,7 +170,7 @@ async def create_community_code(
             detail="Code already exists"
         )
     
-    response = admin.table("community_codes").insert({
+    response = await admin.table("community_codes").insert({
         "code": code_data.code,
         "name": code_data.name,
         "uses_remaining": code_data.uses_remaining,
@@ -183,9 +189,9 @@ async def deactivate_code(
     """
     Deactivate a community code (admin only).
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
-    admin.table("community_codes").update({
+    await admin.table("community_codes").update({
         "is_active": False
     }).eq("id", str(code_id)).execute()
     
@@ -193,49 +199,49 @@ async def deactivate_code(
 
 
 @router.get("/stats")
-async def get_admin_stats(_: dict = Depends(require_admin())):
+async def get_admin_stats(
+    refresh: bool = Query(False, description="Recompute instead of serving the cached snapshot"),
+    _: dict = Depends(require_admin())
+):
     """
     Get platform statistics (admin only).
+    
+    Served from a short-lived snapshot shared by every open dashboard;
+    `refresh=true` recomputes it.
     """
-    admin = get_supabase_admin()
+    cache = get_cache()
+    key = "admin:stats"
     
-    # Users
-    total_users = admin.table("profiles").select("id", count="exact").execute()
-    verified_users = admin.table("profiles").select("id", count="exact").eq(
-        "is_verified_community", True
-    ).execute()
+    if not refresh:
+        cached = await cache.get(key)
+        if cached is not None:
+            return cached
     
-    # Listings
-    total_listings = admin.table("listings").select("id", count="exact").execute()
-    pending_listings = admin.table("listings").select("id", count="exact").eq(
-        "status", "pending"
-    ).execute()
-    active_listings = admin.table("listings").select("id", count="exact").eq(
-        "status", "active"
-    ).execute()
+    admin = get_supabase_admin_async()
     
-    # Rentals
-    total_rentals = admin.table("rentals").select("id", count="exact").execute()
-    completed_rentals = admin.table("rentals").select("id", count="exact").eq(
-        "status", "completed"
-    ).execute()
-    active_rentals = admin.table("rentals").select("id", count="exact").in_(
-        "status", ["pending", "accepted", "picked_up"]
-    ).execute()
+    # One pass per table (see migration 015)
+    response = await admin.rpc("admin_dashboard_stats", {}).execute()
+    counts = response.data[0] if response.data else {}
+    counts = {name: value or 0 for name, value in counts.items()}
     
-    return {
+    stats = {
         "users": {
-            "total": total_users.count or 0,
-            "verified": verified_users.count or 0
+            "total": counts.get("total_users", 0),
+            "verified": counts.get("verified_users", 0)
         },
         "listings": {
-            "total": total_listings.count or 0,
-            "pending": pending_listings.count or 0,
-            "active": active_listings.count or 0
+            "total": counts.get("total_listings", 0),
+            "pending": counts.get("pending_listings", 0),
+            "active": counts.get("active_listings", 0)
         },
         "rentals": {
-            "total": total_rentals.count or 0,
-            "completed": completed_rentals.count or 0,
-            "active": active_rentals.count or 0
-        }
+            "total": counts.get("total_rentals", 0),
+            "completed": counts.get("completed_rentals", 0),
+            "active": counts.get("active_rentals", 0)
+        },
+        "generated_at": datetime.now(timezone.utc).isoformat()
     }
+    
+    await cache.set(key, stats, get_settings().cache_ttl_admin_stats)
+    
+    return stats
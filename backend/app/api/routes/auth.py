@@ -2,10 +2,11 @@
 Kloset Kifayah Backend - Auth Routes
 """
 from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 
-from app.core.supabase import get_supabase_client, get_supabase_admin
+from app.core.supabase import get_supabase_client, get_supabase_admin_async
 from app.api.deps import get_current_user
 from app.schemas.common import SuccessResponse
 
@@ -48,8 +49,8 @@ async def signup(request: SignupRequest):
     try:
         # Validate community code if provided
         if request.community_code:
-            admin = get_supabase_admin()
-            code_response = admin.table("community_codes").select("*").eq(
+            admin = get_supabase_admin_async()
+            code_response = await admin.table("community_codes").select("*").eq(
                 "code", request.community_code
             ).eq("is_active", True).execute()
             
@@ -67,7 +68,7 @@ async def signup(request: SignupRequest):
                 )
         
         # Sign up with Supabase Auth
-        response = client.auth.sign_up({
+        response = await run_in_threadpool(client.auth.sign_up, {
             "email": request.email,
             "password": request.password,
             "options": {
@@ -86,8 +87,8 @@ async def signup(request: SignupRequest):
         
         # Update profile with community verification
         if request.community_code and response.user:
-            admin = get_supabase_admin()
-            admin.table("profiles").update({
+            admin = get_supabase_admin_async()
+            await admin.table("profiles").update({
                 "full_name": request.full_name,
                 "community_code": request.community_code,
                 "is_verified_community": True
@@ -96,7 +97,7 @@ async def signup(request: SignupRequest):
             # Decrement uses_remaining if applicable
             code = code_response.data[0]
             if code.get("uses_remaining") is not None:
-                admin.table("community_codes").update({
+                await admin.table("community_codes").update({
                     "uses_remaining": code["uses_remaining"] - 1
                 }).eq("id", code["id"]).execute()
         
@@ -124,7 +125,7 @@ async def login(request: LoginRequest):
     client = get_supabase_client()
     
     try:
-        response = client.auth.sign_in_with_password({
+        response = await run_in_threadpool(client.auth.sign_in_with_password, {
             "email": request.email,
             "password": request.password
         })
@@ -157,7 +158,7 @@ async def logout(current_user: dict = Depends(get_current_user)):
     client = get_supabase_client()
     
     try:
-        client.auth.sign_out()
+        await run_in_threadpool(client.auth.sign_out)
         return SuccessResponse(message="Logged out successfully")
     except Exception as e:
         raise HTTPException(
@@ -174,7 +175,7 @@ async def refresh_token(request: TokenRefreshRequest):
     client = get_supabase_client()
     
     try:
-        response = client.auth.refresh_session(request.refresh_token)
+        response = await run_in_threadpool(client.auth.refresh_session, request.refresh_token)
         
         if not response.user or not response.session:
             raise HTTPException(
@@ -201,10 +202,10 @@ async def get_me(current_user: dict = Depends(get_current_user)):
     """
     Get current authenticated user info.
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
     # Get profile data
-    profile_response = admin.table("profiles").select("*").eq(
+    profile_response = await admin.table("profiles").select("*").eq(
         "id", current_user["id"]
     ).single().execute()
     
@@ -222,7 +223,7 @@ async def resend_verification(current_user: dict = Depends(get_current_user)):
     client = get_supabase_client()
     
     try:
-        client.auth.resend({
+        await run_in_threadpool(client.auth.resend, {
             "type": "signup",
             "email": current_user["email"]
         })
@@ -0,0 +1,108 @@
+"""
+Kloset Kifayah Backend - Event Stream Routes
+"""
+import asyncio
+import json
+from fastapi import APIRouter, HTTPException, status, Depends, Header
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Optional
+
+from app.core.config import get_settings
+from app.core.realtime import ConnectionLimitExceeded, Event, get_broker
+from app.api.deps import get_current_user_streaming
+
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+
+def summarize(event: Event) -> Event:
+    """Keep stream events light: drop message bodies, keep what badges need."""
+    if event["type"] != "message.created":
+        return event
+    message = event["message"]
+    return {
+        "id": event["id"],
+        "type": event["type"],
+        "conversation_id": event["conversation_id"],
+        "message_id": message["id"],
+        "sender_id": message["sender_id"],
+        "created_at": message["created_at"],
+    }
+
+
+def format_sse(event: Event) -> str:
+    """Encode one event in text/event-stream format."""
+    data = json.dumps(summarize(event), default=str)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+@router.get("/stream")
+async def event_stream(
+    last_event_id: Optional[str] = Header(None),
+    current_user: dict = Depends(get_current_user_streaming)
+):
+    """
+    Server-Sent Events for the authenticated user.
+
+    Streams `rental.created`, `rental.updated`, `message.created`,
+    `conversation.updated` and `messages.read`, with a comment heartbeat
+    while idle. EventSource can't set headers, so the token may be passed as
+    `?token=`.
+
+    On reconnect the browser sends `Last-Event-ID` and missed events are
+    replayed from a short per-user buffer; if they have aged out a `resync`
+    event is sent and the client should refetch.
+    """
+    broker = get_broker()
+    user_id = current_user["id"]
+
+    # Subscribing takes the connection slot atomically, and before replaying
+    # so nothing published in between is lost
+    try:
+        subscription = await broker.subscribe(user_id)
+    except ConnectionLimitExceeded:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many open event streams"
+        )
+
+    heartbeat = get_settings().realtime_heartbeat_interval
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+
+            replayed = set()
+            if last_event_id:
+                missed = broker.replay(user_id, last_event_id)
+                if missed is None:
+                    yield "event: resync\ndata: {}\n\n"
+                else:
+                    for event in missed:
+                        replayed.add(event["id"])
+                        yield format_sse(event)
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.next(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if event is None:
+                    break
+                if event["id"] not in replayed:
+                    yield format_sse(event)
+        finally:
+            broker.unsubscribe(subscription)
+
+    async def release():
+        broker.unsubscribe(subscription)
+
+    # Also runs if the client leaves before the stream starts
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release)
+    )
@@ -2,28 +2,66 @@
 Kloset Kifayah Backend - Listing Routes
 """
 from fastapi import APIRouter, HTTPException, status, Depends, Query
-from typing import Optional, List
+from typing import Optional, List, NoReturn
 from uuid import UUID
 from datetime import date
 from decimal import Decimal
+from postgrest.exceptions import APIError
 
-from app.core.supabase import get_supabase_admin
+from app.core.supabase import get_supabase_admin_async
+from app.core.config import get_settings
+from app.core.cache import get_cache, cache_key
 from app.api.deps import get_current_user, get_current_user_id, get_current_user_optional
+from app.api.pagination import Pagination
+from app.api.errors import violates_constraint, raise_for_function_error
+from app.api.fields import LISTING_COLUMNS, LISTING_IMAGE_COLUMNS, columns, sparse_columns
 from app.models.listing import (
     ListingCreate, ListingUpdate, Listing, ListingWithOwner,
     ListingAvailabilityCreate, ListingAvailability
 )
 from app.models.enums import ListingCategory, ListingCondition, ListingStatus
 from app.schemas.common import SuccessResponse
+from app.services.trust_service import overall_rating
+from app.services.view_counter import get_view_counter
+from app.utils.geo import bounding_box
 
 
 router = APIRouter(prefix="/listings", tags=["Listings"])
 
 
+# Rental statuses that hold a listing's dates
+BLOCKING_RENTAL_STATUSES = ["pending", "accepted", "picked_up"]
+
+# Geo search: default radius
+DEFAULT_RADIUS_KM = 25.0
+
+
+async def raise_listing_write_error(listing_id: UUID, forbidden_detail: str) -> NoReturn:
+    """
+    Explain why an owner-scoped listing write matched no rows.
+    
+    Only runs on the failure path, so successful writes stay one round trip.
+    """
+    existing = await get_supabase_admin_async().table("listings").select("id").eq(
+        "id", str(listing_id)
+    ).limit(1).execute()
+    
+    if not existing.data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Listing not found"
+        )
+    
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=forbidden_detail
+    )
+
+
 @router.get("")
 async def get_listings(
     # Search and filter
-    query: Optional[str] = Query(None, description="Search in title/description"),
+    query: Optional[str] = Query(None, description="Full-text search over title, description, brand, color and tags"),
     category: Optional[ListingCategory] = Query(None),
     location: Optional[str] = Query(None),
     min_price: Optional[float] = Query(None, ge=0),
@@ -35,30 +73,144 @@ async def get_listings(
     is_cleaned: Optional[bool] = Query(None),
     is_smoke_free: Optional[bool] = Query(None),
     women_only_pickup: Optional[bool] = Query(None),
+    # Geo search
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: float = Query(DEFAULT_RADIUS_KM, gt=0, le=500),
     # Sorting
-    sort_by: str = Query("created_at", regex="^(created_at|price_per_day|view_count)$"),
+    sort_by: str = Query("created_at", regex="^(created_at|price_per_day|view_count|relevance|distance)$"),
     sort_order: str = Query("desc", regex="^(asc|desc)$"),
     # Pagination
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor"),
+    include_total: Optional[bool] = Query(None, description="Compute the exact total (default: only for page-based requests)"),
+    # Projection
+    fields: Optional[str] = Query(None, description="Comma-separated listing columns to return (default: all)"),
+    images: str = Query("all", regex="^(all|first|none)$", description="Embedded images: all, only the first (for cards) or none"),
     # Auth (optional for viewing)
     current_user: Optional[dict] = Depends(get_current_user_optional)
 ):
     """
     Search and filter listings.
     Only shows active, approved listings.
+    
+    `query` uses the listings full-text index; `sort_by=relevance` ranks
+    matches with `ts_rank` through the `search_listings` function.
+    
+    With `lat`/`lon`, results are limited to `radius_km` by the
+    `nearby_listings` function, which prefilters on a bounding box and pages
+    `sort_by=distance` by (distance, id). Each item then carries
+    `distance_km`.
+    
+    `fields` limits the listing columns returned; `images=first` embeds only
+    the cover image.
+    
+    First pages (no cursor, page 1) are served from the response cache.
     """
-    admin = get_supabase_admin()
+    params = {k: v for k, v in locals().items() if k != "current_user"}
+    
+    by_relevance = sort_by == "relevance"
+    if by_relevance and not query:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="sort_by=relevance requires a search query"
+        )
+    
+    geo = lat is not None or lon is not None
+    if geo and (lat is None or lon is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="lat and lon must be provided together"
+        )
+    if sort_by == "distance" and not geo:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="sort_by=distance requires lat and lon"
+        )
+    
+    cache = get_cache()
+    first_page = cursor is None and page == 1
+    if first_page:
+        key = cache_key("listings", **params)
+        cached = await cache.get(key)
+        if cached is not None:
+            return cached
+    
+    admin = get_supabase_admin_async()
+    by_distance = sort_by == "distance"
+    pagination = Pagination(
+        page, per_page, cursor, include_total,
+        sort_column="distance_km" if by_distance else sort_by,
+        descending=(sort_order == "desc"),
+        keyset=not by_relevance
+    )
+    
+    # Ids and sort keys are needed here whatever was asked for
+    required = ["id"]
+    if sort_by in LISTING_COLUMNS:
+        required.append(sort_by)
+    select_columns = sparse_columns(fields, LISTING_COLUMNS, required)
+    if geo:
+        # Computed by nearby_listings / search_listings (migration 021)
+        select_columns += ", distance_km"
+    if images != "none":
+        select_columns += f", listing_images({LISTING_IMAGE_COLUMNS})"
+    select_columns += ", profiles!owner_id(full_name, avatar_url)"
+    
+    # Availability: anti-join against overlapping blocks and rentals
+    filter_dates = available_from is not None or available_to is not None
+    if filter_dates:
+        start = available_from or date.today()
+        end = available_to or start
+        if end < start:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="available_to must be on or after available_from"
+            )
+        select_columns += ", blocked_periods:listing_availability(id), blocking_rentals:rentals(id)"
     
     # Base query - only active and approved
-    db_query = admin.table("listings").select(
-        "*, listing_images(*), profiles!owner_id(full_name, avatar_url)",
-        count="exact"
-    ).eq("status", "active").eq("is_approved", True)
+    if by_relevance:
+        # Rows come back ranked; the function already limits to active + approved
+        db_query = admin.rpc("search_listings", {
+            "search_query": query,
+            "p_lat": lat,
+            "p_lon": lon,
+            "p_radius_km": radius_km if geo else None
+        }, count=pagination.count).select(select_columns)
+    elif geo:
+        # Exact radius check (and distance order) in the database
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+        db_query = admin.rpc("nearby_listings", {
+            "p_lat": lat,
+            "p_lon": lon,
+            "p_radius_km": radius_km,
+            "p_min_lat": min_lat,
+            "p_max_lat": max_lat,
+            "p_min_lon": min_lon,
+            "p_max_lon": max_lon,
+            "p_descending": sort_order == "desc",
+            "p_cursor_id": pagination.cursor_id if by_distance else None,
+            "p_cursor_distance": pagination.cursor_value if by_distance else None
+        }, count=pagination.count).select(select_columns)
+        
+        if query:
+            db_query = db_query.filter("search_vector", "wfts(english)", query)
+    else:
+        db_query = admin.table("listings").select(
+            select_columns, count=pagination.count
+        ).eq("status", "active").eq("is_approved", True)
+        
+        if query:
+            db_query = db_query.filter("search_vector", "wfts(english)", query)
+    
+    if images != "none":
+        db_query = db_query.order("display_order", foreign_table="listing_images")
+    if images == "first":
+        db_query = db_query.limit(1, foreign_table="listing_images")
     
     # Apply filters
-    if query:
-        db_query = db_query.or_(f"title.ilike.%{query}%,description.ilike.%{query}%")
     
     if category:
         db_query = db_query.eq("category", category.value)
@@ -87,23 +239,40 @@ async def get_listings(
     if women_only_pickup is not None:
         db_query = db_query.eq("women_only_pickup", women_only_pickup)
     
-    # Sorting
-    db_query = db_query.order(sort_by, desc=(sort_order == "desc"))
+    if filter_dates:
+        period = f"[{start.isoformat()},{end.isoformat()}]"
+        db_query = db_query.filter("blocked_periods.period", "ov", period)
+        db_query = db_query.filter("blocking_rentals.period", "ov", period)
+        db_query = db_query.in_("blocking_rentals.status", BLOCKING_RENTAL_STATUSES)
+        db_query = db_query.is_("blocked_periods", "null").is_("blocking_rentals", "null")
     
-    # Pagination
-    offset = (page - 1) * per_page
-    db_query = db_query.range(offset, offset + per_page - 1)
+    if by_relevance or by_distance:
+        # Already ordered by the function (which also applies a distance cursor)
+        db_query = pagination.window(db_query)
+    else:
+        # Sorting and pagination (keyset on the sort key + id when a cursor is given)
+        db_query = pagination.apply(db_query)
     
-    response = db_query.execute()
+    response = await db_query.execute()
     
-    # TODO: Filter by availability dates (requires checking listing_availability table)
+    items = response.data or []
+    if filter_dates:
+        for item in items:
+            item.pop("blocked_periods", None)
+            item.pop("blocking_rentals", None)
     
-    return {
-        "items": response.data,
-        "total": response.count or 0,
-        "page": page,
-        "per_page": per_page
-    }
+    result = pagination.response(items, response.count)
+    
+    # Rounded for display only after the cursor has taken the exact value
+    if geo:
+        for item in result["items"]:
+            if item.get("distance_km") is not None:
+                item["distance_km"] = round(item["distance_km"], 2)
+    
+    if first_page:
+        await cache.set(key, result, get_settings().cache_ttl_listings, tags=["listings"])
+    
+    return result
 
 
 @router.post("", response_model=Listing)
@@ -115,7 +284,7 @@ async def create_listing(
     Create a new listing.
     Listing will be pending approval.
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
     # Create listing
     listing_data = listing.model_dump(exclude={"images"})
@@ -125,7 +294,7 @@ async def create_listing(
     listing_data["price_per_day"] = float(listing_data["price_per_day"])
     listing_data["deposit_amount"] = float(listing_data["deposit_amount"])
     
-    response = admin.table("listings").insert(listing_data).execute()
+    response = await admin.table("listings").insert(listing_data).execute()
     
     if not response.data:
         raise HTTPException(
@@ -145,14 +314,11 @@ async def create_listing(
             }
             for i, url in enumerate(listing.images)
         ]
-        admin.table("listing_images").insert(images_data).execute()
+        await admin.table("listing_images").insert(images_data).execute()
     
-    # Return full listing with images
-    result = admin.table("listings").select(
-        "*, listing_images(*)"
-    ).eq("id", listing_id).single().execute()
+    await get_cache().invalidate(f"user:{current_user_id}")
     
-    return result.data
+    return response.data[0]
 
 
 @router.get("/{listing_id}")
@@ -162,22 +328,35 @@ async def get_listing(
 ):
     """
     Get a single listing by ID.
-    Increments view count.
+    Counts a view (buffered and written in batches, so this stays a read).
     """
-    admin = get_supabase_admin()
-    
-    response = admin.table("listings").select(
-        "*, listing_images(*), profiles!owner_id(id, full_name, avatar_url, is_verified_email, is_verified_phone, is_verified_community, response_rate)"
-    ).eq("id", str(listing_id)).single().execute()
-    
-    if not response.data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Listing not found"
+    admin = get_supabase_admin_async()
+    cache = get_cache()
+    key = f"listing:{listing_id}"
+    
+    listing = await cache.get(key)
+    if listing is None:
+        response = await admin.table("listings").select(
+            f"{columns(LISTING_COLUMNS)}, listing_images(*), profiles!owner_id(id, full_name, avatar_url, is_verified_email, is_verified_phone, is_verified_community, response_rate, "
+            "profile_stats(owner_rating_sum, owner_rating_count, renter_rating_sum, renter_rating_count))"
+        ).eq("id", str(listing_id)).single().execute()
+        
+        if not response.data:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Listing not found"
+            )
+        
+        listing = response.data
+        
+        # Owner rating comes from the owner's precomputed stats
+        owner = listing.get("profiles") or {}
+        listing["owner_rating"] = overall_rating(owner.pop("profile_stats", None))
+        await cache.set(
+            key, listing, get_settings().cache_ttl_listing,
+            tags=[key, f"user:{listing['owner_id']}"]
         )
     
-    listing = response.data
-    
     # Check if user can view (owner can view their own non-approved listings)
     is_owner = current_user and current_user.get("id") == listing["owner_id"]
     if not listing["is_approved"] and not is_owner:
@@ -186,24 +365,9 @@ async def get_listing(
             detail="Listing not found"
         )
     
-    # Increment view count (don't count owner views)
+    # Count the view (don't count owner views)
     if not is_owner:
-        admin.table("listings").update({
-            "view_count": listing["view_count"] + 1
-        }).eq("id", str(listing_id)).execute()
-    
-    # Get owner stats
-    owner_id = listing["owner_id"]
-    reviews_response = admin.table("reviews").select("rating").eq(
-        "reviewee_id", owner_id
-    ).execute()
-    
-    owner_rating = None
-    if reviews_response.data:
-        ratings = [r["rating"] for r in reviews_response.data]
-        owner_rating = round(sum(ratings) / len(ratings), 1) if ratings else None
-    
-    listing["owner_rating"] = owner_rating
+        get_view_counter().record(str(listing_id))
     
     return listing
 
@@ -217,24 +381,7 @@ async def update_listing(
     """
     Update a listing. Only owner can update.
     """
-    admin = get_supabase_admin()
-    
-    # Check ownership
-    existing = admin.table("listings").select("owner_id").eq(
-        "id", str(listing_id)
-    ).single().execute()
-    
-    if not existing.data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Listing not found"
-        )
-    
-    if existing.data["owner_id"] != str(current_user_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only update your own listings"
-        )
+    admin = get_supabase_admin_async()
     
     # Filter out None values
     update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
@@ -251,16 +398,17 @@ async def update_listing(
             detail="No fields to update"
         )
     
-    response = admin.table("listings").update(update_dict).eq(
+    # Scoped to the owner; the updated row comes back with the response
+    response = await admin.table("listings").update(update_dict).eq(
         "id", str(listing_id)
-    ).execute()
+    ).eq("owner_id", str(current_user_id)).execute()
+    
+    if not response.data:
+        await raise_listing_write_error(listing_id, "You can only update your own listings")
     
-    # Return full listing
-    result = admin.table("listings").select(
-        "*, listing_images(*)"
-    ).eq("id", str(listing_id)).single().execute()
+    await get_cache().invalidate(f"listing:{listing_id}", "listings", f"user:{current_user_id}")
     
-    return result.data
+    return response.data[0]
 
 
 @router.delete("/{listing_id}", response_model=SuccessResponse)
@@ -270,38 +418,21 @@ async def delete_listing(
 ):
     """
     Delete a listing. Only owner can delete.
+    Listings with active rentals are refused by the database (see migration 016).
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
-    # Check ownership
-    existing = admin.table("listings").select("owner_id").eq(
-        "id", str(listing_id)
-    ).single().execute()
+    try:
+        response = await admin.table("listings").delete().eq(
+            "id", str(listing_id)
+        ).eq("owner_id", str(current_user_id)).execute()
+    except APIError as exc:
+        raise_for_function_error(exc)
     
-    if not existing.data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Listing not found"
-        )
-    
-    if existing.data["owner_id"] != str(current_user_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only delete your own listings"
-        )
-    
-    # Check for active rentals
-    active_rentals = admin.table("rentals").select("id", count="exact").eq(
-        "listing_id", str(listing_id)
-    ).in_("status", ["pending", "accepted", "picked_up"]).execute()
-    
-    if active_rentals.count and active_rentals.count > 0:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cannot delete listing with active rentals"
-        )
+    if not response.data:
+        await raise_listing_write_error(listing_id, "You can only delete your own listings")
     
-    admin.table("listings").delete().eq("id", str(listing_id)).execute()
+    await get_cache().invalidate(f"listing:{listing_id}", "listings", f"user:{current_user_id}")
     
     return SuccessResponse(message="Listing deleted successfully")
 
@@ -311,13 +442,20 @@ async def get_listing_availability(listing_id: UUID):
     """
     Get blocked dates for a listing.
     """
-    admin = get_supabase_admin()
-    
-    response = admin.table("listing_availability").select("*").eq(
-        "listing_id", str(listing_id)
-    ).gte("end_date", date.today().isoformat()).order("start_date").execute()
-    
-    return response.data
+    admin = get_supabase_admin_async()
+    
+    async def load():
+        response = await admin.table("listing_availability").select("*").eq(
+            "listing_id", str(listing_id)
+        ).gte("end_date", date.today().isoformat()).order("start_date").execute()
+        return response.data
+    
+    return await get_cache().get_or_set(
+        cache_key(f"listing:{listing_id}:availability", day=date.today()),
+        load,
+        get_settings().cache_ttl_listing,
+        tags=[f"listing:{listing_id}"]
+    )
 
 
 @router.post("/{listing_id}/availability", response_model=ListingAvailability)
@@ -329,44 +467,34 @@ async def block_dates(
     """
     Block dates on a listing (owner only).
     """
-    admin = get_supabase_admin()
-    
-    # Check ownership
-    existing = admin.table("listings").select("owner_id").eq(
-        "id", str(listing_id)
-    ).single().execute()
-    
-    if not existing.data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Listing not found"
-        )
-    
-    if existing.data["owner_id"] != str(current_user_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only manage your own listings"
-        )
-    
-    # Check for conflicts
-    conflicts = admin.table("listing_availability").select("id").eq(
-        "listing_id", str(listing_id)
-    ).or_(
-        f"and(start_date.lte.{availability.end_date},end_date.gte.{availability.start_date})"
-    ).execute()
-    
-    if conflicts.data:
+    # Caught here: the database would fail building the daterange instead
+    if availability.end_date < availability.start_date:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Dates conflict with existing blocked period"
+            detail="End date must be on or after start date"
         )
     
-    response = admin.table("listing_availability").insert({
-        "listing_id": str(listing_id),
-        "start_date": availability.start_date.isoformat(),
-        "end_date": availability.end_date.isoformat(),
-        "reason": availability.reason
-    }).execute()
+    admin = get_supabase_admin_async()
+    
+    # Ownership is checked in the same call (migration 016);
+    # overlaps are rejected by the database (migration 013)
+    try:
+        response = await admin.rpc("block_listing_dates", {
+            "p_listing_id": str(listing_id),
+            "p_actor_id": str(current_user_id),
+            "p_start_date": availability.start_date.isoformat(),
+            "p_end_date": availability.end_date.isoformat(),
+            "p_reason": availability.reason
+        }).execute()
+    except APIError as exc:
+        if violates_constraint(exc, "listing_availability_no_overlap"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Dates conflict with existing blocked period"
+            )
+        raise_for_function_error(exc)
+    
+    await get_cache().invalidate(f"listing:{listing_id}", "listings")
     
     return response.data[0]
 
@@ -381,36 +509,18 @@ async def unblock_dates(
     Remove a blocked date range (owner only).
     Cannot remove blocks caused by rentals.
     """
-    admin = get_supabase_admin()
-    
-    # Check ownership
-    existing = admin.table("listings").select("owner_id").eq(
-        "id", str(listing_id)
-    ).single().execute()
-    
-    if not existing.data or existing.data["owner_id"] != str(current_user_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You can only manage your own listings"
-        )
-    
-    # Check if it's a rental block
-    block = admin.table("listing_availability").select("*").eq(
-        "id", str(availability_id)
-    ).single().execute()
-    
-    if not block.data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Blocked period not found"
-        )
-    
-    if block.data.get("rental_id"):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cannot remove blocks caused by rentals"
-        )
-    
-    admin.table("listing_availability").delete().eq("id", str(availability_id)).execute()
+    admin = get_supabase_admin_async()
+    
+    # Ownership and rental-block checks run with the delete (migration 016)
+    try:
+        await admin.rpc("unblock_listing_dates", {
+            "p_listing_id": str(listing_id),
+            "p_actor_id": str(current_user_id),
+            "p_availability_id": str(availability_id)
+        }).execute()
+    except APIError as exc:
+        raise_for_function_error(exc)
+    
+    await get_cache().invalidate(f"listing:{listing_id}", "listings")
     
     return SuccessResponse(message="Blocked period removed")
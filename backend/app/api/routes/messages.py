@@ -1,12 +1,22 @@
 """
 Kloset Kifayah Backend - Message Routes
 """
-from fastapi import APIRouter, HTTPException, status, Depends, Query
-from typing import Optional
+import asyncio
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, status, Depends, Query, WebSocket, WebSocketDisconnect
+from typing import Any, Optional
 from uuid import UUID
+from postgrest.exceptions import APIError
 
-from app.core.supabase import get_supabase_admin
+from app.core.supabase import get_supabase_admin_async
+from app.core.realtime import ConnectionLimitExceeded, get_broker
+from app.core.security import verify_token
 from app.api.deps import get_current_user_id
+from app.api.pagination import Pagination
+from app.api.concurrency import gather_queries
+from app.api.errors import raise_for_function_error
+from app.api.fields import MESSAGE_COLUMNS, columns
+from app.api.loaders import Loaders, get_loaders
 from app.models.message import MessageCreate, ConversationCreate, Conversation, Message
 from app.schemas.common import SuccessResponse
 
@@ -14,75 +24,200 @@ from app.schemas.common import SuccessResponse
 router = APIRouter(prefix="/conversations", tags=["Messages"])
 
 
+async def publish_message(participants: list, message: dict) -> None:
+    """Push a new message, and the inbox bump it causes, to both participants."""
+    broker = get_broker()
+    await broker.publish(participants, {
+        "type": "message.created",
+        "conversation_id": message["conversation_id"],
+        "message": message,
+    })
+    await broker.publish(participants, {
+        "type": "conversation.updated",
+        "conversation_id": message["conversation_id"],
+        "last_message_at": message["created_at"],
+    })
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse a PostgREST timestamptz."""
+    return datetime.fromisoformat(value) if value else None
+
+
+def parse_anchor_timestamp(value: str) -> str:
+    """
+    Validate a since/before timestamp.
+    
+    Raises:
+        HTTPException: If it is neither a message id nor an ISO timestamp
+    """
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).isoformat()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="since/before must be a message id or an ISO timestamp"
+        )
+
+
+def last_read_at(conversation: dict, user_id: str) -> Optional[datetime]:
+    """A participant's read watermark (see migration 019)."""
+    if conversation["participant_1"] == user_id:
+        return parse_timestamp(conversation.get("participant_1_last_read_at"))
+    return parse_timestamp(conversation.get("participant_2_last_read_at"))
+
+
+def apply_read_state(messages: list, conversation: dict) -> None:
+    """Set each message's is_read from its recipient's watermark."""
+    for message in messages:
+        if message["sender_id"] == conversation["participant_1"]:
+            recipient = conversation["participant_2"]
+        else:
+            recipient = conversation["participant_1"]
+        watermark = last_read_at(conversation, recipient)
+        message["is_read"] = watermark is not None and parse_timestamp(message["created_at"]) <= watermark
+
+
+async def mark_conversation_read(
+    conversation_id: Any,
+    user_id: Any,
+    read_at: Optional[datetime] = None
+) -> None:
+    """
+    Move the user's read watermark (one row update) and tell the other
+    participant.
+    
+    Args:
+        conversation_id: Conversation being read
+        user_id: Reader
+        read_at: Newest message the reader was shown (default: now)
+    """
+    try:
+        response = await get_supabase_admin_async().rpc("mark_conversation_read", {
+            "p_conversation_id": str(conversation_id),
+            "p_user_id": str(user_id),
+            "p_read_at": read_at.isoformat() if read_at else None,
+        }).execute()
+    except APIError as exc:
+        raise_for_function_error(exc)
+    
+    read = response.data[0]
+    other_user_id = read["participant_2"] if read["participant_1"] == str(user_id) else read["participant_1"]
+    await get_broker().publish([other_user_id], {
+        "type": "messages.read",
+        "conversation_id": str(conversation_id),
+        "reader_id": str(user_id),
+        "read_at": read["last_read_at"],
+    })
+
+
+@router.websocket("/ws")
+async def conversation_events(websocket: WebSocket, token: str = Query(...)):
+    """
+    Realtime events for the authenticated user.
+    
+    Browsers can't set headers on a WebSocket, so the access token is passed
+    as `?token=`. Pushes JSON events:
+    - `message.created`: a message in one of the user's conversations
+    - `conversation.updated`: a conversation moved to the top of the inbox
+    - `messages.read`: the other participant read everything up to `read_at`
+    
+    If the client falls too far behind, the socket is closed and the client
+    should refetch and reconnect. Connections count towards the same per-user
+    limit as the event stream.
+    """
+    try:
+        user = await verify_token(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    # Take the connection slot before accepting, so the limit holds under races
+    broker = get_broker()
+    try:
+        subscription = await broker.subscribe(user["id"])
+    except ConnectionLimitExceeded:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    
+    try:
+        await websocket.accept()
+    except BaseException:
+        broker.unsubscribe(subscription)
+        raise
+    
+    async def send_events():
+        while (event := await subscription.next()) is not None:
+            await websocket.send_json(event)
+    
+    async def receive_until_closed():
+        # Clients don't send anything meaningful; this just notices the close
+        while True:
+            await websocket.receive_text()
+    
+    tasks = [asyncio.create_task(send_events()), asyncio.create_task(receive_until_closed())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        broker.unsubscribe(subscription)
+    
+    try:
+        await websocket.close()
+    except (RuntimeError, WebSocketDisconnect):
+        pass  # Already closed by the client
+
+
 @router.get("")
 async def get_conversations(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
+    include_total: Optional[bool] = Query(None),
     current_user_id: UUID = Depends(get_current_user_id)
 ):
     """
     Get user's conversations.
+    
+    Served by the `get_conversation_inbox` function: one query returns the
+    page with the other user, last message and unread count per conversation.
+    The total, when requested, is counted alongside so it stays right on
+    pages past the end.
     """
-    admin = get_supabase_admin()
-    
-    # Get conversations where user is a participant
-    query = admin.table("conversations").select(
-        "*, listings(id, title, listing_images(image_url)), "
-        "profiles!participant_1(id, full_name, avatar_url), "
-        "profiles!participant_2(id, full_name, avatar_url)",
-        count="exact"
-    ).or_(
-        f"participant_1.eq.{current_user_id},participant_2.eq.{current_user_id}"
+    admin = get_supabase_admin_async()
+    pagination = Pagination(
+        page, per_page, cursor, include_total, sort_column="last_message_at"
     )
     
-    # Pagination
-    offset = (page - 1) * per_page
-    query = query.range(offset, offset + per_page - 1)
-    query = query.order("last_message_at", desc=True)
-    
-    response = query.execute()
-    
-    # Add unread counts and last message
-    conversations = []
-    for conv in response.data or []:
-        # Get last message
-        last_msg = admin.table("messages").select("content, sender_id, created_at").eq(
-            "conversation_id", conv["id"]
-        ).order("created_at", desc=True).limit(1).execute()
-        
-        # Get unread count
-        unread = admin.table("messages").select("id", count="exact").eq(
-            "conversation_id", conv["id"]
-        ).neq("sender_id", str(current_user_id)).eq("is_read", False).execute()
-        
-        # Determine other user
-        if conv["participant_1"] == str(current_user_id):
-            other_user = conv.get("profiles!participant_2")
-            other_user_id = conv["participant_2"]
-        else:
-            other_user = conv.get("profiles!participant_1")
-            other_user_id = conv["participant_1"]
-        
-        conv["other_user_id"] = other_user_id
-        conv["other_user_name"] = other_user.get("full_name") if other_user else None
-        conv["other_user_avatar"] = other_user.get("avatar_url") if other_user else None
-        conv["last_message_content"] = last_msg.data[0]["content"] if last_msg.data else None
-        conv["unread_count"] = unread.count or 0
-        
-        # Get listing image if exists
-        if conv.get("listings") and conv["listings"].get("listing_images"):
-            images = conv["listings"]["listing_images"]
-            conv["listing_image"] = images[0]["image_url"] if images else None
-            conv["listing_title"] = conv["listings"]["title"]
-        
-        conversations.append(conv)
+    # One extra row tells us whether there is a next page
+    inbox = admin.rpc("get_conversation_inbox", {
+        "p_user_id": str(current_user_id),
+        "p_limit": per_page + 1,
+        "p_offset": pagination.offset,
+        "p_cursor_at": pagination.cursor_value,
+        "p_cursor_id": pagination.cursor_id,
+        "p_include_total": False
+    })
     
-    return {
-        "items": conversations,
-        "total": response.count or 0,
-        "page": page,
-        "per_page": per_page
-    }
+    total = None
+    if pagination.include_total:
+        response, counted = await gather_queries(
+            inbox,
+            admin.table("conversations").select("id", count="exact", head=True).or_(
+                f"participant_1.eq.{current_user_id},participant_2.eq.{current_user_id}"
+            )
+        )
+        total = counted.count
+    else:
+        response = await inbox.execute()
+    
+    conversations = response.data or []
+    for conv in conversations:
+        conv.pop("total_count", None)
+    
+    return pagination.response(conversations, total)
 
 
 @router.post("")
@@ -93,47 +228,34 @@ async def create_conversation(
     """
     Start a new conversation or get existing one.
     """
-    admin = get_supabase_admin()
-    
-    # Check if conversation already exists
-    existing = admin.table("conversations").select("id").or_(
-        f"and(participant_1.eq.{current_user_id},participant_2.eq.{data.other_user_id}),"
-        f"and(participant_1.eq.{data.other_user_id},participant_2.eq.{current_user_id})"
-    )
+    admin = get_supabase_admin_async()
     
-    if data.listing_id:
-        existing = existing.eq("listing_id", str(data.listing_id))
+    # One indexed lookup on the participant pair, inserting if missing (migration 020)
+    try:
+        conv = await admin.rpc("find_or_create_conversation", {
+            "p_user_id": str(current_user_id),
+            "p_other_user_id": str(data.other_user_id),
+            "p_listing_id": str(data.listing_id) if data.listing_id else None,
+            "p_rental_id": str(data.rental_id) if data.rental_id else None
+        }).execute()
+    except APIError as exc:
+        raise_for_function_error(exc)
     
-    existing_result = existing.execute()
+    if not conv.data or not conv.data[0]["id"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to create conversation"
+        )
     
-    if existing_result.data:
-        # Use existing conversation
-        conv_id = existing_result.data[0]["id"]
-    else:
-        # Create new conversation
-        conv_data = {
-            "participant_1": str(current_user_id),
-            "participant_2": str(data.other_user_id),
-            "listing_id": str(data.listing_id) if data.listing_id else None,
-            "rental_id": str(data.rental_id) if data.rental_id else None
-        }
-        
-        conv_result = admin.table("conversations").insert(conv_data).execute()
-        
-        if not conv_result.data:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to create conversation"
-            )
-        
-        conv_id = conv_result.data[0]["id"]
+    conv_id = conv.data[0]["id"]
     
     # Send initial message
-    admin.table("messages").insert({
+    sent = await admin.table("messages").insert({
         "conversation_id": conv_id,
         "sender_id": str(current_user_id),
         "content": data.initial_message
     }).execute()
+    await publish_message([str(current_user_id), str(data.other_user_id)], sent.data[0])
     
     return {"conversation_id": conv_id}
 
@@ -143,17 +265,60 @@ async def get_conversation(
     conversation_id: UUID,
     page: int = Query(1, ge=1),
     per_page: int = Query(50, ge=1, le=100),
-    current_user_id: UUID = Depends(get_current_user_id)
+    cursor: Optional[str] = Query(None),
+    include_total: Optional[bool] = Query(None),
+    since: Optional[str] = Query(None, description="Message id or ISO timestamp: only newer messages, oldest first"),
+    before: Optional[str] = Query(None, description="Message id or ISO timestamp: older messages, newest first"),
+    current_user_id: UUID = Depends(get_current_user_id),
+    loaders: Loaders = Depends(get_loaders)
 ):
     """
     Get conversation with messages.
+    
+    Without `since`/`before`, messages are paged newest first. A client that
+    already holds part of the history passes `since` (its newest message) to
+    get just the delta, or `before` (its oldest) to backfill; both seek on
+    the (conversation_id, created_at, id) index and skip the total unless
+    `include_total` is set. To continue either way, pass the last returned
+    message's id as the new `since`/`before`.
     """
-    admin = get_supabase_admin()
+    if since and before:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use either since or before, not both"
+        )
+    anchor = since or before
+    if anchor and cursor:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="since/before can't be combined with a cursor"
+        )
+    
+    admin = get_supabase_admin_async()
     
-    # Get conversation
-    conv = admin.table("conversations").select(
+    # Anchor: a message id (looked up alongside the conversation) or a timestamp
+    anchor_id = None
+    anchor_at = None
+    if anchor:
+        try:
+            anchor_id = str(UUID(anchor))
+        except ValueError:
+            anchor_at = parse_anchor_timestamp(anchor)
+    
+    conv_query = admin.table("conversations").select(
         "*, listings(id, title, listing_images(image_url))"
-    ).eq("id", str(conversation_id)).single().execute()
+    ).eq("id", str(conversation_id)).single()
+    
+    anchor_message = None
+    if anchor_id:
+        conv, anchor_message = await gather_queries(
+            conv_query,
+            admin.table("messages").select("created_at").eq("id", anchor_id).eq(
+                "conversation_id", str(conversation_id)
+            ).limit(1)
+        )
+    else:
+        conv = await conv_query.execute()
     
     if not conv.data:
         raise HTTPException(
@@ -168,18 +333,14 @@ async def get_conversation(
             detail="You don't have access to this conversation"
         )
     
-    # Get messages
-    offset = (page - 1) * per_page
-    messages = admin.table("messages").select(
-        "*, profiles!sender_id(full_name, avatar_url)", count="exact"
-    ).eq("conversation_id", str(conversation_id)).order(
-        "created_at", desc=True
-    ).range(offset, offset + per_page - 1).execute()
-    
-    # Mark messages as read
-    admin.table("messages").update({"is_read": True}).eq(
-        "conversation_id", str(conversation_id)
-    ).neq("sender_id", str(current_user_id)).execute()
+    # Only reported once access is established, so ids can't be probed
+    if anchor_message is not None:
+        if not anchor_message.data:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Unknown message in since/before"
+            )
+        anchor_at = anchor_message.data[0]["created_at"]
     
     # Get other user info
     if conv.data["participant_1"] == str(current_user_id):
@@ -187,19 +348,39 @@ async def get_conversation(
     else:
         other_user_id = conv.data["participant_1"]
     
-    other_user = admin.table("profiles").select(
-        "full_name, avatar_url"
-    ).eq("id", other_user_id).single().execute()
+    # Messages (newest first; oldest first for since) and the other user are independent
+    if anchor and include_total is None:
+        include_total = False
+    pagination = Pagination(page, per_page, cursor, include_total, descending=since is None)
+    if anchor:
+        pagination.seek(anchor_at, anchor_id)
+    messages, other_user = await gather_queries(
+        pagination.apply(
+            admin.table("messages").select(
+                f"{columns(MESSAGE_COLUMNS)}, profiles!sender_id(full_name, avatar_url)", count=pagination.count
+            ).eq("conversation_id", str(conversation_id))
+        ),
+        loaders.profiles.load(other_user_id)
+    )
+    
+    # Read state comes from the watermarks as they were before this view
+    apply_read_state(messages.data or [], conv.data)
+    
+    # Mark read up to the newest message actually returned (not the look-ahead
+    # row, nor anything sent since the fetch), only if that moves the watermark
+    watermark = last_read_at(conv.data, str(current_user_id))
+    shown = [parse_timestamp(message["created_at"]) for message in (messages.data or [])[:per_page]]
+    latest = max(shown, default=None)
+    if latest is not None and (watermark is None or latest > watermark):
+        await mark_conversation_read(conversation_id, current_user_id, latest)
     
     return {
         "conversation": conv.data,
-        "other_user": other_user.data,
-        "messages": {
-            "items": messages.data,
-            "total": messages.count or 0,
-            "page": page,
-            "per_page": per_page
-        }
+        "other_user": {
+            "full_name": other_user.get("full_name"),
+            "avatar_url": other_user.get("avatar_url"),
+        } if other_user else None,
+        "messages": pagination.response(messages.data, messages.count)
     }
 
 
@@ -212,10 +393,10 @@ async def send_message(
     """
     Send a message in a conversation.
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
     # Check access
-    conv = admin.table("conversations").select("participant_1, participant_2").eq(
+    conv = await admin.table("conversations").select("participant_1, participant_2").eq(
         "id", str(conversation_id)
     ).single().execute()
     
@@ -232,7 +413,7 @@ async def send_message(
         )
     
     # Create message
-    response = admin.table("messages").insert({
+    response = await admin.table("messages").insert({
         "conversation_id": str(conversation_id),
         "sender_id": str(current_user_id),
         "content": message.content
@@ -244,6 +425,10 @@ async def send_message(
             detail="Failed to send message"
         )
     
+    await publish_message(
+        [conv.data["participant_1"], conv.data["participant_2"]], response.data[0]
+    )
+    
     return response.data[0]
 
 
@@ -255,10 +440,6 @@ async def mark_read(
     """
     Mark all messages in conversation as read.
     """
-    admin = get_supabase_admin()
-    
-    admin.table("messages").update({"is_read": True}).eq(
-        "conversation_id", str(conversation_id)
-    ).neq("sender_id", str(current_user_id)).execute()
+    await mark_conversation_read(conversation_id, current_user_id)
     
     return SuccessResponse(message="Messages marked as read")
@@ -1,19 +1,31 @@
 """
 Kloset Kifayah Backend - Rental Routes
 """
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request, Response, BackgroundTasks
+from fastapi.responses import JSONResponse
+import gzip
 from typing import Optional
 from uuid import UUID
-from datetime import date, datetime
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
 
-from app.core.supabase import get_supabase_admin
+from app.core.supabase import get_supabase_admin_async
 from app.core.config import get_settings
+from app.core.cache import get_cache
+from app.core.realtime import get_broker
 from app.api.deps import get_current_user, get_current_user_id
+from app.api.pagination import Pagination, quote_filter_value
+from app.api.errors import violates_constraint, raise_for_function_error
+from app.api.fields import RENTAL_COLUMNS, columns, sparse_columns
+from app.api.loaders import Loaders, get_loaders
 from app.models.rental import RentalCreate, Rental, RentalWithDetails, RentalCostBreakdown
 from app.models.enums import RentalStatus
 from app.schemas.common import SuccessResponse
-from app.services.contract_service import generate_contract
+from app.services.contract_service import (
+    build_contract, store_contract, compress_contract, decode_bytea
+)
 from app.services.payment_service import create_payment_intent
 
 
@@ -45,24 +57,121 @@ def calculate_rental_cost(
     )
 
 
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check a request's If-None-Match header against an ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates or "*" in candidates
+
+
+def accepts_encoding(request: Request, coding: str) -> bool:
+    """
+    Check Accept-Encoding for a content coding with a non-zero q-value.
+    
+    An explicit entry for the coding wins over `*`.
+    """
+    wildcard = False
+    for entry in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = entry.partition(";")
+        name = name.strip().lower()
+        if name not in (coding, "*"):
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name == coding:
+            return q > 0
+        wildcard = q > 0
+    return wildcard
+
+
+async def invalidate_rental_caches(rental: dict) -> None:
+    """Drop cached reads that depend on a rental's listing and participants."""
+    await get_cache().invalidate(
+        f"listing:{rental['listing_id']}",
+        "listings",
+        f"user:{rental['owner_id']}",
+        f"user:{rental['renter_id']}",
+    )
+
+
+async def publish_rental_event(event_type: str, rental: dict) -> None:
+    """Notify both parties' open event streams of a new rental or a status change."""
+    await get_broker().publish([rental["owner_id"], rental["renter_id"]], {
+        "type": event_type,
+        "rental_id": rental["id"],
+        "listing_id": rental["listing_id"],
+        "status": rental["status"],
+        "contract_status": rental.get("contract_status"),
+    })
+
+
+async def run_transition(
+    function: str,
+    rental_id: UUID,
+    actor_id: UUID,
+    params: Optional[dict] = None
+) -> dict:
+    """
+    Run a rental state transition function (see migration 014).
+    
+    The function checks the actor and current status and applies all writes
+    in one transaction. Returns the updated rental.
+    """
+    admin = get_supabase_admin_async()
+    
+    try:
+        response = await admin.rpc(function, {
+            "p_rental_id": str(rental_id),
+            "p_actor_id": str(actor_id),
+            **(params or {})
+        }).select(columns(RENTAL_COLUMNS)).execute()
+    except APIError as exc:
+        if violates_constraint(exc, "rentals_blocked_dates") or violates_constraint(
+            exc, "listing_availability_no_overlap"
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Listing is not available for selected dates"
+            )
+        raise_for_function_error(exc)
+    
+    rental = response.data[0]
+    await invalidate_rental_caches(rental)
+    await publish_rental_event("rental.updated", rental)
+    return rental
+
+
 @router.get("")
 async def get_rentals(
     role: str = Query("renter", regex="^(renter|owner|all)$"),
     status_filter: Optional[str] = Query(None, alias="status"),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
+    include_total: Optional[bool] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma-separated rental columns to return (default: all)"),
     current_user_id: UUID = Depends(get_current_user_id)
 ):
     """
     Get user's rentals (as renter or owner).
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
+    pagination = Pagination(page, per_page, cursor, include_total)
     
     query = admin.table("rentals").select(
-        "*, listings(id, title, listing_images(image_url)), "
+        f"{sparse_columns(fields, RENTAL_COLUMNS, ['id', 'created_at'])}, "
+        "listings(id, title, listing_images(image_url)), "
         "profiles!renter_id(full_name, avatar_url), "
         "profiles!owner_id(full_name, avatar_url)",
-        count="exact"
+        count=pagination.count
     )
     
     if role == "renter":
@@ -77,19 +186,11 @@ async def get_rentals(
     if status_filter:
         query = query.eq("status", status_filter)
     
-    # Pagination
-    offset = (page - 1) * per_page
-    query = query.range(offset, offset + per_page - 1)
-    query = query.order("created_at", desc=True)
+    query = pagination.apply(query)
     
-    response = query.execute()
+    response = await query.execute()
     
-    return {
-        "items": response.data,
-        "total": response.count or 0,
-        "page": page,
-        "per_page": per_page
-    }
+    return pagination.response(response.data, response.count)
 
 
 @router.post("", response_model=Rental)
@@ -100,12 +201,12 @@ async def create_rental(
     """
     Create a new rental request.
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
     # Get listing
-    listing = admin.table("listings").select("*").eq(
-        "id", str(rental.listing_id)
-    ).single().execute()
+    listing = await admin.table("listings").select(
+        "owner_id, status, is_approved, price_per_day, deposit_amount, min_rental_days, max_rental_days"
+    ).eq("id", str(rental.listing_id)).single().execute()
     
     if not listing.data:
         raise HTTPException(
@@ -156,32 +257,6 @@ async def create_rental(
             detail=f"Maximum rental period is {listing_data['max_rental_days']} days"
         )
     
-    # Check availability
-    conflicts = admin.table("listing_availability").select("id").eq(
-        "listing_id", str(rental.listing_id)
-    ).or_(
-        f"and(start_date.lte.{rental.end_date},end_date.gte.{rental.start_date})"
-    ).execute()
-    
-    if conflicts.data:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Listing is not available for selected dates"
-        )
-    
-    # Check for pending/active rentals on same dates
-    rental_conflicts = admin.table("rentals").select("id").eq(
-        "listing_id", str(rental.listing_id)
-    ).in_("status", ["pending", "accepted", "picked_up"]).or_(
-        f"and(start_date.lte.{rental.end_date},end_date.gte.{rental.start_date})"
-    ).execute()
-    
-    if rental_conflicts.data:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Listing already has a rental request for these dates"
-        )
-    
     # Calculate costs
     cost = calculate_rental_cost(
         daily_rate=listing_data["price_per_day"],
@@ -213,7 +288,21 @@ async def create_rental(
         "add_cleaning_service": rental.add_cleaning_service
     }
     
-    response = admin.table("rentals").insert(rental_data).execute()
+    # Overlaps are rejected by the database (see migration 013)
+    try:
+        response = await admin.table("rentals").insert(rental_data).execute()
+    except APIError as exc:
+        if violates_constraint(exc, "rentals_no_overlap"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Listing already has a rental request for these dates"
+            )
+        if violates_constraint(exc, "rentals_blocked_dates"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Listing is not available for selected dates"
+            )
+        raise
     
     if not response.data:
         raise HTTPException(
@@ -221,6 +310,9 @@ async def create_rental(
             detail="Failed to create rental request"
         )
     
+    await invalidate_rental_caches(response.data[0])
+    await publish_rental_event("rental.created", response.data[0])
+    
     return response.data[0]
 
 
@@ -232,10 +324,11 @@ async def get_rental(
     """
     Get rental details. Only accessible by renter or owner.
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
-    response = admin.table("rentals").select(
-        "*, listings(id, title, description, category, listing_images(image_url)), "
+    response = await admin.table("rentals").select(
+        f"{columns(RENTAL_COLUMNS)}, "
+        "listings(id, title, description, category, listing_images(image_url)), "
         "profiles!renter_id(full_name, avatar_url, phone), "
         "profiles!owner_id(full_name, avatar_url, phone)"
     ).eq("id", str(rental_id)).single().execute()
@@ -261,54 +354,22 @@ async def get_rental(
 @router.post("/{rental_id}/accept", response_model=SuccessResponse)
 async def accept_rental(
     rental_id: UUID,
+    background_tasks: BackgroundTasks,
     owner_notes: Optional[str] = None,
-    current_user_id: UUID = Depends(get_current_user_id)
+    current_user_id: UUID = Depends(get_current_user_id),
+    loaders: Loaders = Depends(get_loaders)
 ):
     """
     Owner accepts a rental request.
+    The contract is generated after the response; poll the rental's
+    `contract_status` until it is `ready`.
     """
-    admin = get_supabase_admin()
+    rental = await run_transition("accept_rental", rental_id, current_user_id, {
+        "p_owner_notes": owner_notes
+    })
     
-    rental = admin.table("rentals").select("*").eq(
-        "id", str(rental_id)
-    ).single().execute()
-    
-    if not rental.data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Rental not found"
-        )
-    
-    if rental.data["owner_id"] != str(current_user_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only the owner can accept rentals"
-        )
-    
-    if rental.data["status"] != "pending":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Cannot accept rental in {rental.data['status']} status"
-        )
-    
-    # Generate contract
-    contract_html = generate_contract(rental.data)
-    
-    # Update rental
-    admin.table("rentals").update({
-        "status": "accepted",
-        "owner_notes": owner_notes,
-        "contract_html": contract_html
-    }).eq("id", str(rental_id)).execute()
-    
-    # Block dates on listing
-    admin.table("listing_availability").insert({
-        "listing_id": rental.data["listing_id"],
-        "start_date": rental.data["start_date"],
-        "end_date": rental.data["end_date"],
-        "reason": "rental",
-        "rental_id": str(rental_id)
-    }).execute()
+    # Render and store the contract off the request path, from the accepted row
+    background_tasks.add_task(build_contract, rental, loaders)
     
     return SuccessResponse(message="Rental accepted")
 
@@ -322,34 +383,9 @@ async def reject_rental(
     """
     Owner rejects a rental request.
     """
-    admin = get_supabase_admin()
-    
-    rental = admin.table("rentals").select("*").eq(
-        "id", str(rental_id)
-    ).single().execute()
-    
-    if not rental.data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Rental not found"
-        )
-    
-    if rental.data["owner_id"] != str(current_user_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only the owner can reject rentals"
-        )
-    
-    if rental.data["status"] != "pending":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Cannot reject rental in {rental.data['status']} status"
-        )
-    
-    admin.table("rentals").update({
-        "status": "rejected",
-        "cancellation_reason": reason
-    }).eq("id", str(rental_id)).execute()
+    await run_transition("reject_rental", rental_id, current_user_id, {
+        "p_reason": reason
+    })
     
     return SuccessResponse(message="Rental rejected")
 
@@ -362,40 +398,7 @@ async def mark_picked_up(
     """
     Mark rental as picked up. Either party can mark this.
     """
-    admin = get_supabase_admin()
-    
-    rental = admin.table("rentals").select("*").eq(
-        "id", str(rental_id)
-    ).single().execute()
-    
-    if not rental.data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Rental not found"
-        )
-    
-    # Either renter or owner can mark pickup
-    if rental.data["renter_id"] != str(current_user_id) and rental.data["owner_id"] != str(current_user_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only rental participants can update status"
-        )
-    
-    if rental.data["status"] != "accepted":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Cannot mark pickup for rental in {rental.data['status']} status"
-        )
-    
-    admin.table("rentals").update({
-        "status": "picked_up",
-        "picked_up_at": datetime.now().isoformat()
-    }).eq("id", str(rental_id)).execute()
-    
-    # Update listing status to rented
-    admin.table("listings").update({
-        "status": "rented"
-    }).eq("id", rental.data["listing_id"]).execute()
+    await run_transition("pickup_rental", rental_id, current_user_id)
     
     return SuccessResponse(message="Marked as picked up")
 
@@ -408,34 +411,7 @@ async def mark_returned(
     """
     Mark rental as returned. Either party can mark this.
     """
-    admin = get_supabase_admin()
-    
-    rental = admin.table("rentals").select("*").eq(
-        "id", str(rental_id)
-    ).single().execute()
-    
-    if not rental.data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Rental not found"
-        )
-    
-    if rental.data["renter_id"] != str(current_user_id) and rental.data["owner_id"] != str(current_user_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only rental participants can update status"
-        )
-    
-    if rental.data["status"] != "picked_up":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Cannot mark return for rental in {rental.data['status']} status"
-        )
-    
-    admin.table("rentals").update({
-        "status": "returned",
-        "returned_at": datetime.now().isoformat()
-    }).eq("id", str(rental_id)).execute()
+    await run_transition("return_rental", rental_id, current_user_id)
     
     return SuccessResponse(message="Marked as returned")
 
@@ -448,39 +424,7 @@ async def complete_rental(
     """
     Mark rental as completed. Owner confirms completion and deposit release.
     """
-    admin = get_supabase_admin()
-    
-    rental = admin.table("rentals").select("*").eq(
-        "id", str(rental_id)
-    ).single().execute()
-    
-    if not rental.data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Rental not found"
-        )
-    
-    if rental.data["owner_id"] != str(current_user_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only the owner can complete rentals"
-        )
-    
-    if rental.data["status"] != "returned":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Cannot complete rental in {rental.data['status']} status"
-        )
-    
-    admin.table("rentals").update({
-        "status": "completed",
-        "payment_status": "paid"  # In production, release from escrow
-    }).eq("id", str(rental_id)).execute()
-    
-    # Update listing status back to active
-    admin.table("listings").update({
-        "status": "active"
-    }).eq("id", rental.data["listing_id"]).execute()
+    await run_transition("complete_rental", rental_id, current_user_id)
     
     return SuccessResponse(message="Rental completed")
 
@@ -494,40 +438,9 @@ async def cancel_rental(
     """
     Cancel a rental. Can be done by either party before pickup.
     """
-    admin = get_supabase_admin()
-    
-    rental = admin.table("rentals").select("*").eq(
-        "id", str(rental_id)
-    ).single().execute()
-    
-    if not rental.data:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Rental not found"
-        )
-    
-    if rental.data["renter_id"] != str(current_user_id) and rental.data["owner_id"] != str(current_user_id):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only rental participants can cancel"
-        )
-    
-    if rental.data["status"] not in ["pending", "accepted"]:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Cannot cancel rental in {rental.data['status']} status"
-        )
-    
-    admin.table("rentals").update({
-        "status": "cancelled",
-        "cancellation_reason": reason,
-        "payment_status": "refunded"
-    }).eq("id", str(rental_id)).execute()
-    
-    # Remove availability block if it exists
-    admin.table("listing_availability").delete().eq(
-        "rental_id", str(rental_id)
-    ).execute()
+    await run_transition("cancel_rental", rental_id, current_user_id, {
+        "p_reason": reason
+    })
     
     return SuccessResponse(message="Rental cancelled")
 
@@ -535,15 +448,26 @@ async def cancel_rental(
 @router.get("/{rental_id}/contract")
 async def get_contract(
     rental_id: UUID,
+    request: Request,
+    background_tasks: BackgroundTasks,
     current_user_id: UUID = Depends(get_current_user_id)
 ):
     """
     Get rental contract HTML.
+    
+    Served gzip-encoded as stored when the client accepts gzip, with the
+    content hash as ETag so unchanged contracts revalidate with a 304.
+    
+    If generation failed, or has been pending for longer than
+    `contract_stale_after` (e.g. the worker restarted mid-render), requesting
+    the contract starts it again (202) and the rental's `contract_status`
+    goes back to `pending`.
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
-    rental = admin.table("rentals").select(
-        "contract_html, renter_id, owner_id"
+    rental = await admin.table("rentals").select(
+        "renter_id, owner_id, contract_status, contract_requested_at, contract_html, "
+        "rental_contracts(content_hash, body_gzip)"
     ).eq("id", str(rental_id)).single().execute()
     
     if not rental.data:
@@ -558,13 +482,66 @@ async def get_contract(
             detail="You don't have access to this contract"
         )
     
-    if not rental.data["contract_html"]:
+    stale_before = datetime.now(timezone.utc) - timedelta(seconds=get_settings().contract_stale_after)
+    requested_at = rental.data.get("contract_requested_at")
+    stale = rental.data["contract_status"] == "pending" and (
+        requested_at is None or datetime.fromisoformat(requested_at) < stale_before
+    )
+    
+    contract = rental.data.get("rental_contracts")
+    if contract:
+        content_hash = contract["content_hash"]
+        body_gzip = decode_bytea(contract["body_gzip"])
+    elif rental.data["contract_html"]:
+        # Generated before migration 017: move it out of the rentals row
+        content_hash, body_gzip = compress_contract(rental.data["contract_html"])
+        await store_contract(str(rental_id), rental.data["contract_html"])
+        await admin.table("rentals").update(
+            {"contract_html": None}, returning=ReturnMethod.minimal
+        ).eq("id", str(rental_id)).execute()
+    elif rental.data["contract_status"] == "pending" and not stale:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Contract is still being generated"
+        )
+    elif rental.data["contract_status"] in ("pending", "failed"):
+        # Only the request that re-stamps a failed or stale contract schedules the rebuild
+        retry = await admin.table("rentals").update({
+            "contract_status": "pending",
+            "contract_requested_at": datetime.now(timezone.utc).isoformat()
+        }).eq("id", str(rental_id)).in_("contract_status", ["pending", "failed"]).or_(
+            "contract_status.eq.failed,"
+            "contract_requested_at.is.null,"
+            f"contract_requested_at.lt.{quote_filter_value(stale_before.isoformat())}"
+        ).execute()
+        if retry.data:
+            background_tasks.add_task(build_contract, retry.data[0])
+            await publish_rental_event("rental.updated", retry.data[0])
+        # Returned, not raised: background tasks only run after a normal response
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"detail": "Contract is being regenerated"}
+        )
+    else:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Contract not yet generated"
         )
     
-    return {"contract_html": rental.data["contract_html"]}
+    # Each encoding is its own representation: own ETag, and Vary on both
+    use_gzip = accepts_encoding(request, "gzip")
+    etag = f'"{content_hash}-gzip"' if use_gzip else f'"{content_hash}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        content = body_gzip
+    else:
+        content = gzip.decompress(body_gzip)
+    
+    return Response(content=content, media_type="text/html", headers=headers)
 
 
 @router.post("/{rental_id}/cleaning", response_model=SuccessResponse)
@@ -575,10 +552,10 @@ async def add_cleaning_service(
     """
     Add cleaning service to a rental (after return).
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     settings = get_settings()
     
-    rental = admin.table("rentals").select("*").eq(
+    rental = await admin.table("rentals").select("renter_id, owner_id, status").eq(
         "id", str(rental_id)
     ).single().execute()
     
@@ -601,7 +578,7 @@ async def add_cleaning_service(
         )
     
     # Check if cleaning order already exists
-    existing = admin.table("cleaning_orders").select("id").eq(
+    existing = await admin.table("cleaning_orders").select("id").eq(
         "rental_id", str(rental_id)
     ).execute()
     
@@ -612,7 +589,7 @@ async def add_cleaning_service(
         )
     
     # Create cleaning order
-    admin.table("cleaning_orders").insert({
+    await admin.table("cleaning_orders").insert({
         "rental_id": str(rental_id),
         "fee": settings.cleaning_service_base_fee,
         "status": "pending"
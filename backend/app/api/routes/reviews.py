@@ -4,10 +4,14 @@ Kloset Kifayah Backend - Review Routes
 from fastapi import APIRouter, HTTPException, status, Depends, Query
 from uuid import UUID
 
-from app.core.supabase import get_supabase_admin
+from app.core.supabase import get_supabase_admin_async
+from app.core.config import get_settings
+from app.core.cache import get_cache
 from app.api.deps import get_current_user_id
+from app.api.fields import REVIEW_COLUMNS, columns
 from app.models.review import ReviewCreate, Review, ReviewWithDetails, ReviewSummary
 from app.models.enums import ReviewType
+from app.services.trust_service import get_profile_stats, rating_distribution
 
 
 router = APIRouter(prefix="/reviews", tags=["Reviews"])
@@ -21,10 +25,10 @@ async def create_review(
     """
     Submit a review after rental completion.
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
     # Get rental
-    rental = admin.table("rentals").select("*").eq(
+    rental = await admin.table("rentals").select("renter_id, owner_id, status").eq(
         "id", str(review.rental_id)
     ).single().execute()
     
@@ -65,7 +69,7 @@ async def create_review(
         )
     
     # Check for existing review
-    existing = admin.table("reviews").select("id").eq(
+    existing = await admin.table("reviews").select("id").eq(
         "rental_id", str(review.rental_id)
     ).eq("reviewer_id", str(current_user_id)).eq(
         "review_type", review.review_type.value
@@ -78,7 +82,7 @@ async def create_review(
         )
     
     # Create review
-    response = admin.table("reviews").insert({
+    response = await admin.table("reviews").insert({
         "rental_id": str(review.rental_id),
         "reviewer_id": str(current_user_id),
         "reviewee_id": reviewee_id,
@@ -93,6 +97,8 @@ async def create_review(
             detail="Failed to create review"
         )
     
+    await get_cache().invalidate(f"user:{reviewee_id}")
+    
     return response.data[0]
 
 
@@ -101,10 +107,10 @@ async def get_review(review_id: UUID):
     """
     Get a single review.
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
-    response = admin.table("reviews").select(
-        "*, profiles!reviewer_id(full_name, avatar_url), "
+    response = await admin.table("reviews").select(
+        f"{columns(REVIEW_COLUMNS)}, profiles!reviewer_id(full_name, avatar_url), "
         "rentals(listings(title))"
     ).eq("id", str(review_id)).eq("is_visible", True).single().execute()
     
@@ -127,23 +133,22 @@ async def get_review_summary(user_id: UUID):
     """
     Get review summary for a user.
     """
-    admin = get_supabase_admin()
-    
-    response = admin.table("reviews").select("rating").eq(
-        "reviewee_id", str(user_id)
-    ).eq("is_visible", True).execute()
-    
-    if not response.data:
-        return ReviewSummary()
-    
-    ratings = [r["rating"] for r in response.data]
-    distribution = {"5": 0, "4": 0, "3": 0, "2": 0, "1": 0}
-    
-    for r in ratings:
-        distribution[str(r)] += 1
-    
-    return ReviewSummary(
-        total_reviews=len(ratings),
-        average_rating=round(sum(ratings) / len(ratings), 1) if ratings else None,
-        rating_distribution=distribution
+    async def load():
+        distribution = rating_distribution(await get_profile_stats(str(user_id)))
+        total_reviews = sum(distribution.values())
+        
+        if not total_reviews:
+            return ReviewSummary().model_dump(mode="json")
+        
+        rating_sum = sum(int(rating) * count for rating, count in distribution.items())
+        
+        return ReviewSummary(
+            total_reviews=total_reviews,
+            average_rating=round(rating_sum / total_reviews, 1),
+            rating_distribution=distribution
+        ).model_dump(mode="json")
+    
+    return await get_cache().get_or_set(
+        f"reviews:summary:{user_id}", load,
+        get_settings().cache_ttl_profile, tags=[f"user:{user_id}"]
     )
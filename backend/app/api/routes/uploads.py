@@ -2,6 +2,7 @@
 Kloset Kifayah Backend - Upload Routes
 """
 from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from typing import List
 from uuid import UUID, uuid4
 
@@ -65,7 +66,8 @@ async def upload_image(
         
         # Upload to Supabase Storage
         # Note: Bucket "listings" should be created in Supabase dashboard
-        response = admin.storage.from_("listings").upload(
+        response = await run_in_threadpool(
+            admin.storage.from_("listings").upload,
             filename,
             content,
             {"content-type": file.content_type or "image/jpeg"}
@@ -123,7 +125,8 @@ async def upload_multiple_images(
                 })
                 continue
             
-            admin.storage.from_("listings").upload(
+            await run_in_threadpool(
+                admin.storage.from_("listings").upload,
                 filename,
                 content,
                 {"content-type": file.content_type or "image/jpeg"}
@@ -175,7 +178,7 @@ async def delete_image(
     admin = get_supabase_admin()
     
     try:
-        admin.storage.from_("listings").remove([filename])
+        await run_in_threadpool(admin.storage.from_("listings").remove, [filename])
         return {"message": "Image deleted"}
     except Exception as e:
         raise HTTPException(
@@ -5,12 +5,21 @@ from fastapi import APIRouter, HTTPException, status, Depends, Query
 from typing import Optional, List
 from uuid import UUID
 
-from app.core.supabase import get_supabase_admin
+from app.core.supabase import get_supabase_admin_async
+from app.core.config import get_settings
+from app.core.cache import get_cache
 from app.api.deps import get_current_user, get_current_user_id
+from app.api.pagination import Pagination
+from app.api.fields import (
+    LISTING_COLUMNS, LISTING_IMAGE_COLUMNS, RENTAL_COLUMNS, REVIEW_COLUMNS, columns, sparse_columns
+)
 from app.models.user import UserUpdate, UserProfile, UserPublicProfile, UserStats
 from app.models.listing import Listing
 from app.models.rental import RentalWithDetails
 from app.schemas.common import SuccessResponse, PaginatedResponse
+from app.services.trust_service import (
+    get_profile_stats, profile_stats_or_default, rating_average, overall_rating
+)
 
 
 router = APIRouter(prefix="/users", tags=["Users"])
@@ -21,10 +30,19 @@ async def get_user_profile(user_id: UUID):
     """
     Get public profile of a user.
     """
-    admin = get_supabase_admin()
+    cache = get_cache()
+    key = f"user:{user_id}:profile"
     
-    # Get profile
-    response = admin.table("profiles").select("*").eq("id", str(user_id)).single().execute()
+    cached = await cache.get(key)
+    if cached is not None:
+        return cached
+    
+    admin = get_supabase_admin_async()
+    
+    # Get profile with its precomputed stats
+    response = await admin.table("profiles").select(
+        "*, profile_stats(*)"
+    ).eq("id", str(user_id)).single().execute()
     
     if not response.data:
         raise HTTPException(
@@ -33,27 +51,9 @@ async def get_user_profile(user_id: UUID):
         )
     
     profile = response.data
+    stats = profile_stats_or_default(profile.get("profile_stats"))
     
-    # Get stats
-    listings_response = admin.table("listings").select("id", count="exact").eq(
-        "owner_id", str(user_id)
-    ).eq("status", "active").execute()
-    
-    rentals_response = admin.table("rentals").select("id", count="exact").eq(
-        "owner_id", str(user_id)
-    ).eq("status", "completed").execute()
-    
-    reviews_response = admin.table("reviews").select("rating").eq(
-        "reviewee_id", str(user_id)
-    ).execute()
-    
-    # Calculate average rating
-    avg_rating = None
-    if reviews_response.data:
-        ratings = [r["rating"] for r in reviews_response.data]
-        avg_rating = sum(ratings) / len(ratings) if ratings else None
-    
-    return UserPublicProfile(
+    result = UserPublicProfile(
         id=UUID(profile["id"]),
         full_name=profile.get("full_name"),
         avatar_url=profile.get("avatar_url"),
@@ -64,10 +64,14 @@ async def get_user_profile(user_id: UUID):
         is_verified_community=profile.get("is_verified_community", False),
         response_rate=profile.get("response_rate", 1.0),
         created_at=profile["created_at"],
-        total_listings=listings_response.count or 0,
-        completed_rentals=rentals_response.count or 0,
-        average_rating=round(avg_rating, 1) if avg_rating else None
-    )
+        total_listings=stats["active_listings"],
+        completed_rentals=stats["completed_rentals"],
+        average_rating=overall_rating(stats)
+    ).model_dump(mode="json")
+    
+    await cache.set(key, result, get_settings().cache_ttl_profile, tags=[f"user:{user_id}"])
+    
+    return result
 
 
 @router.put("/{user_id}", response_model=UserProfile)
@@ -85,7 +89,7 @@ async def update_profile(
             detail="You can only update your own profile"
         )
     
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
     # Filter out None values
     update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
@@ -96,10 +100,12 @@ async def update_profile(
             detail="No fields to update"
         )
     
-    response = admin.table("profiles").update(update_dict).eq(
+    response = await admin.table("profiles").update(update_dict).eq(
         "id", str(user_id)
     ).execute()
     
+    await get_cache().invalidate(f"user:{user_id}")
+    
     if not response.data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -114,15 +120,21 @@ async def get_user_listings(
     user_id: UUID,
     status: Optional[str] = Query(None),
     page: int = Query(1, ge=1),
-    per_page: int = Query(20, ge=1, le=50)
+    per_page: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
+    include_total: Optional[bool] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma-separated listing columns to return (default: all)")
 ):
     """
     Get listings owned by a user.
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
+    pagination = Pagination(page, per_page, cursor, include_total)
     
     query = admin.table("listings").select(
-        "*, listing_images(*)", count="exact"
+        f"{sparse_columns(fields, LISTING_COLUMNS, ['id', 'created_at'])}, "
+        f"listing_images({LISTING_IMAGE_COLUMNS})",
+        count=pagination.count
     ).eq("owner_id", str(user_id))
     
     # Only show active/approved listings for public view
@@ -131,19 +143,11 @@ async def get_user_listings(
     if status:
         query = query.eq("status", status)
     
-    # Pagination
-    offset = (page - 1) * per_page
-    query = query.range(offset, offset + per_page - 1)
-    query = query.order("created_at", desc=True)
+    query = pagination.apply(query)
     
-    response = query.execute()
+    response = await query.execute()
     
-    return {
-        "items": response.data,
-        "total": response.count or 0,
-        "page": page,
-        "per_page": per_page
-    }
+    return pagination.response(response.data, response.count)
 
 
 @router.get("/{user_id}/rentals")
@@ -153,6 +157,9 @@ async def get_user_rentals(
     status: Optional[str] = Query(None),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
+    include_total: Optional[bool] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma-separated rental columns to return (default: all)"),
     current_user_id: UUID = Depends(get_current_user_id)
 ):
     """
@@ -164,10 +171,13 @@ async def get_user_rentals(
             detail="You can only view your own rentals"
         )
     
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
+    pagination = Pagination(page, per_page, cursor, include_total)
     
     query = admin.table("rentals").select(
-        "*, listings(title, listing_images(image_url))", count="exact"
+        f"{sparse_columns(fields, RENTAL_COLUMNS, ['id', 'created_at'])}, "
+        "listings(title, listing_images(image_url))",
+        count=pagination.count
     )
     
     if role == "renter":
@@ -178,49 +188,36 @@ async def get_user_rentals(
     if status:
         query = query.eq("status", status)
     
-    # Pagination
-    offset = (page - 1) * per_page
-    query = query.range(offset, offset + per_page - 1)
-    query = query.order("created_at", desc=True)
+    query = pagination.apply(query)
     
-    response = query.execute()
+    response = await query.execute()
     
-    return {
-        "items": response.data,
-        "total": response.count or 0,
-        "page": page,
-        "per_page": per_page
-    }
+    return pagination.response(response.data, response.count)
 
 
 @router.get("/{user_id}/reviews")
 async def get_user_reviews(
     user_id: UUID,
     page: int = Query(1, ge=1),
-    per_page: int = Query(20, ge=1, le=50)
+    per_page: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None),
+    include_total: Optional[bool] = Query(None)
 ):
     """
     Get reviews about a user.
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
+    pagination = Pagination(page, per_page, cursor, include_total)
     
     query = admin.table("reviews").select(
-        "*, profiles!reviewer_id(full_name, avatar_url)", count="exact"
+        f"{columns(REVIEW_COLUMNS)}, profiles!reviewer_id(full_name, avatar_url)", count=pagination.count
     ).eq("reviewee_id", str(user_id)).eq("is_visible", True)
     
-    # Pagination
-    offset = (page - 1) * per_page
-    query = query.range(offset, offset + per_page - 1)
-    query = query.order("created_at", desc=True)
+    query = pagination.apply(query)
     
-    response = query.execute()
+    response = await query.execute()
     
-    return {
-        "items": response.data,
-        "total": response.count or 0,
-        "page": page,
-        "per_page": per_page
-    }
+    return pagination.response(response.data, response.count)
 
 
 @router.get("/{user_id}/stats", response_model=UserStats)
@@ -228,52 +225,15 @@ async def get_user_stats(user_id: UUID):
     """
     Get statistics for a user.
     """
-    admin = get_supabase_admin()
-    
-    # Total and active listings
-    total_listings = admin.table("listings").select("id", count="exact").eq(
-        "owner_id", str(user_id)
-    ).execute()
-    
-    active_listings = admin.table("listings").select("id", count="exact").eq(
-        "owner_id", str(user_id)
-    ).eq("status", "active").execute()
-    
-    # Rentals as owner
-    rentals_as_owner = admin.table("rentals").select("id", count="exact").eq(
-        "owner_id", str(user_id)
-    ).execute()
-    
-    # Rentals as renter
-    rentals_as_renter = admin.table("rentals").select("id", count="exact").eq(
-        "renter_id", str(user_id)
-    ).execute()
-    
-    # Completed rentals
-    completed_rentals = admin.table("rentals").select("id", count="exact").eq(
-        "owner_id", str(user_id)
-    ).eq("status", "completed").execute()
-    
-    # Reviews and ratings
-    reviews_response = admin.table("reviews").select(
-        "rating, review_type"
-    ).eq("reviewee_id", str(user_id)).execute()
-    
-    owner_ratings = []
-    renter_ratings = []
-    for r in reviews_response.data or []:
-        if r["review_type"] == "renter_to_owner":
-            owner_ratings.append(r["rating"])
-        else:
-            renter_ratings.append(r["rating"])
+    stats = await get_profile_stats(str(user_id))
     
     return UserStats(
-        total_listings=total_listings.count or 0,
-        active_listings=active_listings.count or 0,
-        total_rentals_as_owner=rentals_as_owner.count or 0,
-        total_rentals_as_renter=rentals_as_renter.count or 0,
-        completed_rentals=completed_rentals.count or 0,
-        average_rating_as_owner=round(sum(owner_ratings) / len(owner_ratings), 1) if owner_ratings else None,
-        average_rating_as_renter=round(sum(renter_ratings) / len(renter_ratings), 1) if renter_ratings else None,
-        total_reviews_received=len(reviews_response.data or [])
+        total_listings=stats["total_listings"],
+        active_listings=stats["active_listings"],
+        total_rentals_as_owner=stats["rentals_as_owner"],
+        total_rentals_as_renter=stats["rentals_as_renter"],
+        completed_rentals=stats["completed_rentals"],
+        average_rating_as_owner=rating_average(stats["owner_rating_sum"], stats["owner_rating_count"]),
+        average_rating_as_renter=rating_average(stats["renter_rating_sum"], stats["renter_rating_count"]),
+        total_reviews_received=stats["owner_rating_count"] + stats["renter_rating_count"]
     )
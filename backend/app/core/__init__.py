@@ -2,5 +2,14 @@
 Core module - Configuration, Security, and Supabase client.
 """
 from .config import get_settings, Settings
-from .supabase import get_supabase_client, get_supabase_admin, get_storage_url
+from .supabase import (
+    get_supabase_client,
+    get_supabase_admin,
+    get_supabase_admin_async,
+    get_http_client,
+    close_async_clients,
+    get_storage_url,
+)
+from .cache import get_cache, cache_key, close_cache
+from .realtime import get_broker, close_broker, ConnectionLimitExceeded
 from .security import security, verify_token, extract_token
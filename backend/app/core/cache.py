@@ -0,0 +1,246 @@
+"""
+Kloset Kifayah Backend - Response Cache
+
+Small async cache for hot public reads. Entries are JSON values with a TTL
+and a set of tags (e.g. `listing:{id}`, `user:{id}`); write routes invalidate
+by tag so readers never wait out the TTL after their own change.
+
+Backends:
+- memory: per-process LRU (default; invalidation is local to the worker)
+- redis:  shared across workers, needs the `redis` package and `CACHE_URL`
+- none:   caching disabled
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from .config import get_settings
+
+
+def cache_key(namespace: str, **params: Any) -> str:
+    """Build a stable key from a namespace and request parameters."""
+    if not params:
+        return namespace
+    raw = json.dumps(params, sort_keys=True, default=str, separators=(",", ":"))
+    return f"{namespace}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+
+class CacheBackend:
+    """Interface shared by the cache backends. Values are JSON strings."""
+
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: int, tags: Iterable[str] = ()) -> None:
+        raise NotImplementedError
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        raise NotImplementedError
+
+    async def clear(self) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class NullCache(CacheBackend):
+    """Backend that never stores anything."""
+
+    async def get(self, key: str) -> Optional[str]:
+        return None
+
+    async def set(self, key: str, value: str, ttl: int, tags: Iterable[str] = ()) -> None:
+        pass
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        pass
+
+    async def clear(self) -> None:
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU with per-entry expiry and a tag -> keys index."""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value: str, ttl: int, tags: Iterable[str] = ()) -> None:
+        self._drop(key)
+        tags = tuple(tags)
+        self._entries[key] = (time.monotonic() + ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self._drop(key)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+
+
+class RedisCache(CacheBackend):
+    """Redis-protocol backend; tags are sets of keys stored alongside entries."""
+
+    def __init__(self, url: str, prefix: str = "kk:cache:"):
+        try:
+            from redis import asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package") from exc
+        self.prefix = prefix
+        self._client = redis.from_url(url, decode_responses=True)
+
+    def _tag(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._client.get(self.prefix + key)
+
+    async def set(self, key: str, value: str, ttl: int, tags: Iterable[str] = ()) -> None:
+        async with self._client.pipeline(transaction=False) as pipe:
+            pipe.set(self.prefix + key, value, ex=ttl)
+            for tag in tags:
+                # Tag sets outlive their entries; stale members are harmless
+                pipe.sadd(self._tag(tag), self.prefix + key)
+                pipe.expire(self._tag(tag), ttl * 2)
+            await pipe.execute()
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            keys = await self._client.smembers(self._tag(tag))
+            await self._client.delete(self._tag(tag), *keys)
+
+    async def clear(self) -> None:
+        async for key in self._client.scan_iter(match=f"{self.prefix}*"):
+            await self._client.delete(key)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class Cache:
+    """Cache front end: JSON encoding, read-through loading and invalidation."""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = await self.backend.get(key)
+        except Exception:
+            return None  # A cache outage must not fail the request
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: int, tags: Iterable[str] = ()) -> None:
+        if ttl <= 0:
+            return
+        try:
+            await self.backend.set(key, json.dumps(value, default=str), ttl, tags)
+        except Exception:
+            pass
+
+    async def get_or_set(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: int,
+        tags: Iterable[str] = ()
+    ) -> Any:
+        """
+        Return the cached value for `key`, loading and storing it on a miss.
+
+        Concurrent misses for the same key in this worker share one load.
+        """
+        cached = await self.get(key)
+        if cached is not None:
+            return cached
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+            await self.set(key, value, ttl, tags)
+            future.set_result(value)
+            return value
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()  # Mark retrieved when nobody else is waiting
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def invalidate(self, *tags: str) -> None:
+        """Drop every entry carrying any of the given tags."""
+        try:
+            await self.backend.invalidate_tags(tags)
+        except Exception:
+            pass
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+@lru_cache()
+def get_cache() -> Cache:
+    """Get the process-wide cache configured by CACHE_BACKEND."""
+    settings = get_settings()
+    backend_name = settings.cache_backend.lower()
+
+    if backend_name == "redis":
+        if not settings.cache_url:
+            raise RuntimeError("CACHE_BACKEND=redis requires CACHE_URL")
+        backend: CacheBackend = RedisCache(settings.cache_url)
+    elif backend_name == "memory":
+        backend = MemoryCache(settings.cache_max_entries)
+    else:
+        backend = NullCache()
+
+    return Cache(backend)
+
+
+async def close_cache() -> None:
+    """Close the cache backend on shutdown."""
+    if get_cache.cache_info().currsize:
+        await get_cache().close()
+    get_cache.cache_clear()
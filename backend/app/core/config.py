@@ -3,7 +3,7 @@ Kloset Kifayah Backend - Configuration Settings
 """
 from functools import lru_cache
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -22,6 +22,43 @@ class Settings(BaseSettings):
     supabase_anon_key: str = "your-anon-key"
     supabase_service_role_key: str = "your-service-role-key"
     
+    # JWT verification (tokens are verified in-process)
+    supabase_jwt_secret: Optional[str] = None  # Legacy HS256 secret
+    supabase_jwt_audience: str = "authenticated"
+    jwt_leeway_seconds: int = 10
+    jwks_cache_ttl: int = 3600
+    jwks_min_refresh_interval: int = 30
+    
+    # Async HTTP client (shared connection pool per worker)
+    http_timeout: float = 10.0
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    
+    # Response cache ("memory", "redis" or "none")
+    cache_backend: str = "memory"
+    cache_url: Optional[str] = None  # e.g. redis://localhost:6379/0
+    cache_max_entries: int = 2048
+    cache_ttl_listings: int = 30       # Browse/search first pages
+    cache_ttl_listing: int = 60        # Listing detail and availability
+    cache_ttl_profile: int = 120       # Public profiles and review summaries
+    cache_ttl_admin_stats: int = 60    # Admin dashboard snapshot
+    
+    # Realtime events ("memory" for one worker, "redis" to fan out across workers)
+    realtime_backend: str = "memory"
+    realtime_url: Optional[str] = None  # Defaults to cache_url
+    realtime_queue_size: int = 100      # Pending events per connection before it is dropped
+    realtime_max_connections: int = 5   # Open streams per user, per worker
+    realtime_replay_size: int = 50      # Recent events kept per user for Last-Event-ID resume
+    realtime_heartbeat_interval: float = 15.0
+    
+    # Listing views are buffered per worker and flushed as one batched increment
+    view_count_flush_interval: float = 10.0
+    view_count_max_pending: int = 5000
+    view_count_max_buffered: int = 20000  # Hard cap while flushes fail; extra views are dropped
+    
+    # A contract still pending after this many seconds is regenerated on request
+    contract_stale_after: int = 300
+    
     # Stripe (Placeholder)
     stripe_secret_key: str = "sk_test_placeholder"
     stripe_webhook_secret: str = "whsec_placeholder"
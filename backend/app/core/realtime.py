@@ -0,0 +1,304 @@
+"""
+Kloset Kifayah Backend - Realtime Events
+
+Per-user pub/sub used to push events (new messages, read receipts,
+conversation bumps, rental status changes) to connected clients instead of
+having them poll.
+
+Every event gets a sortable `id` when published. Each worker keeps the last
+few events per user so a reconnecting client can resume from the last id it
+saw (SSE `Last-Event-ID`).
+
+Backends:
+- memory: fan-out to subscribers in this worker (default; single worker only)
+- redis:  events are relayed between workers over one Redis pub/sub channel,
+          needs the `redis` package and `REALTIME_URL` (or `CACHE_URL`)
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set
+
+from .config import get_settings
+
+
+Event = Dict[str, Any]
+Deliver = Callable[[str, Event], None]
+
+# Redis reconnect backoff, in seconds
+REDIS_RETRY_MIN = 1.0
+REDIS_RETRY_MAX = 30.0
+
+
+class ConnectionLimitExceeded(Exception):
+    """The user already has the maximum number of open subscriptions."""
+
+
+class Subscription:
+    """One connected client's queue of pending events."""
+
+    def __init__(self, user_id: str, max_queue: int = 100):
+        self.user_id = user_id
+        self._queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(max_queue)
+        self.closed = False
+
+    def push(self, event: Event) -> None:
+        if self.closed:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: end the stream so the client resyncs
+            self.close()
+
+    def close(self) -> None:
+        """End the stream; `next()` returns None once this is reached."""
+        if self.closed:
+            return
+        self.closed = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        self._queue.put_nowait(None)
+
+    async def next(self) -> Optional[Event]:
+        """Wait for the next event (None when the subscription is closed)."""
+        return await self._queue.get()
+
+
+class BrokerBackend:
+    """Transport between publishers and the workers holding subscribers."""
+
+    async def start(self, deliver: Deliver) -> None:
+        self.deliver = deliver
+
+    async def publish(self, user_ids: Iterable[str], event: Event) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBackend(BrokerBackend):
+    """Delivers straight to this worker's subscribers."""
+
+    async def publish(self, user_ids: Iterable[str], event: Event) -> None:
+        for user_id in user_ids:
+            self.deliver(user_id, event)
+
+
+class RedisBackend(BrokerBackend):
+    """Relays every event through one channel; each worker keeps its own."""
+
+    def __init__(self, url: str, channel: str = "kk:events"):
+        try:
+            from redis import asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("REALTIME_BACKEND=redis requires the 'redis' package") from exc
+        self.channel = channel
+        self._client = redis.from_url(url, decode_responses=True)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        await super().start(deliver)
+        if self._task is None:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            await pubsub.subscribe(self.channel)
+            self._task = asyncio.create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub: Any) -> None:
+        """Relay messages until cancelled, reconnecting with backoff."""
+        delay = REDIS_RETRY_MIN
+        while True:
+            try:
+                if pubsub is None:
+                    pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                    await pubsub.subscribe(self.channel)
+                    print("✅ Realtime Redis subscription restored")
+                async for message in pubsub.listen():
+                    delay = REDIS_RETRY_MIN
+                    self._relay(message["data"])
+                raise ConnectionError("subscription ended")
+            except asyncio.CancelledError:
+                await self._close_pubsub(pubsub)
+                raise
+            except Exception as exc:
+                print(f"⚠️ Realtime Redis connection lost, retrying in {delay:g}s: {exc}")
+            await self._close_pubsub(pubsub)
+            pubsub = None
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, REDIS_RETRY_MAX)
+
+    def _relay(self, data: Any) -> None:
+        try:
+            payload = json.loads(data)
+            user_ids, event = payload["users"], payload["event"]
+        except (TypeError, ValueError, KeyError) as exc:
+            print(f"⚠️ Dropped malformed realtime message: {exc}")
+            return
+        for user_id in user_ids:
+            self.deliver(user_id, event)
+
+    @staticmethod
+    async def _close_pubsub(pubsub: Any) -> None:
+        if pubsub is None:
+            return
+        try:
+            await pubsub.aclose()
+        except Exception:
+            pass
+
+    async def publish(self, user_ids: Iterable[str], event: Event) -> None:
+        payload = {"users": list(user_ids), "event": event}
+        await self._client.publish(self.channel, json.dumps(payload, default=str))
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._client.aclose()
+
+
+class Broker:
+    """Subscriptions in this worker plus a backend to reach the others."""
+
+    def __init__(
+        self,
+        backend: BrokerBackend,
+        max_queue: int = 100,
+        max_connections: int = 5,
+        replay_size: int = 50,
+        replay_users: int = 10000
+    ):
+        self.backend = backend
+        self.max_queue = max_queue
+        self.max_connections = max_connections
+        self.replay_size = replay_size
+        self.replay_users = replay_users
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._history: "OrderedDict[str, Deque[Event]]" = OrderedDict()
+        self._sequence = itertools.count()
+        self._started = False
+
+    async def start(self) -> None:
+        if not self._started:
+            await self.backend.start(self._deliver)
+            self._started = True
+
+    def _deliver(self, user_id: str, event: Event) -> None:
+        self._remember(user_id, event)
+        for subscription in list(self._subscribers.get(user_id, ())):
+            subscription.push(event)
+
+    def _remember(self, user_id: str, event: Event) -> None:
+        history = self._history.get(user_id)
+        if history is None:
+            history = self._history[user_id] = deque(maxlen=self.replay_size)
+            while len(self._history) > self.replay_users:
+                self._history.popitem(last=False)
+        else:
+            self._history.move_to_end(user_id)
+        history.append(event)
+
+    def replay(self, user_id: str, last_event_id: str) -> Optional[List[Event]]:
+        """
+        Events for a user published after `last_event_id`.
+
+        Returns:
+            The missed events (possibly none), or None when the id is no
+            longer in this worker's history and the client must resync.
+        """
+        history = list(self._history.get(str(user_id), ()))
+        for index, event in enumerate(history):
+            if event["id"] == last_event_id:
+                return history[index + 1:]
+        return None
+
+    def can_subscribe(self, user_id: str) -> bool:
+        """Whether the user is below the per-user connection limit in this worker."""
+        return self.connection_count(user_id) < self.max_connections
+
+    async def subscribe(self, user_id: str) -> Subscription:
+        """
+        Start receiving events addressed to `user_id`.
+
+        The connection limit is checked and the slot taken with no await in
+        between, so concurrent connects can't overshoot it.
+
+        Raises:
+            ConnectionLimitExceeded: If the user is at the limit in this worker
+        """
+        await self.start()
+        if not self.can_subscribe(user_id):
+            raise ConnectionLimitExceeded(str(user_id))
+        subscription = Subscription(str(user_id), self.max_queue)
+        self._subscribers.setdefault(subscription.user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscription.close()
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    def connection_count(self, user_id: str) -> int:
+        """Open subscriptions for a user in this worker."""
+        return len(self._subscribers.get(str(user_id), ()))
+
+    async def publish(self, user_ids: Iterable[Any], event: Event) -> None:
+        """
+        Send an event to every connection of the given users.
+
+        Best effort: a broker failure is logged and never fails the write
+        that triggered it (clients resync when they reconnect).
+        """
+        await self.start()
+        # Sortable across workers: publish time, then a per-worker sequence
+        event = {"id": f"{time.time_ns()}-{next(self._sequence):06d}", **event}
+        try:
+            await self.backend.publish([str(user_id) for user_id in user_ids], event)
+        except Exception as exc:
+            print(f"⚠️ Realtime publish failed: {exc}")
+
+    async def close(self) -> None:
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                self.unsubscribe(subscription)
+        await self.backend.close()
+
+
+@lru_cache()
+def get_broker() -> Broker:
+    """Get the process-wide broker configured by REALTIME_BACKEND."""
+    settings = get_settings()
+    backend_name = settings.realtime_backend.lower()
+
+    if backend_name == "redis":
+        url = settings.realtime_url or settings.cache_url
+        if not url:
+            raise RuntimeError("REALTIME_BACKEND=redis requires REALTIME_URL or CACHE_URL")
+        backend: BrokerBackend = RedisBackend(url)
+    else:
+        backend = MemoryBackend()
+
+    return Broker(
+        backend,
+        max_queue=settings.realtime_queue_size,
+        max_connections=settings.realtime_max_connections,
+        replay_size=settings.realtime_replay_size,
+    )
+
+
+async def close_broker() -> None:
+    """Close the broker on shutdown."""
+    if get_broker.cache_info().currsize:
+        await get_broker().close()
+    get_broker.cache_clear()
@@ -2,38 +2,144 @@
 Kloset Kifayah Backend - Security Utilities
 """
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from supabase import Client
-from typing import Optional
+from typing import Optional, Dict, Any
+import asyncio
+import time
+import jwt
 import httpx
 
-from .supabase import get_supabase_client
+from .supabase import get_supabase_client, get_http_client
 from .config import get_settings
 
 
 # HTTP Bearer token security scheme
 security = HTTPBearer(auto_error=False)
 
+# Asymmetric algorithms Supabase Auth may sign with (keys published as JWKS)
+JWKS_ALGORITHMS = ["RS256", "ES256", "EdDSA"]
 
-async def verify_token(token: str) -> dict:
+# Cached signing keys: kid -> PyJWK
+_jwks_keys: Dict[str, jwt.PyJWK] = {}
+_jwks_fetched_at: float = 0.0
+_jwks_lock = asyncio.Lock()
+
+
+class RemoteVerificationRequired(Exception):
+    """Token cannot be verified in-process (unknown key or no secret configured)."""
+
+
+async def _fetch_jwks() -> None:
+    """Download the project's JWKS and replace the cached signing keys."""
+    global _jwks_keys, _jwks_fetched_at
+    settings = get_settings()
+    
+    response = await get_http_client().get(
+        f"{settings.supabase_url}/auth/v1/.well-known/jwks.json",
+        headers={"apikey": settings.supabase_anon_key},
+    )
+    response.raise_for_status()
+    
+    keys = {}
+    for jwk_data in response.json().get("keys", []):
+        try:
+            keys[jwk_data["kid"]] = jwt.PyJWK(jwk_data)
+        except (KeyError, jwt.PyJWKError):
+            continue
+    
+    _jwks_keys = keys
+    _jwks_fetched_at = time.monotonic()
+
+
+async def get_signing_key(kid: str) -> jwt.PyJWK:
     """
-    Verify JWT token with Supabase and return user data.
+    Get the public key for a token's `kid` from the JWKS cache.
+    
+    The JWKS is refetched when the cache has expired or when an unknown
+    `kid` shows up (key rotation), at most once per refresh interval.
     
-    Args:
-        token: JWT access token
-        
-    Returns:
-        User data from Supabase
-        
     Raises:
-        HTTPException: If token is invalid
+        RemoteVerificationRequired: If the key is still unknown after a refresh
     """
     settings = get_settings()
+    age = time.monotonic() - _jwks_fetched_at
+    
+    if kid in _jwks_keys and age < settings.jwks_cache_ttl:
+        return _jwks_keys[kid]
+    
+    async with _jwks_lock:
+        age = time.monotonic() - _jwks_fetched_at
+        stale = age >= settings.jwks_cache_ttl
+        unknown = kid not in _jwks_keys and age >= settings.jwks_min_refresh_interval
+        if stale or unknown:
+            try:
+                await _fetch_jwks()
+            except (httpx.HTTPError, ValueError):
+                pass
+    
+    if kid not in _jwks_keys:
+        raise RemoteVerificationRequired(f"Unknown signing key: {kid}")
+    return _jwks_keys[kid]
+
+
+async def decode_token(token: str) -> Dict[str, Any]:
+    """
+    Verify a Supabase access token in-process and return its claims.
+    
+    HS256 tokens are checked against the project's JWT secret; asymmetric
+    tokens against the cached JWKS. Signature, `exp` and `aud` are validated.
+    
+    Raises:
+        RemoteVerificationRequired: If the token can't be verified locally
+        jwt.InvalidTokenError: If the token is invalid or expired
+    """
+    settings = get_settings()
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get("alg")
+    
+    if algorithm == "HS256":
+        if not settings.supabase_jwt_secret:
+            raise RemoteVerificationRequired("JWT secret not configured")
+        key = settings.supabase_jwt_secret
+    elif algorithm in JWKS_ALGORITHMS and header.get("kid"):
+        key = await get_signing_key(header["kid"])
+    else:
+        raise RemoteVerificationRequired(f"Unsupported token algorithm: {algorithm}")
     
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience=settings.supabase_jwt_audience,
+        options={"require": ["exp", "sub"]},
+        leeway=settings.jwt_leeway_seconds,
+    )
+
+
+def user_from_claims(claims: Dict[str, Any]) -> dict:
+    """Build the current-user dict from verified token claims."""
+    return {
+        "id": str(claims["sub"]),
+        "email": claims.get("email"),
+        "email_confirmed_at": None,  # Not carried in the token
+        "phone": claims.get("phone"),
+        "created_at": None,  # Not carried in the token
+        "role": claims.get("role"),
+    }
+
+
+async def verify_token_remote(token: str) -> dict:
+    """
+    Verify JWT token with a Supabase Auth round trip and return user data.
+    
+    Used only when the token can't be verified in-process.
+    """
     try:
-        # Use Supabase to verify the token
+        # Use Supabase to verify the token (sync client, keep it off the event loop)
         client = get_supabase_client()
-        user_response = client.auth.get_user(token)
+        user_response = await run_in_threadpool(client.auth.get_user, token)
         
         if user_response and user_response.user:
             return {
@@ -48,6 +154,8 @@ async def verify_token(token: str) -> dict:
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid or expired token"
             )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -55,6 +163,40 @@ async def verify_token(token: str) -> dict:
         )
 
 
+async def verify_token(token: str) -> dict:
+    """
+    Verify JWT token and return user data.
+    
+    Tokens are verified locally against the cached JWT secret / JWKS; the
+    Supabase Auth API is only called for keys we can't resolve.
+    
+    Args:
+        token: JWT access token
+        
+    Returns:
+        User data built from the token claims
+        
+    Raises:
+        HTTPException: If token is invalid
+    """
+    try:
+        claims = await decode_token(token)
+    except RemoteVerificationRequired:
+        return await verify_token_remote(token)
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token"
+        )
+    except jwt.InvalidTokenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Token verification failed: {str(e)}"
+        )
+    
+    return user_from_claims(claims)
+
+
 def extract_token(credentials: Optional[HTTPAuthorizationCredentials]) -> str:
     """
     Extract token from authorization credentials.
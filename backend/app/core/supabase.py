@@ -2,6 +2,8 @@
 Kloset Kifayah Backend - Supabase Client
 """
 from functools import lru_cache
+import httpx
+from postgrest import AsyncPostgrestClient
 from supabase import create_client, Client
 from .config import get_settings
 
@@ -20,6 +22,58 @@ def get_supabase_admin() -> Client:
     return create_client(settings.supabase_url, settings.supabase_service_role_key)
 
 
+def _new_http_client() -> httpx.AsyncClient:
+    """Create an async HTTP client with the configured pool limits."""
+    settings = get_settings()
+    return httpx.AsyncClient(
+        timeout=settings.http_timeout,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+        ),
+        follow_redirects=True,
+    )
+
+
+@lru_cache()
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared async HTTP client for outbound calls (e.g. JWKS).
+    
+    Carries no base URL or credentials; add them per request.
+    """
+    return _new_http_client()
+
+
+@lru_cache()
+def get_supabase_admin_async() -> AsyncPostgrestClient:
+    """
+    Get async PostgREST client with service role key (for route data access).
+    
+    Queries are awaited on a pooled HTTP client, so a slow query no longer
+    blocks the event loop for every other request on the worker. The client
+    is its own: postgrest-py sets the base URL and service role headers on
+    it, which must not leak to the shared client.
+    """
+    settings = get_settings()
+    key = settings.supabase_service_role_key
+    return AsyncPostgrestClient(
+        f"{settings.supabase_url}/rest/v1",
+        headers={"apikey": key, "Authorization": f"Bearer {key}"},
+        http_client=_new_http_client(),
+    )
+
+
+async def close_async_clients() -> None:
+    """Close the async HTTP clients on shutdown."""
+    if get_supabase_admin_async.cache_info().currsize:
+        await get_supabase_admin_async().aclose()
+    if get_http_client.cache_info().currsize:
+        await get_http_client().aclose()
+    get_supabase_admin_async.cache_clear()
+    get_http_client.cache_clear()
+
+
 def get_storage_url(bucket: str, path: str) -> str:
     """Generate public URL for a Supabase Storage object."""
     settings = get_settings()
@@ -8,6 +8,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.core.config import get_settings
+from app.core.supabase import close_async_clients
+from app.core.cache import close_cache
+from app.core.realtime import get_broker, close_broker
+from app.services.view_counter import get_view_counter
 from app.api.routes import (
     auth_router,
     users_router,
@@ -17,6 +21,7 @@ from app.api.routes import (
     reviews_router,
     uploads_router,
     admin_router,
+    events_router,
 )
 from app.schemas.common import HealthCheck
 
@@ -30,9 +35,15 @@ async def lifespan(app: FastAPI):
     # Startup
     print(f"🚀 Starting {settings.app_name} API...")
     print(f"📍 Debug mode: {settings.debug}")
+    get_view_counter().start()
+    await get_broker().start()
     yield
     # Shutdown
     print(f"👋 Shutting down {settings.app_name} API...")
+    await close_broker()
+    await get_view_counter().stop()
+    await close_async_clients()
+    await close_cache()
 
 
 # Create FastAPI app
@@ -105,6 +116,7 @@ app.include_router(messages_router, prefix=settings.api_v1_prefix)
 app.include_router(reviews_router, prefix=settings.api_v1_prefix)
 app.include_router(uploads_router, prefix=settings.api_v1_prefix)
 app.include_router(admin_router, prefix=settings.api_v1_prefix)
+app.include_router(events_router, prefix=settings.api_v1_prefix)
 
 
 if __name__ == "__main__":
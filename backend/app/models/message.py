@@ -18,7 +18,7 @@ class Message(BaseModel):
     conversation_id: UUID
     sender_id: UUID
     content: str
-    is_read: bool = False
+    is_read: bool = False  # Derived from the recipient's read watermark
     created_at: datetime
     
     # Populated by service
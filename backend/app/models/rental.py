@@ -58,6 +58,8 @@ class Rental(BaseModel):
     
     # Contract
     contract_html: Optional[str] = None
+    contract_status: Optional[str] = None  # pending, ready, failed
+    contract_requested_at: Optional[datetime] = None
     contract_signed_at: Optional[datetime] = None
     
     # Notes
@@ -16,5 +16,11 @@ from .trust_service import (
     calculate_response_rate,
     update_user_response_rate,
     get_user_trust_summary,
+    get_profile_stats,
+    profile_stats_or_default,
+    rating_average,
+    overall_rating,
+    rating_distribution,
     TrustLevel,
 )
+from .view_counter import ViewCounter, get_view_counter
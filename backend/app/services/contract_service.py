@@ -1,183 +1,141 @@
 """
 Kloset Kifayah Backend - Contract Service
 """
+import gzip
+import hashlib
 from datetime import datetime
-from typing import Dict, Any
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
 
-from app.core.supabase import get_supabase_admin
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from postgrest.types import ReturnMethod
 
+from app.core.supabase import get_supabase_admin_async
+from app.core.realtime import get_broker
+from app.api.concurrency import gather_queries
+from app.api.loaders import Loaders
 
-def generate_contract(rental_data: Dict[str, Any]) -> str:
+
+TEMPLATES_DIR = Path(__file__).resolve().parent.parent / "templates"
+
+# Compiled once per process; auto_reload off so renders never stat the file.
+# contract.css is included inline so a saved contract renders on its own.
+_templates = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=select_autoescape(["html"]),
+    auto_reload=False,
+)
+CONTRACT_TEMPLATE = _templates.get_template("contract.html")
+
+
+async def generate_contract(rental_data: Dict[str, Any], loaders: Optional[Loaders] = None) -> str:
     """
     Generate HTML contract for a rental.
     
     Args:
         rental_data: Rental record from database
+        loaders: The request's batch loaders (a fresh set if omitted)
         
     Returns:
         HTML string of the contract
     """
-    admin = get_supabase_admin()
+    loaders = loaders or Loaders()
     
-    # Get listing details
-    listing = admin.table("listings").select("*").eq(
-        "id", rental_data["listing_id"]
-    ).single().execute()
+    # One listings query and one profiles query for both parties
+    listing_data, renter_data, owner_data = await gather_queries(
+        loaders.listings.load(rental_data["listing_id"]),
+        loaders.profiles.load(rental_data["renter_id"]),
+        loaders.profiles.load(rental_data["owner_id"]),
+    )
     
-    # Get user details
-    renter = admin.table("profiles").select("full_name, email, phone").eq(
-        "id", rental_data["renter_id"]
-    ).single().execute()
+    return CONTRACT_TEMPLATE.render(
+        rental=rental_data,
+        listing=listing_data or {},
+        renter=renter_data or {},
+        owner=owner_data or {},
+        generated_at=datetime.now(),
+    )
+
+
+async def build_contract(rental_data: Dict[str, Any], loaders: Optional[Loaders] = None) -> None:
+    """
+    Render and store a rental's contract, then mark it ready.
     
-    owner = admin.table("profiles").select("full_name, email, phone").eq(
-        "id", rental_data["owner_id"]
-    ).single().execute()
+    Runs as a background task after the rental is accepted; on failure the
+    rental's contract_status becomes 'failed' (see migration 018). Either
+    way both parties get a `rental.updated` event. If this task never
+    finishes, the contract goes stale and is rebuilt on request (see
+    migration 022).
     
-    listing_data = listing.data or {}
-    renter_data = renter.data or {}
-    owner_data = owner.data or {}
+    Args:
+        rental_data: Rental record returned by the accept transition
+        loaders: The accepting request's batch loaders
+    """
+    admin = get_supabase_admin_async()
     
-    contract_html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <style>
-            body {{ font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto; padding: 20px; }}
-            .header {{ text-align: center; border-bottom: 2px solid #333; padding-bottom: 20px; margin-bottom: 20px; }}
-            .section {{ margin-bottom: 20px; }}
-            .section h2 {{ color: #333; border-bottom: 1px solid #ccc; padding-bottom: 5px; }}
-            .info-grid {{ display: grid; grid-template-columns: 1fr 1fr; gap: 10px; }}
-            .info-item {{ padding: 5px 0; }}
-            .label {{ font-weight: bold; color: #666; }}
-            .terms {{ background: #f9f9f9; padding: 15px; border-radius: 5px; }}
-            .terms li {{ margin-bottom: 10px; }}
-            .signatures {{ display: grid; grid-template-columns: 1fr 1fr; gap: 40px; margin-top: 40px; }}
-            .signature-box {{ border-top: 1px solid #333; padding-top: 10px; }}
-            .footer {{ text-align: center; margin-top: 40px; color: #666; font-size: 12px; }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>Rental Agreement</h1>
-            <p>Agreement ID: {rental_data['id']}</p>
-            <p>Generated: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}</p>
-        </div>
-        
-        <div class="section">
-            <h2>Parties</h2>
-            <div class="info-grid">
-                <div>
-                    <p class="label">Owner (Lender)</p>
-                    <p>{owner_data.get('full_name', 'N/A')}</p>
-                    <p>{owner_data.get('email', 'N/A')}</p>
-                </div>
-                <div>
-                    <p class="label">Renter (Borrower)</p>
-                    <p>{renter_data.get('full_name', 'N/A')}</p>
-                    <p>{renter_data.get('email', 'N/A')}</p>
-                </div>
-            </div>
-        </div>
-        
-        <div class="section">
-            <h2>Item Details</h2>
-            <div class="info-grid">
-                <div class="info-item">
-                    <span class="label">Item:</span> {listing_data.get('title', 'N/A')}
-                </div>
-                <div class="info-item">
-                    <span class="label">Category:</span> {listing_data.get('category', 'N/A')}
-                </div>
-                <div class="info-item">
-                    <span class="label">Condition:</span> {listing_data.get('condition', 'N/A')}
-                </div>
-                <div class="info-item">
-                    <span class="label">Size:</span> {listing_data.get('size', 'N/A')}
-                </div>
-            </div>
-            <p><span class="label">Description:</span> {listing_data.get('description', 'N/A')}</p>
-        </div>
-        
-        <div class="section">
-            <h2>Rental Period</h2>
-            <div class="info-grid">
-                <div class="info-item">
-                    <span class="label">Start Date:</span> {rental_data['start_date']}
-                </div>
-                <div class="info-item">
-                    <span class="label">End Date:</span> {rental_data['end_date']}
-                </div>
-                <div class="info-item">
-                    <span class="label">Total Days:</span> {rental_data['total_days']}
-                </div>
-            </div>
-        </div>
-        
-        <div class="section">
-            <h2>Payment Details</h2>
-            <div class="info-grid">
-                <div class="info-item">
-                    <span class="label">Daily Rate:</span> ${rental_data['daily_rate']:.2f}
-                </div>
-                <div class="info-item">
-                    <span class="label">Subtotal:</span> ${rental_data['daily_rate'] * rental_data['total_days']:.2f}
-                </div>
-                <div class="info-item">
-                    <span class="label">Security Deposit:</span> ${rental_data['deposit_amount']:.2f}
-                </div>
-                <div class="info-item">
-                    <span class="label">Service Fee:</span> ${rental_data.get('service_fee', 0):.2f}
-                </div>
-                <div class="info-item">
-                    <span class="label">Cleaning Fee:</span> ${rental_data.get('cleaning_fee', 0):.2f}
-                </div>
-                <div class="info-item">
-                    <span class="label"><strong>Total Amount:</strong></span> <strong>${rental_data['total_amount']:.2f}</strong>
-                </div>
-            </div>
-        </div>
-        
-        <div class="section">
-            <h2>Pickup Location</h2>
-            <p><span class="label">Location:</span> {listing_data.get('location', 'N/A')}</p>
-            <p><span class="label">Instructions:</span> {listing_data.get('pickup_instructions', 'Contact owner for details')}</p>
-        </div>
-        
-        <div class="section">
-            <h2>Terms and Conditions</h2>
-            <div class="terms">
-                <ol>
-                    <li><strong>Care of Item:</strong> The Renter agrees to take reasonable care of the item and return it in the same condition as received, allowing for normal wear.</li>
-                    <li><strong>Late Returns:</strong> Late returns may incur additional daily charges at the agreed daily rate. Renter must notify Owner of any delays.</li>
-                    <li><strong>Damages:</strong> The Renter is responsible for any damage beyond normal wear. The security deposit may be used to cover repair or replacement costs.</li>
-                    <li><strong>Cleaning:</strong> The item should be returned in a clean condition. If the item requires professional cleaning, the cost may be deducted from the deposit.</li>
-                    <li><strong>Cancellation:</strong> Either party may cancel before pickup. Cancellation after pickup requires mutual agreement.</li>
-                    <li><strong>No Subletting:</strong> The Renter may not sublet or transfer the item to any third party.</li>
-                    <li><strong>Deposit Return:</strong> The security deposit will be returned within 48 hours after the Owner confirms the item has been returned in acceptable condition.</li>
-                    <li><strong>Dispute Resolution:</strong> Any disputes will be handled through the Kloset Kifayah platform's dispute resolution process.</li>
-                </ol>
-            </div>
-        </div>
+    try:
+        await store_contract(rental_data["id"], await generate_contract(rental_data, loaders))
+        contract_status = "ready"
+    except Exception as exc:
+        print(f"⚠️ Contract generation failed for rental {rental_data['id']}: {exc}")
+        contract_status = "failed"
+    
+    try:
+        await admin.table("rentals").update(
+            {"contract_status": contract_status}, returning=ReturnMethod.minimal
+        ).eq("id", str(rental_data["id"])).execute()
         
-        <div class="signatures">
-            <div class="signature-box">
-                <p class="label">Owner Signature</p>
-                <p>{owner_data.get('full_name', 'N/A')}</p>
-                <p>Date: {datetime.now().strftime('%B %d, %Y')}</p>
-            </div>
-            <div class="signature-box">
-                <p class="label">Renter Signature</p>
-                <p>{renter_data.get('full_name', 'N/A')}</p>
-                <p>Date: {datetime.now().strftime('%B %d, %Y')}</p>
-            </div>
-        </div>
+        await get_broker().publish([rental_data["owner_id"], rental_data["renter_id"]], {
+            "type": "rental.updated",
+            "rental_id": rental_data["id"],
+            "listing_id": rental_data["listing_id"],
+            "status": rental_data["status"],
+            "contract_status": contract_status,
+        })
+    except Exception as exc:
+        # Left pending; get_contract rebuilds it once it goes stale
+        print(f"⚠️ Could not mark contract {contract_status} for rental {rental_data['id']}: {exc}")
+
+
+def compress_contract(contract_html: str) -> Tuple[str, bytes]:
+    """
+    Hash and gzip a contract.
+    
+    Returns:
+        (sha256 hex digest of the HTML, gzip-compressed HTML)
+    """
+    body = contract_html.encode("utf-8")
+    # mtime=0 keeps the output identical for identical input
+    return hashlib.sha256(body).hexdigest(), gzip.compress(body, mtime=0)
+
+
+def encode_bytea(data: bytes) -> str:
+    """Encode bytes for a PostgREST bytea column."""
+    return "\\x" + data.hex()
+
+
+def decode_bytea(value: str) -> bytes:
+    """Decode a bytea value as returned by PostgREST."""
+    return bytes.fromhex(value[2:] if value.startswith("\\x") else value)
+
+
+async def store_contract(rental_id: str, contract_html: str) -> str:
+    """
+    Store a contract compressed in rental_contracts (see migration 017).
+    
+    Args:
+        rental_id: Rental the contract belongs to
+        contract_html: Rendered contract
         
-        <div class="footer">
-            <p>This agreement was generated by Kloset Kifayah - Muslim Rental Marketplace</p>
-            <p>For questions or disputes, please contact support through the app.</p>
-        </div>
-    </body>
-    </html>
+    Returns:
+        Content hash of the stored contract (used as its ETag)
     """
+    content_hash, body_gzip = compress_contract(contract_html)
+    
+    await get_supabase_admin_async().table("rental_contracts").upsert({
+        "rental_id": str(rental_id),
+        "content_hash": content_hash,
+        "body_gzip": encode_bytea(body_gzip),
+    }, returning=ReturnMethod.minimal).execute()
     
-    return contract_html
+    return content_hash
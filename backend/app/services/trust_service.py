@@ -6,7 +6,7 @@ Handles trust badges, verification levels, and user scoring.
 from typing import Dict, List, Optional
 from uuid import UUID
 
-from app.core.supabase import get_supabase_admin
+from app.core.supabase import get_supabase_admin_async
 
 
 class TrustLevel:
@@ -18,66 +18,145 @@ class TrustLevel:
     TOP_LENDER = 4
 
 
-def calculate_trust_level(user_id: str) -> Dict:
+# Counters kept by the profile_stats triggers (see migration 011)
+PROFILE_STATS_FIELDS = (
+    "total_listings",
+    "active_listings",
+    "rentals_as_owner",
+    "rentals_as_renter",
+    "completed_rentals",
+    "responded_rentals",
+    "owner_rating_sum",
+    "owner_rating_count",
+    "renter_rating_sum",
+    "renter_rating_count",
+    "rating_1_count",
+    "rating_2_count",
+    "rating_3_count",
+    "rating_4_count",
+    "rating_5_count",
+)
+
+
+def profile_stats_or_default(stats: Optional[Dict]) -> Dict:
     """
-    Calculate trust level and badges for a user.
+    Fill in zeros for a missing or partial profile_stats row.
+    
+    Args:
+        stats: Row (or embedded object) from profile_stats, may be None
+        
+    Returns:
+        Dictionary with every stats field present
+    """
+    stats = stats or {}
+    return {field: stats.get(field) or 0 for field in PROFILE_STATS_FIELDS}
+
+
+def rating_average(total: int, count: int) -> Optional[float]:
+    """Average rating rounded to one decimal, or None without ratings."""
+    return round(total / count, 1) if count else None
+
+
+def overall_rating(stats: Dict) -> Optional[float]:
+    """Average of every rating a user has received, as owner or renter."""
+    stats = profile_stats_or_default(stats)
+    return rating_average(
+        stats["owner_rating_sum"] + stats["renter_rating_sum"],
+        stats["owner_rating_count"] + stats["renter_rating_count"]
+    )
+
+
+def rating_distribution(stats: Dict) -> Dict[str, int]:
+    """Histogram of visible ratings received, keyed "5" down to "1"."""
+    stats = profile_stats_or_default(stats)
+    return {str(n): stats[f"rating_{n}_count"] for n in range(5, 0, -1)}
+
+
+async def get_profile_stats(user_id: str) -> Dict:
+    """
+    Get the precomputed stats for a user.
     
     Args:
         user_id: UUID of the user
         
     Returns:
-        Dictionary with trust level and individual badges
+        Dictionary with every stats field (zeros if the user has none)
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
-    # Get user profile
-    profile = admin.table("profiles").select(
-        "is_verified_email, is_verified_phone, is_verified_community"
-    ).eq("id", user_id).single().execute()
+    response = await admin.table("profile_stats").select("*").eq(
+        "user_id", user_id
+    ).limit(1).execute()
     
-    if not profile.data:
-        return {"level": TrustLevel.UNVERIFIED, "badges": []}
+    return profile_stats_or_default(response.data[0] if response.data else None)
+
+
+def build_trust_level(profile: Dict, stats: Dict) -> Dict:
+    """
+    Derive trust level and badges from a profile and its stats.
     
+    Args:
+        profile: Profile row with the is_verified_* flags
+        stats: Row from profile_stats
+        
+    Returns:
+        Dictionary with trust level and individual badges
+    """
+    stats = profile_stats_or_default(stats)
     badges = []
     level = TrustLevel.UNVERIFIED
     
     # Check verifications
-    if profile.data.get("is_verified_email"):
+    if profile.get("is_verified_email"):
         badges.append("email_verified")
         level = max(level, TrustLevel.EMAIL_VERIFIED)
     
-    if profile.data.get("is_verified_phone"):
+    if profile.get("is_verified_phone"):
         badges.append("phone_verified")
         level = max(level, TrustLevel.PHONE_VERIFIED)
     
-    if profile.data.get("is_verified_community"):
+    if profile.get("is_verified_community"):
         badges.append("community_verified")
         level = max(level, TrustLevel.COMMUNITY_VERIFIED)
     
     # Check for Top Lender status (10+ completed rentals, 4.5+ rating)
-    completed_rentals = admin.table("rentals").select("id", count="exact").eq(
-        "owner_id", user_id
-    ).eq("status", "completed").execute()
-    
-    reviews = admin.table("reviews").select("rating").eq(
-        "reviewee_id", user_id
-    ).eq("review_type", "renter_to_owner").execute()
-    
-    if completed_rentals.count and completed_rentals.count >= 10:
-        if reviews.data:
-            avg_rating = sum(r["rating"] for r in reviews.data) / len(reviews.data)
-            if avg_rating >= 4.5:
-                badges.append("top_lender")
-                level = max(level, TrustLevel.TOP_LENDER)
+    if stats["completed_rentals"] >= 10 and stats["owner_rating_count"]:
+        avg_rating = stats["owner_rating_sum"] / stats["owner_rating_count"]
+        if avg_rating >= 4.5:
+            badges.append("top_lender")
+            level = max(level, TrustLevel.TOP_LENDER)
     
     return {
         "level": level,
         "badges": badges,
-        "completed_rentals": completed_rentals.count or 0,
+        "completed_rentals": stats["completed_rentals"],
         "is_top_lender": "top_lender" in badges
     }
 
 
+async def calculate_trust_level(user_id: str) -> Dict:
+    """
+    Calculate trust level and badges for a user.
+    
+    Args:
+        user_id: UUID of the user
+        
+    Returns:
+        Dictionary with trust level and individual badges
+    """
+    admin = get_supabase_admin_async()
+    
+    # Profile flags and stats in one lookup
+    profile = await admin.table("profiles").select(
+        "is_verified_email, is_verified_phone, is_verified_community, profile_stats(*)"
+    ).eq("id", user_id).single().execute()
+    
+    if not profile.data:
+        return {"level": TrustLevel.UNVERIFIED, "badges": []}
+    
+    return build_trust_level(profile.data, profile.data.get("profile_stats"))
+
+
 def get_trust_badges_display(badges: List[str]) -> List[Dict]:
     """
     Get display-friendly badge information.
@@ -114,7 +193,16 @@ def get_trust_badges_display(badges: List[str]) -> List[Dict]:
     return [badge_info.get(b, {"name": b, "icon": "✓", "description": ""}) for b in badges]
 
 
-def calculate_response_rate(user_id: str) -> float:
+def response_rate_from_stats(stats: Dict) -> float:
+    """Share of rental requests an owner responded to (accepted or rejected)."""
+    stats = profile_stats_or_default(stats)
+    if not stats["rentals_as_owner"]:
+        return 1.0  # Default to 100% for new users
+    
+    return round(stats["responded_rentals"] / stats["rentals_as_owner"], 2)
+
+
+async def calculate_response_rate(user_id: str) -> float:
     """
     Calculate user's response rate to rental requests.
     
@@ -124,41 +212,26 @@ def calculate_response_rate(user_id: str) -> float:
     Returns:
         Response rate as decimal (0.0 to 1.0)
     """
-    admin = get_supabase_admin()
-    
-    # Get all rental requests received
-    total = admin.table("rentals").select("id", count="exact").eq(
-        "owner_id", user_id
-    ).execute()
-    
-    if not total.count or total.count == 0:
-        return 1.0  # Default to 100% for new users
-    
-    # Get responded requests (accepted or rejected, not cancelled)
-    responded = admin.table("rentals").select("id", count="exact").eq(
-        "owner_id", user_id
-    ).in_("status", ["accepted", "rejected", "picked_up", "returned", "completed"]).execute()
-    
-    return round((responded.count or 0) / total.count, 2)
+    return response_rate_from_stats(await get_profile_stats(user_id))
 
 
-def update_user_response_rate(user_id: str) -> None:
+async def update_user_response_rate(user_id: str) -> None:
     """
     Update user's response rate in their profile.
     
     Args:
         user_id: UUID of the user
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
-    rate = calculate_response_rate(user_id)
+    rate = await calculate_response_rate(user_id)
     
-    admin.table("profiles").update({
+    await admin.table("profiles").update({
         "response_rate": rate
     }).eq("id", user_id).execute()
 
 
-def get_user_trust_summary(user_id: str) -> Dict:
+async def get_user_trust_summary(user_id: str) -> Dict:
     """
     Get comprehensive trust summary for a user.
     
@@ -168,30 +241,26 @@ def get_user_trust_summary(user_id: str) -> Dict:
     Returns:
         Dictionary with all trust-related information
     """
-    admin = get_supabase_admin()
+    admin = get_supabase_admin_async()
     
-    # Get trust level and badges
-    trust_info = calculate_trust_level(user_id)
-    
-    # Get response rate
-    response_rate = calculate_response_rate(user_id)
+    profile = await admin.table("profiles").select(
+        "is_verified_email, is_verified_phone, is_verified_community, profile_stats(*)"
+    ).eq("id", user_id).single().execute()
     
-    # Get rating info
-    reviews = admin.table("reviews").select("rating, review_type").eq(
-        "reviewee_id", user_id
-    ).execute()
+    profile_data = profile.data or {}
+    stats = profile_stats_or_default(profile_data.get("profile_stats"))
     
-    owner_ratings = [r["rating"] for r in (reviews.data or []) if r["review_type"] == "renter_to_owner"]
-    renter_ratings = [r["rating"] for r in (reviews.data or []) if r["review_type"] == "owner_to_renter"]
+    # Get trust level and badges
+    trust_info = build_trust_level(profile_data, stats)
     
     return {
         "trust_level": trust_info["level"],
         "badges": trust_info["badges"],
         "badges_display": get_trust_badges_display(trust_info["badges"]),
-        "response_rate": response_rate,
+        "response_rate": response_rate_from_stats(stats),
         "completed_rentals": trust_info["completed_rentals"],
         "is_top_lender": trust_info["is_top_lender"],
-        "rating_as_owner": round(sum(owner_ratings) / len(owner_ratings), 1) if owner_ratings else None,
-        "rating_as_renter": round(sum(renter_ratings) / len(renter_ratings), 1) if renter_ratings else None,
-        "total_reviews": len(reviews.data or [])
+        "rating_as_owner": rating_average(stats["owner_rating_sum"], stats["owner_rating_count"]),
+        "rating_as_renter": rating_average(stats["renter_rating_sum"], stats["renter_rating_count"]),
+        "total_reviews": stats["owner_rating_count"] + stats["renter_rating_count"]
     }
@@ -0,0 +1,130 @@
+"""
+Kloset Kifayah Backend - View Counter
+
+Buffers listing views in memory and writes them behind the request as one
+atomic batched increment, so the detail page never waits on a write.
+
+While the database is failing, flushes back off exponentially and the buffer
+is capped; views beyond the cap are dropped (counts are best effort).
+"""
+import asyncio
+from collections import Counter
+from functools import lru_cache
+from typing import Optional
+
+from app.core.config import get_settings
+from app.core.supabase import get_supabase_admin_async
+
+
+# Longest wait between flushes while they keep failing, in flush intervals
+MAX_BACKOFF_INTERVALS = 32
+
+
+class ViewCounter:
+    """Per-worker buffer of pending listing views."""
+
+    def __init__(
+        self,
+        flush_interval: float = 10.0,
+        max_pending: int = 5000,
+        max_buffered: Optional[int] = None
+    ):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_buffered = max_buffered or max_pending * 4
+        self._pending: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._failures = 0
+        self.dropped = 0
+
+    def record(self, listing_id: str) -> None:
+        """Count one view. Never blocks and never touches the database."""
+        if listing_id not in self._pending and len(self._pending) >= self.max_buffered:
+            self.dropped += 1
+            return
+        self._pending[listing_id] += 1
+        # An early flush only while healthy; when failing, wait out the backoff
+        if self._failures == 0 and len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    @property
+    def next_flush_delay(self) -> float:
+        """Seconds until the next periodic flush (grows while flushes fail)."""
+        return self.flush_interval * min(2 ** self._failures, MAX_BACKOFF_INTERVALS)
+
+    async def flush(self) -> int:
+        """
+        Write all pending views in a single RPC call.
+
+        Returns:
+            Number of listings updated. On failure the counts are put back
+            so the next flush retries them.
+        """
+        if not self._pending:
+            return 0
+
+        batch, self._pending = self._pending, Counter()
+        # Stable lock order across concurrent flushes from other workers
+        listing_ids = sorted(batch)
+
+        try:
+            await get_supabase_admin_async().rpc("increment_view_counts", {
+                "p_listing_ids": listing_ids,
+                "p_counts": [batch[listing_id] for listing_id in listing_ids],
+            }).execute()
+        except Exception:
+            self._failures += 1
+            batch.update(self._pending)
+            if len(batch) > self.max_buffered:
+                # Keep the most viewed listings, drop the long tail
+                kept = Counter(dict(batch.most_common(self.max_buffered)))
+                self.dropped += sum(batch.values()) - sum(kept.values())
+                batch = kept
+            self._pending = batch
+            raise
+
+        self._failures = 0
+        return len(listing_ids)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.next_flush_delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as exc:
+                print(f"⚠️ View count flush failed (retrying in {self.next_flush_delay:.0f}s): {exc}")
+
+    def start(self) -> None:
+        """Start the periodic flush task on the running event loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flush task and write whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as exc:
+            print(f"⚠️ Final view count flush failed: {exc}")
+
+
+@lru_cache()
+def get_view_counter() -> ViewCounter:
+    """Get the process-wide view counter."""
+    settings = get_settings()
+    return ViewCounter(
+        flush_interval=settings.view_count_flush_interval,
+        max_pending=settings.view_count_max_pending,
+        max_buffered=settings.view_count_max_buffered,
+    )
@@ -4,6 +4,10 @@ Utils module.
 from .geo import (
     haversine_distance,
     is_within_radius,
+    haversine_distances,
+    within_radius,
+    k_nearest,
+    bounding_box,
     get_region_center,
     get_nearby_regions,
     normalize_region_name,
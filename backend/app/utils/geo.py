@@ -4,7 +4,13 @@ Kloset Kifayah Backend - Geo Utilities
 Helper functions for location and distance calculations.
 """
 import math
-from typing import Tuple, Optional
+from typing import Tuple, Optional, Sequence, Union
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+Coordinates = Union[Sequence[float], np.ndarray]
 
 
 def haversine_distance(
@@ -21,7 +27,7 @@ def haversine_distance(
     Returns:
         Distance in kilometers
     """
-    R = 6371  # Earth's radius in kilometers
+    R = EARTH_RADIUS_KM
     
     lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
     
@@ -54,6 +60,120 @@ def is_within_radius(
     return distance <= radius_km
 
 
+def haversine_distances(
+    lat: float, lon: float,
+    lats: Coordinates, lons: Coordinates
+) -> np.ndarray:
+    """
+    Calculate distances from one point to many points in a single pass.
+    
+    Args:
+        lat, lon: Origin coordinates
+        lats, lons: Coordinates of the other points (same length)
+        
+    Returns:
+        Array of distances in kilometers, in input order
+    """
+    lat1 = math.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lons, dtype=np.float64))
+    
+    dlat = lat2 - lat1
+    dlon = lon2 - math.radians(lon)
+    
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    
+    return EARTH_RADIUS_KM * c
+
+
+def within_radius(
+    lat: float, lon: float,
+    lats: Coordinates, lons: Coordinates,
+    radius_km: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Check many points against a radius around a center point.
+    
+    Args:
+        lat, lon: Center coordinates
+        lats, lons: Points to check
+        radius_km: Radius in kilometers
+        
+    Returns:
+        Tuple of (distances, mask) where mask is True for points within radius
+    """
+    distances = haversine_distances(lat, lon, lats, lons)
+    return distances, distances <= radius_km
+
+
+def k_nearest(
+    lat: float, lon: float,
+    lats: Coordinates, lons: Coordinates,
+    k: int,
+    radius_km: Optional[float] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the k points closest to a center point.
+    
+    Args:
+        lat, lon: Center coordinates
+        lats, lons: Candidate points
+        k: Number of points to return
+        radius_km: Optionally ignore points further than this
+        
+    Returns:
+        Tuple of (indices, distances), nearest first
+    """
+    distances = haversine_distances(lat, lon, lats, lons)
+    indices = np.arange(distances.size)
+    
+    if radius_km is not None:
+        indices = indices[distances <= radius_km]
+    
+    k = min(k, indices.size)
+    if k <= 0:
+        return indices[:0], distances[:0]
+    
+    # Partial selection first so only the k winners get fully sorted
+    if k < indices.size:
+        indices = indices[np.argpartition(distances[indices], k - 1)[:k]]
+    indices = indices[np.argsort(distances[indices], kind="stable")]
+    
+    return indices, distances[indices]
+
+
+def bounding_box(
+    lat: float, lon: float,
+    radius_km: float
+) -> Tuple[float, float, float, float]:
+    """
+    Get a lat/lon box that fully contains a radius around a point.
+    
+    Cheap to test in the database; exact distances are checked afterwards.
+    
+    Args:
+        lat, lon: Center coordinates
+        radius_km: Radius in kilometers
+        
+    Returns:
+        Tuple of (min_lat, max_lat, min_lon, max_lon)
+    """
+    R = EARTH_RADIUS_KM
+    
+    dlat = math.degrees(radius_km / R)
+    min_lat = max(lat - dlat, -90.0)
+    max_lat = min(lat + dlat, 90.0)
+    
+    # Longitude degrees shrink towards the poles
+    ratio = math.sin(radius_km / R) / max(math.cos(math.radians(lat)), 1e-12)
+    if ratio >= 1 or max_lat >= 90.0 or min_lat <= -90.0:
+        return min_lat, max_lat, -180.0, 180.0
+    
+    dlon = math.degrees(math.asin(ratio))
+    return min_lat, max_lat, max(lon - dlon, -180.0), min(lon + dlon, 180.0)
+
+
 # Predefined region centers (approximate)
 REGION_CENTERS = {
     "GTA": (43.6532, -79.3832),          # Toronto
@@ -68,6 +188,10 @@ REGION_CENTERS = {
     "Vaughan": (43.8361, -79.4983),
 }
 
+_REGION_NAMES = list(REGION_CENTERS)
+_REGION_LATS = np.array([center[0] for center in REGION_CENTERS.values()])
+_REGION_LONS = np.array([center[1] for center in REGION_CENTERS.values()])
+
 
 def get_region_center(region: str) -> Optional[Tuple[float, float]]:
     """
@@ -96,13 +220,8 @@ def get_nearby_regions(
     Returns:
         List of region names within radius
     """
-    nearby = []
-    
-    for region, (region_lat, region_lon) in REGION_CENTERS.items():
-        if is_within_radius(lat, lon, region_lat, region_lon, radius_km):
-            nearby.append(region)
-    
-    return nearby
+    _, mask = within_radius(lat, lon, _REGION_LATS, _REGION_LONS, radius_km)
+    return [_REGION_NAMES[i] for i in np.flatnonzero(mask)]
 
 
 def normalize_region_name(region: str) -> Optional[str]:
@@ -0,0 +1,104 @@
+-- ============================================
+-- CONVERSATION INBOX IN ONE QUERY
+-- Run this in Supabase SQL Editor
+-- ============================================
+
+-- Last message per conversation (newest first) and unread lookups
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created
+    ON messages(conversation_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_unread
+    ON messages(conversation_id, sender_id) WHERE is_read = FALSE;
+CREATE INDEX IF NOT EXISTS idx_conversations_p1_last_message
+    ON conversations(participant_1, last_message_at DESC);
+CREATE INDEX IF NOT EXISTS idx_conversations_p2_last_message
+    ON conversations(participant_2, last_message_at DESC);
+
+-- One page of a user's inbox: conversation, other participant, listing
+-- cover image, last message and the viewer's unread count.
+-- The page is cut first so the lateral lookups only run for its rows.
+CREATE OR REPLACE FUNCTION public.get_conversation_inbox(
+    p_user_id UUID,
+    p_limit INTEGER DEFAULT 20,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    id UUID,
+    listing_id UUID,
+    rental_id UUID,
+    participant_1 UUID,
+    participant_2 UUID,
+    last_message_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ,
+    other_user_id UUID,
+    other_user_name TEXT,
+    other_user_avatar TEXT,
+    listing_title TEXT,
+    listing_image TEXT,
+    last_message_content TEXT,
+    last_message_sender_id UUID,
+    last_message_created_at TIMESTAMPTZ,
+    unread_count INTEGER,
+    total_count BIGINT
+)
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+    WITH page AS (
+        SELECT c.*, COUNT(*) OVER () AS total_count
+        FROM conversations c
+        WHERE c.participant_1 = p_user_id OR c.participant_2 = p_user_id
+        ORDER BY c.last_message_at DESC, c.id DESC
+        LIMIT p_limit OFFSET p_offset
+    )
+    SELECT
+        page.id,
+        page.listing_id,
+        page.rental_id,
+        page.participant_1,
+        page.participant_2,
+        page.last_message_at,
+        page.created_at,
+        other.id,
+        other.full_name,
+        other.avatar_url,
+        l.title,
+        cover.image_url,
+        last_msg.content,
+        last_msg.sender_id,
+        last_msg.created_at,
+        COALESCE(unread.unread_count, 0),
+        page.total_count
+    FROM page
+    LEFT JOIN profiles other ON other.id = CASE
+        WHEN page.participant_1 = p_user_id THEN page.participant_2
+        ELSE page.participant_1
+    END
+    LEFT JOIN listings l ON l.id = page.listing_id
+    LEFT JOIN LATERAL (
+        SELECT li.image_url
+        FROM listing_images li
+        WHERE li.listing_id = page.listing_id
+        ORDER BY li.display_order, li.created_at
+        LIMIT 1
+    ) cover ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT m.content, m.sender_id, m.created_at
+        FROM messages m
+        WHERE m.conversation_id = page.id
+        ORDER BY m.created_at DESC
+        LIMIT 1
+    ) last_msg ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT COUNT(*)::INTEGER AS unread_count
+        FROM messages m
+        WHERE m.conversation_id = page.id
+          AND m.sender_id <> p_user_id
+          AND m.is_read = FALSE
+    ) unread ON TRUE
+    ORDER BY page.last_message_at DESC, page.id DESC;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.get_conversation_inbox(UUID, INTEGER, INTEGER) TO service_role;
+
+SELECT 'Migration 006 complete! Conversation inbox function ready.' as status;
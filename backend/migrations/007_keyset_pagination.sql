@@ -0,0 +1,138 @@
+-- ============================================
+-- KEYSET (CURSOR) PAGINATION
+-- Run this in Supabase SQL Editor
+-- ============================================
+
+-- List endpoints page by (sort key, id). These indexes let each page
+-- start at the cursor instead of scanning and discarding earlier rows.
+
+-- Browse: active + approved listings by each sort key
+CREATE INDEX IF NOT EXISTS idx_listings_browse_created
+    ON listings(created_at DESC, id DESC) WHERE status = 'active' AND is_approved = TRUE;
+CREATE INDEX IF NOT EXISTS idx_listings_browse_price
+    ON listings(price_per_day, id) WHERE status = 'active' AND is_approved = TRUE;
+CREATE INDEX IF NOT EXISTS idx_listings_browse_views
+    ON listings(view_count DESC, id DESC) WHERE status = 'active' AND is_approved = TRUE;
+
+-- User listings, admin approval queue
+CREATE INDEX IF NOT EXISTS idx_listings_owner_created
+    ON listings(owner_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_listings_pending_created
+    ON listings(created_at DESC, id DESC) WHERE status = 'pending' AND is_approved = FALSE;
+
+-- Rentals as renter / owner
+CREATE INDEX IF NOT EXISTS idx_rentals_renter_created
+    ON rentals(renter_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_rentals_owner_created
+    ON rentals(owner_id, created_at DESC, id DESC);
+
+-- Reviews about a user
+CREATE INDEX IF NOT EXISTS idx_reviews_reviewee_created
+    ON reviews(reviewee_id, created_at DESC, id DESC) WHERE is_visible = TRUE;
+
+-- Messages in a conversation (replaces the 006 index with an id tiebreaker)
+DROP INDEX IF EXISTS idx_messages_conversation_created;
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created
+    ON messages(conversation_id, created_at DESC, id DESC);
+
+-- Community codes
+CREATE INDEX IF NOT EXISTS idx_community_codes_created
+    ON community_codes(created_at DESC, id DESC);
+
+-- Inbox: add cursor arguments and make the total optional
+DROP FUNCTION IF EXISTS public.get_conversation_inbox(UUID, INTEGER, INTEGER);
+
+CREATE OR REPLACE FUNCTION public.get_conversation_inbox(
+    p_user_id UUID,
+    p_limit INTEGER DEFAULT 20,
+    p_offset INTEGER DEFAULT 0,
+    p_cursor_at TIMESTAMPTZ DEFAULT NULL,
+    p_cursor_id UUID DEFAULT NULL,
+    p_include_total BOOLEAN DEFAULT TRUE
+)
+RETURNS TABLE (
+    id UUID,
+    listing_id UUID,
+    rental_id UUID,
+    participant_1 UUID,
+    participant_2 UUID,
+    last_message_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ,
+    other_user_id UUID,
+    other_user_name TEXT,
+    other_user_avatar TEXT,
+    listing_title TEXT,
+    listing_image TEXT,
+    last_message_content TEXT,
+    last_message_sender_id UUID,
+    last_message_created_at TIMESTAMPTZ,
+    unread_count INTEGER,
+    total_count BIGINT
+)
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+    WITH page AS (
+        SELECT c.*
+        FROM conversations c
+        WHERE (c.participant_1 = p_user_id OR c.participant_2 = p_user_id)
+          AND (p_cursor_at IS NULL OR (c.last_message_at, c.id) < (p_cursor_at, p_cursor_id))
+        ORDER BY c.last_message_at DESC, c.id DESC
+        LIMIT p_limit OFFSET p_offset
+    )
+    SELECT
+        page.id,
+        page.listing_id,
+        page.rental_id,
+        page.participant_1,
+        page.participant_2,
+        page.last_message_at,
+        page.created_at,
+        other.id,
+        other.full_name,
+        other.avatar_url,
+        l.title,
+        cover.image_url,
+        last_msg.content,
+        last_msg.sender_id,
+        last_msg.created_at,
+        COALESCE(unread.unread_count, 0),
+        -- Uncorrelated subquery: only evaluated when the total is requested
+        CASE WHEN p_include_total THEN (
+            SELECT COUNT(*) FROM conversations c
+            WHERE c.participant_1 = p_user_id OR c.participant_2 = p_user_id
+        ) END
+    FROM page
+    LEFT JOIN profiles other ON other.id = CASE
+        WHEN page.participant_1 = p_user_id THEN page.participant_2
+        ELSE page.participant_1
+    END
+    LEFT JOIN listings l ON l.id = page.listing_id
+    LEFT JOIN LATERAL (
+        SELECT li.image_url
+        FROM listing_images li
+        WHERE li.listing_id = page.listing_id
+        ORDER BY li.display_order, li.created_at
+        LIMIT 1
+    ) cover ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT m.content, m.sender_id, m.created_at
+        FROM messages m
+        WHERE m.conversation_id = page.id
+        ORDER BY m.created_at DESC
+        LIMIT 1
+    ) last_msg ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT COUNT(*)::INTEGER AS unread_count
+        FROM messages m
+        WHERE m.conversation_id = page.id
+          AND m.sender_id <> p_user_id
+          AND m.is_read = FALSE
+    ) unread ON TRUE
+    ORDER BY page.last_message_at DESC, page.id DESC;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.get_conversation_inbox(UUID, INTEGER, INTEGER, TIMESTAMPTZ, UUID, BOOLEAN) TO service_role;
+
+SELECT 'Migration 007 complete! Keyset pagination indexes and inbox cursor ready.' as status;
@@ -0,0 +1,47 @@
+-- ============================================
+-- FULL-TEXT SEARCH FOR LISTINGS
+-- Run this in Supabase SQL Editor
+-- ============================================
+
+-- array_to_string is only STABLE; generated columns need IMMUTABLE
+CREATE OR REPLACE FUNCTION public.immutable_array_to_string(arr TEXT[], sep TEXT)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+    SELECT array_to_string(arr, sep);
+$$;
+
+-- Weighted search document: title > brand/tags > color > description
+ALTER TABLE listings ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', COALESCE(title, '')), 'A') ||
+        setweight(to_tsvector('english', COALESCE(brand, '')), 'B') ||
+        setweight(to_tsvector('english', COALESCE(public.immutable_array_to_string(tags, ' '), '')), 'B') ||
+        setweight(to_tsvector('english', COALESCE(color, '')), 'C') ||
+        setweight(to_tsvector('english', COALESCE(description, '')), 'D')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_listings_search ON listings USING GIN (search_vector);
+
+-- Ranked search over active, approved listings.
+-- Returns SETOF listings so PostgREST can still embed images/owner and
+-- apply the remaining browse filters on top.
+CREATE OR REPLACE FUNCTION public.search_listings(search_query TEXT)
+RETURNS SETOF listings
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+    SELECT l.*
+    FROM listings l, websearch_to_tsquery('english', search_query) AS q
+    WHERE l.search_vector @@ q
+      AND l.status = 'active'
+      AND l.is_approved = TRUE
+    ORDER BY ts_rank(l.search_vector, q) DESC, l.created_at DESC, l.id DESC;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.search_listings(TEXT) TO service_role;
+
+SELECT 'Migration 008 complete! Listing full-text search ready.' as status;
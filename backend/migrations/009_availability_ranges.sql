@@ -0,0 +1,24 @@
+-- ============================================
+-- DATE-RANGE AVAILABILITY FILTERING
+-- Run this in Supabase SQL Editor
+-- ============================================
+
+-- GiST over (uuid, daterange) needs btree_gist
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- Inclusive date ranges, so overlap checks are a single && on an index
+ALTER TABLE listing_availability ADD COLUMN IF NOT EXISTS period DATERANGE
+    GENERATED ALWAYS AS (daterange(start_date, end_date, '[]')) STORED;
+
+ALTER TABLE rentals ADD COLUMN IF NOT EXISTS period DATERANGE
+    GENERATED ALWAYS AS (daterange(start_date, end_date, '[]')) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_listing_availability_period
+    ON listing_availability USING GIST (listing_id, period);
+
+-- Only rentals that hold the dates take part in availability checks
+CREATE INDEX IF NOT EXISTS idx_rentals_active_period
+    ON rentals USING GIST (listing_id, period)
+    WHERE status IN ('pending', 'accepted', 'picked_up');
+
+SELECT 'Migration 009 complete! Availability date ranges ready.' as status;
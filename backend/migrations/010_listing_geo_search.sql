@@ -0,0 +1,11 @@
+-- ============================================
+-- GEO RADIUS SEARCH FOR LISTINGS
+-- Run this in Supabase SQL Editor
+-- ============================================
+
+-- Bounding-box prefilter for browse (exact distance and order: see 021)
+CREATE INDEX IF NOT EXISTS idx_listings_browse_coordinates
+    ON listings(latitude, longitude)
+    WHERE status = 'active' AND is_approved = TRUE AND latitude IS NOT NULL AND longitude IS NOT NULL;
+
+SELECT 'Migration 010 complete! Listing geo index ready.' as status;
@@ -0,0 +1,267 @@
+-- ============================================
+-- DENORMALIZED PROFILE STATS
+-- Run this in Supabase SQL Editor
+-- ============================================
+
+-- One row per profile, kept current by triggers on listings, rentals and
+-- reviews so profile/stats/trust reads are a single primary-key lookup.
+CREATE TABLE IF NOT EXISTS profile_stats (
+    user_id UUID PRIMARY KEY REFERENCES profiles(id) ON DELETE CASCADE,
+
+    -- Listings owned
+    total_listings INTEGER NOT NULL DEFAULT 0,
+    active_listings INTEGER NOT NULL DEFAULT 0,
+
+    -- Rentals
+    rentals_as_owner INTEGER NOT NULL DEFAULT 0,
+    rentals_as_renter INTEGER NOT NULL DEFAULT 0,
+    completed_rentals INTEGER NOT NULL DEFAULT 0,   -- As owner
+    responded_rentals INTEGER NOT NULL DEFAULT 0,   -- As owner: accepted or rejected at some point
+
+    -- Reviews received, by review type (all reviews)
+    owner_rating_sum INTEGER NOT NULL DEFAULT 0,    -- renter_to_owner
+    owner_rating_count INTEGER NOT NULL DEFAULT 0,
+    renter_rating_sum INTEGER NOT NULL DEFAULT 0,   -- owner_to_renter
+    renter_rating_count INTEGER NOT NULL DEFAULT 0,
+
+    -- Rating histogram of visible reviews received
+    rating_1_count INTEGER NOT NULL DEFAULT 0,
+    rating_2_count INTEGER NOT NULL DEFAULT 0,
+    rating_3_count INTEGER NOT NULL DEFAULT 0,
+    rating_4_count INTEGER NOT NULL DEFAULT 0,
+    rating_5_count INTEGER NOT NULL DEFAULT 0,
+
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE profile_stats ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Profile stats are viewable by everyone" ON profile_stats;
+CREATE POLICY "Profile stats are viewable by everyone" ON profile_stats FOR SELECT USING (true);
+
+-- ============================================
+-- TRIGGERS
+-- ============================================
+
+-- Every profile gets a stats row, so the triggers below only UPDATE
+CREATE OR REPLACE FUNCTION public.create_profile_stats()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    INSERT INTO profile_stats (user_id) VALUES (NEW.id) ON CONFLICT (user_id) DO NOTHING;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS on_profile_created_stats ON profiles;
+CREATE TRIGGER on_profile_created_stats
+    AFTER INSERT ON profiles
+    FOR EACH ROW EXECUTE FUNCTION public.create_profile_stats();
+
+-- Listings: delta = +1 for NEW, -1 for OLD
+CREATE OR REPLACE FUNCTION public.apply_listing_stats(l listings, delta INTEGER)
+RETURNS VOID
+LANGUAGE sql
+SET search_path = public
+AS $$
+    UPDATE profile_stats SET
+        total_listings = total_listings + delta,
+        active_listings = active_listings + delta * (l.status = 'active' IS TRUE)::INTEGER,
+        updated_at = NOW()
+    WHERE user_id = l.owner_id;
+$$;
+
+CREATE OR REPLACE FUNCTION public.listings_profile_stats()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_listing_stats(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_listing_stats(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS on_listing_profile_stats ON listings;
+CREATE TRIGGER on_listing_profile_stats
+    AFTER INSERT OR DELETE OR UPDATE OF owner_id, status ON listings
+    FOR EACH ROW EXECUTE FUNCTION public.listings_profile_stats();
+
+-- Rentals
+CREATE OR REPLACE FUNCTION public.apply_rental_stats(r rentals, delta INTEGER)
+RETURNS VOID
+LANGUAGE sql
+SET search_path = public
+AS $$
+    UPDATE profile_stats SET
+        rentals_as_owner = rentals_as_owner + delta,
+        completed_rentals = completed_rentals + delta * (r.status = 'completed' IS TRUE)::INTEGER,
+        responded_rentals = responded_rentals + delta * (
+            r.status IN ('accepted', 'rejected', 'picked_up', 'returned', 'completed') IS TRUE
+        )::INTEGER,
+        updated_at = NOW()
+    WHERE user_id = r.owner_id;
+
+    UPDATE profile_stats SET
+        rentals_as_renter = rentals_as_renter + delta,
+        updated_at = NOW()
+    WHERE user_id = r.renter_id;
+$$;
+
+CREATE OR REPLACE FUNCTION public.rentals_profile_stats()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_rental_stats(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_rental_stats(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS on_rental_profile_stats ON rentals;
+CREATE TRIGGER on_rental_profile_stats
+    AFTER INSERT OR DELETE OR UPDATE OF owner_id, renter_id, status ON rentals
+    FOR EACH ROW EXECUTE FUNCTION public.rentals_profile_stats();
+
+-- Reviews
+CREATE OR REPLACE FUNCTION public.apply_review_stats(rv reviews, delta INTEGER)
+RETURNS VOID
+LANGUAGE sql
+SET search_path = public
+AS $$
+    UPDATE profile_stats SET
+        owner_rating_sum = owner_rating_sum + delta * rv.rating * (rv.review_type = 'renter_to_owner')::INTEGER,
+        owner_rating_count = owner_rating_count + delta * (rv.review_type = 'renter_to_owner')::INTEGER,
+        renter_rating_sum = renter_rating_sum + delta * rv.rating * (rv.review_type <> 'renter_to_owner')::INTEGER,
+        renter_rating_count = renter_rating_count + delta * (rv.review_type <> 'renter_to_owner')::INTEGER,
+        rating_1_count = rating_1_count + delta * ((rv.is_visible AND rv.rating = 1) IS TRUE)::INTEGER,
+        rating_2_count = rating_2_count + delta * ((rv.is_visible AND rv.rating = 2) IS TRUE)::INTEGER,
+        rating_3_count = rating_3_count + delta * ((rv.is_visible AND rv.rating = 3) IS TRUE)::INTEGER,
+        rating_4_count = rating_4_count + delta * ((rv.is_visible AND rv.rating = 4) IS TRUE)::INTEGER,
+        rating_5_count = rating_5_count + delta * ((rv.is_visible AND rv.rating = 5) IS TRUE)::INTEGER,
+        updated_at = NOW()
+    WHERE user_id = rv.reviewee_id;
+$$;
+
+CREATE OR REPLACE FUNCTION public.reviews_profile_stats()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_review_stats(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_review_stats(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS on_review_profile_stats ON reviews;
+CREATE TRIGGER on_review_profile_stats
+    AFTER INSERT OR DELETE OR UPDATE OF reviewee_id, rating, review_type, is_visible ON reviews
+    FOR EACH ROW EXECUTE FUNCTION public.reviews_profile_stats();
+
+-- ============================================
+-- BACKFILL / REPAIR
+-- ============================================
+
+-- Recompute stats from scratch (all profiles, or one when p_user_id is given)
+CREATE OR REPLACE FUNCTION public.refresh_profile_stats(p_user_id UUID DEFAULT NULL)
+RETURNS VOID
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    INSERT INTO profile_stats (
+        user_id, total_listings, active_listings,
+        rentals_as_owner, rentals_as_renter, completed_rentals, responded_rentals,
+        owner_rating_sum, owner_rating_count, renter_rating_sum, renter_rating_count,
+        rating_1_count, rating_2_count, rating_3_count, rating_4_count, rating_5_count,
+        updated_at
+    )
+    SELECT
+        p.id,
+        COALESCE(l.total, 0), COALESCE(l.active, 0),
+        COALESCE(ro.total, 0), COALESCE(rr.total, 0), COALESCE(ro.completed, 0), COALESCE(ro.responded, 0),
+        COALESCE(rv.owner_sum, 0), COALESCE(rv.owner_count, 0),
+        COALESCE(rv.renter_sum, 0), COALESCE(rv.renter_count, 0),
+        COALESCE(rv.r1, 0), COALESCE(rv.r2, 0), COALESCE(rv.r3, 0), COALESCE(rv.r4, 0), COALESCE(rv.r5, 0),
+        NOW()
+    FROM profiles p
+    LEFT JOIN (
+        SELECT owner_id,
+               COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE status = 'active') AS active
+        FROM listings GROUP BY owner_id
+    ) l ON l.owner_id = p.id
+    LEFT JOIN (
+        SELECT owner_id,
+               COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+               COUNT(*) FILTER (
+                   WHERE status IN ('accepted', 'rejected', 'picked_up', 'returned', 'completed')
+               ) AS responded
+        FROM rentals GROUP BY owner_id
+    ) ro ON ro.owner_id = p.id
+    LEFT JOIN (
+        SELECT renter_id, COUNT(*) AS total FROM rentals GROUP BY renter_id
+    ) rr ON rr.renter_id = p.id
+    LEFT JOIN (
+        SELECT reviewee_id,
+               SUM(rating) FILTER (WHERE review_type = 'renter_to_owner') AS owner_sum,
+               COUNT(*) FILTER (WHERE review_type = 'renter_to_owner') AS owner_count,
+               SUM(rating) FILTER (WHERE review_type <> 'renter_to_owner') AS renter_sum,
+               COUNT(*) FILTER (WHERE review_type <> 'renter_to_owner') AS renter_count,
+               COUNT(*) FILTER (WHERE is_visible AND rating = 1) AS r1,
+               COUNT(*) FILTER (WHERE is_visible AND rating = 2) AS r2,
+               COUNT(*) FILTER (WHERE is_visible AND rating = 3) AS r3,
+               COUNT(*) FILTER (WHERE is_visible AND rating = 4) AS r4,
+               COUNT(*) FILTER (WHERE is_visible AND rating = 5) AS r5
+        FROM reviews GROUP BY reviewee_id
+    ) rv ON rv.reviewee_id = p.id
+    WHERE p_user_id IS NULL OR p.id = p_user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_listings = EXCLUDED.total_listings,
+        active_listings = EXCLUDED.active_listings,
+        rentals_as_owner = EXCLUDED.rentals_as_owner,
+        rentals_as_renter = EXCLUDED.rentals_as_renter,
+        completed_rentals = EXCLUDED.completed_rentals,
+        responded_rentals = EXCLUDED.responded_rentals,
+        owner_rating_sum = EXCLUDED.owner_rating_sum,
+        owner_rating_count = EXCLUDED.owner_rating_count,
+        renter_rating_sum = EXCLUDED.renter_rating_sum,
+        renter_rating_count = EXCLUDED.renter_rating_count,
+        rating_1_count = EXCLUDED.rating_1_count,
+        rating_2_count = EXCLUDED.rating_2_count,
+        rating_3_count = EXCLUDED.rating_3_count,
+        rating_4_count = EXCLUDED.rating_4_count,
+        rating_5_count = EXCLUDED.rating_5_count,
+        updated_at = EXCLUDED.updated_at;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.refresh_profile_stats(UUID) TO service_role;
+REVOKE EXECUTE ON FUNCTION public.refresh_profile_stats(UUID) FROM PUBLIC, anon, authenticated;
+
+SELECT public.refresh_profile_stats();
+
+SELECT 'Migration 011 complete! Profile stats ready.' as status;
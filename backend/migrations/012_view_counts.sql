@@ -0,0 +1,27 @@
+-- ============================================
+-- BATCHED VIEW COUNT INCREMENTS
+-- Run this in Supabase SQL Editor
+-- ============================================
+
+-- Apply buffered listing views in one statement. Each row is incremented
+-- in place (view_count = view_count + n), so concurrent flushes from
+-- several workers never lose updates.
+CREATE OR REPLACE FUNCTION public.increment_view_counts(
+    p_listing_ids UUID[],
+    p_counts INTEGER[]
+)
+RETURNS VOID
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    UPDATE listings l
+    SET view_count = COALESCE(l.view_count, 0) + v.views
+    FROM unnest(p_listing_ids, p_counts) AS v(listing_id, views)
+    WHERE l.id = v.listing_id;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.increment_view_counts(UUID[], INTEGER[]) TO service_role;
+REVOKE EXECUTE ON FUNCTION public.increment_view_counts(UUID[], INTEGER[]) FROM PUBLIC, anon, authenticated;
+
+SELECT 'Migration 012 complete! Batched view counts ready.' as status;
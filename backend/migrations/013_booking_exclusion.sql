@@ -0,0 +1,74 @@
+-- ============================================
+-- RACE-FREE DOUBLE-BOOKING PREVENTION
+-- Run this in Supabase SQL Editor
+-- ============================================
+-- Requires 009 (period columns + btree_gist). Adding the constraints fails
+-- if overlapping rows already exist; resolve those first.
+
+-- Blocked periods on a listing can never overlap each other
+ALTER TABLE listing_availability DROP CONSTRAINT IF EXISTS listing_availability_no_overlap;
+ALTER TABLE listing_availability ADD CONSTRAINT listing_availability_no_overlap
+    EXCLUDE USING gist (listing_id WITH =, period WITH &&);
+
+-- Nor can rentals that hold the dates (pending, accepted, picked up)
+ALTER TABLE rentals DROP CONSTRAINT IF EXISTS rentals_no_overlap;
+ALTER TABLE rentals ADD CONSTRAINT rentals_no_overlap
+    EXCLUDE USING gist (listing_id WITH =, period WITH &&)
+    WHERE (status IN ('pending', 'accepted', 'picked_up'));
+
+-- The constraint's index replaces the partial index from 009
+DROP INDEX IF EXISTS idx_rentals_active_period;
+DROP INDEX IF EXISTS idx_listing_availability_period;
+
+-- A rental must not overlap the owner's blocked periods (its own block, added
+-- on accept, is fine). Exclusion constraints cannot span tables, so both
+-- tables take the same per-listing lock and rentals check blocks here.
+CREATE OR REPLACE FUNCTION public.lock_listing_dates()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtextextended(NEW.listing_id::TEXT, 0));
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS on_listing_availability_lock ON listing_availability;
+CREATE TRIGGER on_listing_availability_lock
+    BEFORE INSERT OR UPDATE OF listing_id, start_date, end_date ON listing_availability
+    FOR EACH ROW EXECUTE FUNCTION public.lock_listing_dates();
+
+CREATE OR REPLACE FUNCTION public.check_rental_against_blocks()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+BEGIN
+    IF NEW.status NOT IN ('pending', 'accepted', 'picked_up') THEN
+        RETURN NEW;
+    END IF;
+
+    PERFORM pg_advisory_xact_lock(hashtextextended(NEW.listing_id::TEXT, 0));
+
+    IF EXISTS (
+        SELECT 1 FROM listing_availability a
+        WHERE a.listing_id = NEW.listing_id
+          AND a.period && daterange(NEW.start_date, NEW.end_date, '[]')
+          AND a.rental_id IS DISTINCT FROM NEW.id
+    ) THEN
+        RAISE EXCEPTION USING
+            ERRCODE = 'exclusion_violation',
+            MESSAGE = 'conflicting key value violates exclusion constraint "rentals_blocked_dates"';
+    END IF;
+
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS on_rental_check_blocks ON rentals;
+CREATE TRIGGER on_rental_check_blocks
+    BEFORE INSERT OR UPDATE OF listing_id, start_date, end_date, status ON rentals
+    FOR EACH ROW EXECUTE FUNCTION public.check_rental_against_blocks();
+
+SELECT 'Migration 013 complete! Overlapping bookings are rejected by the database.' as status;
@@ -0,0 +1,236 @@
+-- ============================================
+-- RENTAL STATE TRANSITIONS AS DATABASE FUNCTIONS
+-- Run this in Supabase SQL Editor
+-- ============================================
+-- Each transition locks the rental, checks the actor and current status,
+-- applies every write in one transaction and returns the updated row
+-- (as a one-row set, so PostgREST responds with a JSON array).
+-- Errors use SQLSTATEs the API maps to HTTP statuses:
+--   P0002 (no_data_found)          -> 404
+--   42501 (insufficient_privilege) -> 403
+--   P0001 (raise_exception)        -> 400
+
+-- Shared guard: lock the row, then check actor and current status.
+-- p_status_error is a format() string that receives the current status.
+CREATE OR REPLACE FUNCTION public.lock_rental_for_transition(
+    p_rental_id UUID,
+    p_actor_id UUID,
+    p_owner_only BOOLEAN,
+    p_forbidden_error TEXT,
+    p_from_statuses TEXT[],
+    p_status_error TEXT
+)
+RETURNS rentals
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+    r rentals;
+BEGIN
+    SELECT * INTO r FROM rentals WHERE id = p_rental_id FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Rental not found' USING ERRCODE = 'no_data_found';
+    END IF;
+
+    IF p_actor_id IS DISTINCT FROM r.owner_id
+       AND (p_owner_only OR p_actor_id IS DISTINCT FROM r.renter_id) THEN
+        RAISE EXCEPTION '%', p_forbidden_error USING ERRCODE = 'insufficient_privilege';
+    END IF;
+
+    IF NOT COALESCE(r.status = ANY (p_from_statuses), FALSE) THEN
+        RAISE EXCEPTION '%', format(p_status_error, r.status) USING ERRCODE = 'raise_exception';
+    END IF;
+
+    RETURN r;
+END;
+$$;
+
+-- Owner accepts: status + block the dates on the listing
+CREATE OR REPLACE FUNCTION public.accept_rental(
+    p_rental_id UUID,
+    p_actor_id UUID,
+    p_owner_notes TEXT DEFAULT NULL
+)
+RETURNS SETOF rentals
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    r rentals;
+BEGIN
+    r := lock_rental_for_transition(
+        p_rental_id, p_actor_id, TRUE, 'Only the owner can accept rentals',
+        ARRAY['pending'], 'Cannot accept rental in %s status'
+    );
+
+    UPDATE rentals SET status = 'accepted', owner_notes = p_owner_notes
+    WHERE id = p_rental_id
+    RETURNING * INTO r;
+
+    INSERT INTO listing_availability (listing_id, start_date, end_date, reason, rental_id)
+    VALUES (r.listing_id, r.start_date, r.end_date, 'rental', r.id);
+
+    RETURN NEXT r;
+END;
+$$;
+
+-- Owner rejects
+CREATE OR REPLACE FUNCTION public.reject_rental(
+    p_rental_id UUID,
+    p_actor_id UUID,
+    p_reason TEXT DEFAULT NULL
+)
+RETURNS SETOF rentals
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    r rentals;
+BEGIN
+    r := lock_rental_for_transition(
+        p_rental_id, p_actor_id, TRUE, 'Only the owner can reject rentals',
+        ARRAY['pending'], 'Cannot reject rental in %s status'
+    );
+
+    UPDATE rentals SET status = 'rejected', cancellation_reason = p_reason
+    WHERE id = p_rental_id
+    RETURNING * INTO r;
+
+    RETURN NEXT r;
+END;
+$$;
+
+-- Either party marks pickup: listing becomes rented
+CREATE OR REPLACE FUNCTION public.pickup_rental(
+    p_rental_id UUID,
+    p_actor_id UUID
+)
+RETURNS SETOF rentals
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    r rentals;
+BEGIN
+    r := lock_rental_for_transition(
+        p_rental_id, p_actor_id, FALSE, 'Only rental participants can update status',
+        ARRAY['accepted'], 'Cannot mark pickup for rental in %s status'
+    );
+
+    UPDATE rentals SET status = 'picked_up', picked_up_at = NOW()
+    WHERE id = p_rental_id
+    RETURNING * INTO r;
+
+    UPDATE listings SET status = 'rented' WHERE id = r.listing_id;
+
+    RETURN NEXT r;
+END;
+$$;
+
+-- Either party marks return
+CREATE OR REPLACE FUNCTION public.return_rental(
+    p_rental_id UUID,
+    p_actor_id UUID
+)
+RETURNS SETOF rentals
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    r rentals;
+BEGIN
+    r := lock_rental_for_transition(
+        p_rental_id, p_actor_id, FALSE, 'Only rental participants can update status',
+        ARRAY['picked_up'], 'Cannot mark return for rental in %s status'
+    );
+
+    UPDATE rentals SET status = 'returned', returned_at = NOW()
+    WHERE id = p_rental_id
+    RETURNING * INTO r;
+
+    RETURN NEXT r;
+END;
+$$;
+
+-- Owner completes: payment released, listing active again
+CREATE OR REPLACE FUNCTION public.complete_rental(
+    p_rental_id UUID,
+    p_actor_id UUID
+)
+RETURNS SETOF rentals
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    r rentals;
+BEGIN
+    r := lock_rental_for_transition(
+        p_rental_id, p_actor_id, TRUE, 'Only the owner can complete rentals',
+        ARRAY['returned'], 'Cannot complete rental in %s status'
+    );
+
+    UPDATE rentals SET status = 'completed', payment_status = 'paid'
+    WHERE id = p_rental_id
+    RETURNING * INTO r;
+
+    UPDATE listings SET status = 'active' WHERE id = r.listing_id;
+
+    RETURN NEXT r;
+END;
+$$;
+
+-- Either party cancels before pickup: refund and release the dates
+CREATE OR REPLACE FUNCTION public.cancel_rental(
+    p_rental_id UUID,
+    p_actor_id UUID,
+    p_reason TEXT DEFAULT NULL
+)
+RETURNS SETOF rentals
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    r rentals;
+BEGIN
+    r := lock_rental_for_transition(
+        p_rental_id, p_actor_id, FALSE, 'Only rental participants can cancel',
+        ARRAY['pending', 'accepted'], 'Cannot cancel rental in %s status'
+    );
+
+    UPDATE rentals SET
+        status = 'cancelled',
+        cancellation_reason = p_reason,
+        payment_status = 'refunded'
+    WHERE id = p_rental_id
+    RETURNING * INTO r;
+
+    DELETE FROM listing_availability WHERE rental_id = r.id;
+
+    RETURN NEXT r;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.accept_rental(UUID, UUID, TEXT) TO service_role;
+GRANT EXECUTE ON FUNCTION public.reject_rental(UUID, UUID, TEXT) TO service_role;
+GRANT EXECUTE ON FUNCTION public.pickup_rental(UUID, UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION public.return_rental(UUID, UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION public.complete_rental(UUID, UUID) TO service_role;
+GRANT EXECUTE ON FUNCTION public.cancel_rental(UUID, UUID, TEXT) TO service_role;
+
+-- The actor is passed in by the API, so clients must not call these directly
+REVOKE EXECUTE ON FUNCTION public.lock_rental_for_transition(UUID, UUID, BOOLEAN, TEXT, TEXT[], TEXT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.accept_rental(UUID, UUID, TEXT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.reject_rental(UUID, UUID, TEXT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.pickup_rental(UUID, UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.return_rental(UUID, UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.complete_rental(UUID, UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.cancel_rental(UUID, UUID, TEXT) FROM PUBLIC, anon, authenticated;
+
+SELECT 'Migration 014 complete! Rental transitions ready.' as status;
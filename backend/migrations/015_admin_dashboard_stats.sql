@@ -0,0 +1,47 @@
+-- ============================================
+-- ADMIN DASHBOARD STATS IN ONE QUERY
+-- Run this in Supabase SQL Editor
+-- ============================================
+
+-- Every dashboard counter in one call: a single pass per table with
+-- COUNT(*) FILTER instead of one count query per number.
+CREATE OR REPLACE FUNCTION public.admin_dashboard_stats()
+RETURNS TABLE (
+    total_users BIGINT,
+    verified_users BIGINT,
+    total_listings BIGINT,
+    pending_listings BIGINT,
+    active_listings BIGINT,
+    total_rentals BIGINT,
+    completed_rentals BIGINT,
+    active_rentals BIGINT
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    SELECT u.total, u.verified, l.total, l.pending, l.active, r.total, r.completed, r.active
+    FROM (
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE is_verified_community) AS verified
+        FROM profiles
+    ) u,
+    (
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE status = 'pending') AS pending,
+               COUNT(*) FILTER (WHERE status = 'active') AS active
+        FROM listings
+    ) l,
+    (
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+               COUNT(*) FILTER (WHERE status IN ('pending', 'accepted', 'picked_up')) AS active
+        FROM rentals
+    ) r;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.admin_dashboard_stats() TO service_role;
+REVOKE EXECUTE ON FUNCTION public.admin_dashboard_stats() FROM PUBLIC, anon, authenticated;
+
+SELECT 'Migration 015 complete! Admin dashboard stats ready.' as status;
@@ -0,0 +1,127 @@
+-- ============================================
+-- OWNER-SCOPED LISTING WRITES
+-- Run this in Supabase SQL Editor
+-- ============================================
+-- The API filters listing writes by owner_id instead of checking ownership
+-- with a separate SELECT first. Rules that used to live in that pre-flight
+-- step move here, so each write is a single statement.
+-- Errors use the SQLSTATEs from 014:
+--   P0002 (no_data_found)          -> 404
+--   42501 (insufficient_privilege) -> 403
+--   P0001 (raise_exception)        -> 400
+
+-- A listing with rentals in progress cannot be deleted (rentals cascade)
+CREATE OR REPLACE FUNCTION public.prevent_listing_delete_with_active_rentals()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM rentals
+        WHERE listing_id = OLD.id
+          AND status IN ('pending', 'accepted', 'picked_up')
+    ) THEN
+        RAISE EXCEPTION 'Cannot delete listing with active rentals' USING ERRCODE = 'raise_exception';
+    END IF;
+    RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS on_listing_delete_check_rentals ON listings;
+CREATE TRIGGER on_listing_delete_check_rentals
+    BEFORE DELETE ON listings
+    FOR EACH ROW EXECUTE FUNCTION public.prevent_listing_delete_with_active_rentals();
+
+-- Shared guard: the listing exists and belongs to the actor
+CREATE OR REPLACE FUNCTION public.check_listing_owner(
+    p_listing_id UUID,
+    p_actor_id UUID
+)
+RETURNS VOID
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+DECLARE
+    v_owner_id UUID;
+BEGIN
+    SELECT owner_id INTO v_owner_id FROM listings WHERE id = p_listing_id;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Listing not found' USING ERRCODE = 'no_data_found';
+    END IF;
+
+    IF v_owner_id IS DISTINCT FROM p_actor_id THEN
+        RAISE EXCEPTION 'You can only manage your own listings' USING ERRCODE = 'insufficient_privilege';
+    END IF;
+END;
+$$;
+
+-- Owner blocks dates (overlaps still fail on listing_availability_no_overlap)
+CREATE OR REPLACE FUNCTION public.block_listing_dates(
+    p_listing_id UUID,
+    p_actor_id UUID,
+    p_start_date DATE,
+    p_end_date DATE,
+    p_reason TEXT DEFAULT 'blocked'
+)
+RETURNS SETOF listing_availability
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    PERFORM check_listing_owner(p_listing_id, p_actor_id);
+
+    RETURN QUERY
+    INSERT INTO listing_availability (listing_id, start_date, end_date, reason)
+    VALUES (p_listing_id, p_start_date, p_end_date, p_reason)
+    RETURNING *;
+END;
+$$;
+
+-- Owner removes a block they added (blocks held by rentals stay)
+CREATE OR REPLACE FUNCTION public.unblock_listing_dates(
+    p_listing_id UUID,
+    p_actor_id UUID,
+    p_availability_id UUID
+)
+RETURNS SETOF listing_availability
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    a listing_availability;
+BEGIN
+    PERFORM check_listing_owner(p_listing_id, p_actor_id);
+
+    DELETE FROM listing_availability
+    WHERE id = p_availability_id
+      AND listing_id = p_listing_id
+      AND rental_id IS NULL
+    RETURNING * INTO a;
+
+    IF NOT FOUND THEN
+        IF EXISTS (
+            SELECT 1 FROM listing_availability
+            WHERE id = p_availability_id AND listing_id = p_listing_id
+        ) THEN
+            RAISE EXCEPTION 'Cannot remove blocks caused by rentals' USING ERRCODE = 'raise_exception';
+        END IF;
+        RAISE EXCEPTION 'Blocked period not found' USING ERRCODE = 'no_data_found';
+    END IF;
+
+    RETURN NEXT a;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.block_listing_dates(UUID, UUID, DATE, DATE, TEXT) TO service_role;
+GRANT EXECUTE ON FUNCTION public.unblock_listing_dates(UUID, UUID, UUID) TO service_role;
+
+-- The actor is passed in by the API, so clients must not call these directly
+REVOKE EXECUTE ON FUNCTION public.check_listing_owner(UUID, UUID) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.block_listing_dates(UUID, UUID, DATE, DATE, TEXT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION public.unblock_listing_dates(UUID, UUID, UUID) FROM PUBLIC, anon, authenticated;
+
+SELECT 'Migration 016 complete! Owner-scoped listing writes ready.' as status;
@@ -0,0 +1,29 @@
+-- ============================================
+-- RENTAL CONTRACTS STORED OUTSIDE THE RENTALS ROW
+-- Run this in Supabase SQL Editor
+-- ============================================
+-- Generated contracts are kept gzip-compressed in their own table, keyed by
+-- rental, with a hash of the HTML that the API uses as the ETag.
+-- rentals.contract_html is no longer written; existing values are moved
+-- here by the API the first time each contract is requested.
+
+CREATE TABLE IF NOT EXISTS rental_contracts (
+    rental_id UUID PRIMARY KEY REFERENCES rentals(id) ON DELETE CASCADE,
+    content_hash TEXT NOT NULL,        -- sha256 of the uncompressed HTML
+    body_gzip BYTEA NOT NULL,          -- gzip-compressed HTML
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- The body is already compressed; skip TOAST's own compression attempt
+ALTER TABLE rental_contracts ALTER COLUMN body_gzip SET STORAGE EXTERNAL;
+
+DROP TRIGGER IF EXISTS update_rental_contracts_updated_at ON rental_contracts;
+CREATE TRIGGER update_rental_contracts_updated_at
+    BEFORE UPDATE ON rental_contracts
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Only the API (service role) reads and writes contracts
+ALTER TABLE rental_contracts ENABLE ROW LEVEL SECURITY;
+
+SELECT 'Migration 017 complete! Rental contracts table ready.' as status;
@@ -0,0 +1,53 @@
+-- ============================================
+-- CONTRACT GENERATION STATUS
+-- Run this in Supabase SQL Editor
+-- ============================================
+-- Requires 014 and 017. Contracts are rendered in the background after a
+-- rental is accepted; contract_status tells clients when it is ready:
+--   NULL     no contract (not accepted yet)
+--   pending  accepted, contract being generated
+--   ready    stored in rental_contracts (or legacy rentals.contract_html)
+--   failed   generation failed
+
+ALTER TABLE rentals ADD COLUMN IF NOT EXISTS contract_status TEXT
+    CHECK (contract_status IN ('pending', 'ready', 'failed'));
+
+UPDATE rentals r SET contract_status = 'ready'
+WHERE r.contract_status IS NULL
+  AND (r.contract_html IS NOT NULL
+       OR EXISTS (SELECT 1 FROM rental_contracts c WHERE c.rental_id = r.id));
+
+-- Accepting now also marks the contract as pending, in the same transaction
+CREATE OR REPLACE FUNCTION public.accept_rental(
+    p_rental_id UUID,
+    p_actor_id UUID,
+    p_owner_notes TEXT DEFAULT NULL
+)
+RETURNS SETOF rentals
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    r rentals;
+BEGIN
+    r := lock_rental_for_transition(
+        p_rental_id, p_actor_id, TRUE, 'Only the owner can accept rentals',
+        ARRAY['pending'], 'Cannot accept rental in %s status'
+    );
+
+    UPDATE rentals SET
+        status = 'accepted',
+        owner_notes = p_owner_notes,
+        contract_status = 'pending'
+    WHERE id = p_rental_id
+    RETURNING * INTO r;
+
+    INSERT INTO listing_availability (listing_id, start_date, end_date, reason, rental_id)
+    VALUES (r.listing_id, r.start_date, r.end_date, 'rental', r.id);
+
+    RETURN NEXT r;
+END;
+$$;
+
+SELECT 'Migration 018 complete! Contract status ready.' as status;
@@ -0,0 +1,184 @@
+-- ============================================
+-- READ WATERMARKS PER CONVERSATION PARTICIPANT
+-- Run this in Supabase SQL Editor
+-- ============================================
+-- Requires 007. Instead of flipping messages.is_read on every row, each
+-- participant has a last-read timestamp on the conversation: a message is
+-- read by its recipient when created_at <= that watermark. Marking a
+-- conversation read is one row update; unread counts are a range scan on
+-- idx_messages_conversation_created (conversation_id, created_at DESC).
+-- messages.is_read is no longer written.
+
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS participant_1_last_read_at TIMESTAMPTZ;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS participant_2_last_read_at TIMESTAMPTZ;
+
+-- Backfill: read up to just before the participant's oldest unread message,
+-- or up to the latest message when nothing is unread
+UPDATE conversations c SET
+    participant_1_last_read_at = COALESCE(
+        (SELECT MIN(m.created_at) - INTERVAL '1 microsecond' FROM messages m
+         WHERE m.conversation_id = c.id AND m.sender_id <> c.participant_1 AND m.is_read = FALSE),
+        (SELECT MAX(m.created_at) FROM messages m WHERE m.conversation_id = c.id),
+        c.created_at
+    ),
+    participant_2_last_read_at = COALESCE(
+        (SELECT MIN(m.created_at) - INTERVAL '1 microsecond' FROM messages m
+         WHERE m.conversation_id = c.id AND m.sender_id <> c.participant_2 AND m.is_read = FALSE),
+        (SELECT MAX(m.created_at) FROM messages m WHERE m.conversation_id = c.id),
+        c.created_at
+    )
+WHERE c.participant_1_last_read_at IS NULL AND c.participant_2_last_read_at IS NULL;
+
+-- Replaced by the watermark comparison
+DROP INDEX IF EXISTS idx_messages_conversation_unread;
+
+-- Mark everything up to p_read_at (default now) as read for one participant.
+-- Pass the newest message actually shown, so a message that arrives while
+-- the page is being served is not marked read unseen. The watermark never
+-- moves backwards. Returns the conversation's participants and the new
+-- watermark.
+CREATE OR REPLACE FUNCTION public.mark_conversation_read(
+    p_conversation_id UUID,
+    p_user_id UUID,
+    p_read_at TIMESTAMPTZ DEFAULT NULL
+)
+RETURNS TABLE (
+    participant_1 UUID,
+    participant_2 UUID,
+    last_read_at TIMESTAMPTZ
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    c conversations;
+BEGIN
+    UPDATE conversations SET
+        participant_1_last_read_at = CASE WHEN conversations.participant_1 = p_user_id
+            THEN GREATEST(participant_1_last_read_at, COALESCE(p_read_at, NOW())) ELSE participant_1_last_read_at END,
+        participant_2_last_read_at = CASE WHEN conversations.participant_2 = p_user_id
+            THEN GREATEST(participant_2_last_read_at, COALESCE(p_read_at, NOW())) ELSE participant_2_last_read_at END
+    WHERE id = p_conversation_id
+      AND (conversations.participant_1 = p_user_id OR conversations.participant_2 = p_user_id)
+    RETURNING * INTO c;
+
+    IF NOT FOUND THEN
+        IF EXISTS (SELECT 1 FROM conversations WHERE id = p_conversation_id) THEN
+            RAISE EXCEPTION 'You don''t have access to this conversation' USING ERRCODE = 'insufficient_privilege';
+        END IF;
+        RAISE EXCEPTION 'Conversation not found' USING ERRCODE = 'no_data_found';
+    END IF;
+
+    RETURN QUERY SELECT
+        c.participant_1,
+        c.participant_2,
+        CASE WHEN c.participant_1 = p_user_id
+            THEN c.participant_1_last_read_at ELSE c.participant_2_last_read_at END;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.mark_conversation_read(UUID, UUID, TIMESTAMPTZ) TO service_role;
+
+-- The user is passed in by the API, so clients must not call this directly
+REVOKE EXECUTE ON FUNCTION public.mark_conversation_read(UUID, UUID, TIMESTAMPTZ) FROM PUBLIC, anon, authenticated;
+
+-- Inbox: unread = the other side's messages after the viewer's watermark
+CREATE OR REPLACE FUNCTION public.get_conversation_inbox(
+    p_user_id UUID,
+    p_limit INTEGER DEFAULT 20,
+    p_offset INTEGER DEFAULT 0,
+    p_cursor_at TIMESTAMPTZ DEFAULT NULL,
+    p_cursor_id UUID DEFAULT NULL,
+    p_include_total BOOLEAN DEFAULT TRUE
+)
+RETURNS TABLE (
+    id UUID,
+    listing_id UUID,
+    rental_id UUID,
+    participant_1 UUID,
+    participant_2 UUID,
+    last_message_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ,
+    other_user_id UUID,
+    other_user_name TEXT,
+    other_user_avatar TEXT,
+    listing_title TEXT,
+    listing_image TEXT,
+    last_message_content TEXT,
+    last_message_sender_id UUID,
+    last_message_created_at TIMESTAMPTZ,
+    unread_count INTEGER,
+    total_count BIGINT
+)
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+    WITH page AS (
+        SELECT c.*
+        FROM conversations c
+        WHERE (c.participant_1 = p_user_id OR c.participant_2 = p_user_id)
+          AND (p_cursor_at IS NULL OR (c.last_message_at, c.id) < (p_cursor_at, p_cursor_id))
+        ORDER BY c.last_message_at DESC, c.id DESC
+        LIMIT p_limit OFFSET p_offset
+    )
+    SELECT
+        page.id,
+        page.listing_id,
+        page.rental_id,
+        page.participant_1,
+        page.participant_2,
+        page.last_message_at,
+        page.created_at,
+        other.id,
+        other.full_name,
+        other.avatar_url,
+        l.title,
+        cover.image_url,
+        last_msg.content,
+        last_msg.sender_id,
+        last_msg.created_at,
+        COALESCE(unread.unread_count, 0),
+        -- Uncorrelated subquery: only evaluated when the total is requested
+        CASE WHEN p_include_total THEN (
+            SELECT COUNT(*) FROM conversations c
+            WHERE c.participant_1 = p_user_id OR c.participant_2 = p_user_id
+        ) END
+    FROM page
+    LEFT JOIN profiles other ON other.id = CASE
+        WHEN page.participant_1 = p_user_id THEN page.participant_2
+        ELSE page.participant_1
+    END
+    LEFT JOIN listings l ON l.id = page.listing_id
+    LEFT JOIN LATERAL (
+        SELECT li.image_url
+        FROM listing_images li
+        WHERE li.listing_id = page.listing_id
+        ORDER BY li.display_order, li.created_at
+        LIMIT 1
+    ) cover ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT m.content, m.sender_id, m.created_at
+        FROM messages m
+        WHERE m.conversation_id = page.id
+        ORDER BY m.created_at DESC
+        LIMIT 1
+    ) last_msg ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT COUNT(*)::INTEGER AS unread_count
+        FROM messages m
+        WHERE m.conversation_id = page.id
+          AND m.sender_id <> p_user_id
+          AND m.created_at > COALESCE(
+              CASE WHEN page.participant_1 = p_user_id
+                  THEN page.participant_1_last_read_at
+                  ELSE page.participant_2_last_read_at
+              END,
+              '-infinity'::TIMESTAMPTZ
+          )
+    ) unread ON TRUE
+    ORDER BY page.last_message_at DESC, page.id DESC;
+$$;
+
+SELECT 'Migration 019 complete! Read watermarks ready.' as status;
@@ -0,0 +1,96 @@
+-- ============================================
+-- ONE CONVERSATION PER PARTICIPANT PAIR AND LISTING
+-- Run this in Supabase SQL Editor
+-- ============================================
+-- Requires 019 and PostgreSQL 15+ (NULLS NOT DISTINCT). Conversations are
+-- keyed by the unordered participant pair plus the listing, so looking one
+-- up is a single index probe whichever side started it, and two concurrent
+-- starts can no longer create duplicate threads.
+
+-- Merge existing duplicates into the oldest thread of each key
+CREATE TEMP TABLE conversation_duplicates AS
+SELECT id, FIRST_VALUE(id) OVER (
+    PARTITION BY LEAST(participant_1, participant_2), GREATEST(participant_1, participant_2), listing_id
+    ORDER BY created_at, id
+) AS keep_id
+FROM conversations;
+
+DELETE FROM conversation_duplicates WHERE id = keep_id;
+
+UPDATE messages m SET conversation_id = d.keep_id
+FROM conversation_duplicates d
+WHERE m.conversation_id = d.id;
+
+UPDATE conversations c SET
+    rental_id = COALESCE(c.rental_id, merged.rental_id),
+    last_message_at = GREATEST(c.last_message_at, merged.last_message_at)
+FROM (
+    SELECT d.keep_id, MAX(dup.last_message_at) AS last_message_at,
+           (ARRAY_AGG(dup.rental_id ORDER BY dup.created_at) FILTER (WHERE dup.rental_id IS NOT NULL))[1] AS rental_id
+    FROM conversation_duplicates d
+    JOIN conversations dup ON dup.id = d.id
+    GROUP BY d.keep_id
+) merged
+WHERE c.id = merged.keep_id;
+
+DELETE FROM conversations c
+USING conversation_duplicates d
+WHERE c.id = d.id;
+
+DROP TABLE conversation_duplicates;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_conversations_pair_listing
+    ON conversations (LEAST(participant_1, participant_2), GREATEST(participant_1, participant_2), listing_id)
+    NULLS NOT DISTINCT;
+
+-- Find or create the conversation between two users (about a listing).
+-- Without a listing, any existing thread between the pair is reused.
+CREATE OR REPLACE FUNCTION public.find_or_create_conversation(
+    p_user_id UUID,
+    p_other_user_id UUID,
+    p_listing_id UUID DEFAULT NULL,
+    p_rental_id UUID DEFAULT NULL
+)
+RETURNS TABLE (id UUID)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_id UUID;
+BEGIN
+    SELECT c.id INTO v_id
+    FROM conversations c
+    WHERE LEAST(c.participant_1, c.participant_2) = LEAST(p_user_id, p_other_user_id)
+      AND GREATEST(c.participant_1, c.participant_2) = GREATEST(p_user_id, p_other_user_id)
+      AND (p_listing_id IS NULL OR c.listing_id = p_listing_id)
+    ORDER BY c.listing_id IS NOT NULL, c.last_message_at DESC
+    LIMIT 1;
+
+    IF v_id IS NULL THEN
+        INSERT INTO conversations (participant_1, participant_2, listing_id, rental_id)
+        VALUES (p_user_id, p_other_user_id, p_listing_id, p_rental_id)
+        ON CONFLICT ((LEAST(participant_1, participant_2)), (GREATEST(participant_1, participant_2)), listing_id)
+        DO NOTHING
+        RETURNING conversations.id INTO v_id;
+    END IF;
+
+    -- Lost a race with a concurrent start: use the thread it created
+    IF v_id IS NULL THEN
+        SELECT c.id INTO v_id
+        FROM conversations c
+        WHERE LEAST(c.participant_1, c.participant_2) = LEAST(p_user_id, p_other_user_id)
+          AND GREATEST(c.participant_1, c.participant_2) = GREATEST(p_user_id, p_other_user_id)
+          AND c.listing_id IS NOT DISTINCT FROM p_listing_id;
+    END IF;
+
+    RETURN QUERY SELECT v_id;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.find_or_create_conversation(UUID, UUID, UUID, UUID) TO service_role;
+
+-- The user is passed in by the API, so clients must not call this directly
+REVOKE EXECUTE ON FUNCTION public.find_or_create_conversation(UUID, UUID, UUID, UUID) FROM PUBLIC, anon, authenticated;
+
+SELECT 'Migration 020 complete! Conversation pair index ready.' as status;
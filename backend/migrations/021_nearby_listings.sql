@@ -0,0 +1,128 @@
+-- ============================================
+-- RADIUS SEARCH AND DISTANCE SORT IN THE DATABASE
+-- Run this in Supabase SQL Editor
+-- ============================================
+-- Requires 008 and 010 (PostgreSQL 15+ for security_invoker). The exact
+-- radius check, distance ordering and paging all happen here, so browse
+-- never pulls a capped, unordered set of bounding-box candidates into the
+-- API. The box (computed by the API) still drives
+-- idx_listings_browse_coordinates. Rows come back with their distance_km.
+
+-- Great-circle distance in km (same formula as app.utils.geo)
+CREATE OR REPLACE FUNCTION public.haversine_km(
+    lat1 DOUBLE PRECISION,
+    lon1 DOUBLE PRECISION,
+    lat2 DOUBLE PRECISION,
+    lon2 DOUBLE PRECISION
+)
+RETURNS DOUBLE PRECISION
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+AS $$
+    SELECT 2 * 6371.0 * asin(sqrt(LEAST(1.0,
+        sin(radians(lat2 - lat1) / 2) ^ 2
+        + cos(radians(lat1)) * cos(radians(lat2)) * sin(radians(lon2 - lon1) / 2) ^ 2
+    )));
+$$;
+
+-- Listing rows plus the distance from the search origin. Only the row type
+-- matters: the search functions return it so PostgREST can still embed
+-- images/owner (relationships are inferred through the view) while each row
+-- carries distance_km. Recreate it if listings gains columns.
+DROP FUNCTION IF EXISTS public.nearby_listings(
+    DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION,
+    DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION, BOOLEAN, UUID, DOUBLE PRECISION
+);
+DROP FUNCTION IF EXISTS public.search_listings(TEXT, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION);
+DROP FUNCTION IF EXISTS public.search_listings(TEXT);
+
+CREATE OR REPLACE VIEW public.listing_distances
+WITH (security_invoker = true) AS
+SELECT l.*, NULL::DOUBLE PRECISION AS distance_km
+FROM listings l;
+
+-- Only reached through the functions below
+REVOKE ALL ON public.listing_distances FROM PUBLIC, anon, authenticated;
+
+-- Active, approved listings within a radius, nearest first (or furthest
+-- first with p_descending). Keyset paging on (distance, id): the cursor
+-- listing's distance is recomputed from its row, falling back to
+-- p_cursor_distance if it has since been removed.
+-- PostgREST applies the remaining browse filters (or another order) on top.
+CREATE OR REPLACE FUNCTION public.nearby_listings(
+    p_lat DOUBLE PRECISION,
+    p_lon DOUBLE PRECISION,
+    p_radius_km DOUBLE PRECISION,
+    p_min_lat DOUBLE PRECISION,
+    p_max_lat DOUBLE PRECISION,
+    p_min_lon DOUBLE PRECISION,
+    p_max_lon DOUBLE PRECISION,
+    p_descending BOOLEAN DEFAULT FALSE,
+    p_cursor_id UUID DEFAULT NULL,
+    p_cursor_distance DOUBLE PRECISION DEFAULT NULL
+)
+RETURNS SETOF listing_distances
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+    WITH cursor_row AS (
+        SELECT COALESCE(
+            (SELECT haversine_km(p_lat, p_lon, c.latitude, c.longitude)
+             FROM listings c WHERE c.id = p_cursor_id),
+            p_cursor_distance
+        ) AS distance
+    )
+    SELECT l.*, d.distance
+    FROM listings l
+    CROSS JOIN LATERAL (SELECT haversine_km(p_lat, p_lon, l.latitude, l.longitude) AS distance) d
+    CROSS JOIN cursor_row
+    WHERE l.status = 'active'
+      AND l.is_approved = TRUE
+      AND l.latitude IS NOT NULL
+      AND l.longitude IS NOT NULL
+      AND l.latitude BETWEEN p_min_lat AND p_max_lat
+      AND l.longitude BETWEEN p_min_lon AND p_max_lon
+      AND d.distance <= p_radius_km
+      AND (p_cursor_id IS NULL OR CASE
+          WHEN p_descending THEN (d.distance, l.id) < (cursor_row.distance, p_cursor_id)
+          ELSE (d.distance, l.id) > (cursor_row.distance, p_cursor_id)
+      END)
+    ORDER BY
+        CASE WHEN p_descending THEN d.distance END DESC,
+        CASE WHEN p_descending THEN l.id END DESC,
+        d.distance,
+        l.id;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.nearby_listings(
+    DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION,
+    DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION, BOOLEAN, UUID, DOUBLE PRECISION
+) TO service_role;
+
+-- Ranked search can now be limited to a radius as well
+-- (distance_km is NULL without an origin)
+CREATE OR REPLACE FUNCTION public.search_listings(
+    search_query TEXT,
+    p_lat DOUBLE PRECISION DEFAULT NULL,
+    p_lon DOUBLE PRECISION DEFAULT NULL,
+    p_radius_km DOUBLE PRECISION DEFAULT NULL
+)
+RETURNS SETOF listing_distances
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+    SELECT l.*, haversine_km(p_lat, p_lon, l.latitude, l.longitude)
+    FROM listings l, websearch_to_tsquery('english', search_query) AS q
+    WHERE l.search_vector @@ q
+      AND l.status = 'active'
+      AND l.is_approved = TRUE
+      AND (p_lat IS NULL OR haversine_km(p_lat, p_lon, l.latitude, l.longitude) <= p_radius_km)
+    ORDER BY ts_rank(l.search_vector, q) DESC, l.created_at DESC, l.id DESC;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.search_listings(TEXT, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION) TO service_role;
+
+SELECT 'Migration 021 complete! Nearby listings ready.' as status;
@@ -0,0 +1,48 @@
+-- ============================================
+-- STALE CONTRACT GENERATION RECOVERY
+-- Run this in Supabase SQL Editor
+-- ============================================
+-- Requires 018. Records when a contract was last requested, so the API can
+-- treat a contract that has been 'pending' for too long (worker restarted,
+-- background task lost) as failed and generate it again.
+
+ALTER TABLE rentals ADD COLUMN IF NOT EXISTS contract_requested_at TIMESTAMPTZ;
+
+UPDATE rentals SET contract_requested_at = COALESCE(updated_at, NOW())
+WHERE contract_status = 'pending' AND contract_requested_at IS NULL;
+
+-- Accepting stamps the request time along with the pending status
+CREATE OR REPLACE FUNCTION public.accept_rental(
+    p_rental_id UUID,
+    p_actor_id UUID,
+    p_owner_notes TEXT DEFAULT NULL
+)
+RETURNS SETOF rentals
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    r rentals;
+BEGIN
+    r := lock_rental_for_transition(
+        p_rental_id, p_actor_id, TRUE, 'Only the owner can accept rentals',
+        ARRAY['pending'], 'Cannot accept rental in %s status'
+    );
+
+    UPDATE rentals SET
+        status = 'accepted',
+        owner_notes = p_owner_notes,
+        contract_status = 'pending',
+        contract_requested_at = NOW()
+    WHERE id = p_rental_id
+    RETURNING * INTO r;
+
+    INSERT INTO listing_availability (listing_id, start_date, end_date, reason, rental_id)
+    VALUES (r.listing_id, r.start_date, r.end_date, 'rental', r.id);
+
+    RETURN NEXT r;
+END;
+$$;
+
+SELECT 'Migration 022 complete! Contract request timestamps ready.' as status;
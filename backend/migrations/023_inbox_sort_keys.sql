@@ -0,0 +1,43 @@
+-- ============================================
+-- NON-NULL KEYSET SORT KEYS
+-- Run this in Supabase SQL Editor
+-- ============================================
+-- Keyset cursors carry the last row's sort value; a NULL there cannot be
+-- compared (and the inbox function reads a NULL p_cursor_at as "first
+-- page"), so the columns lists are keyset-paged on must never be NULL.
+
+UPDATE conversations c SET last_message_at = COALESCE(
+    (SELECT MAX(m.created_at) FROM messages m WHERE m.conversation_id = c.id),
+    c.created_at,
+    NOW()
+)
+WHERE c.last_message_at IS NULL;
+
+ALTER TABLE conversations ALTER COLUMN last_message_at SET NOT NULL;
+
+UPDATE listings SET view_count = 0 WHERE view_count IS NULL;
+
+ALTER TABLE listings ALTER COLUMN view_count SET NOT NULL;
+
+-- created_at is the default keyset for every other list
+UPDATE listings SET created_at = NOW() WHERE created_at IS NULL;
+
+ALTER TABLE listings ALTER COLUMN created_at SET NOT NULL;
+
+UPDATE rentals SET created_at = NOW() WHERE created_at IS NULL;
+
+ALTER TABLE rentals ALTER COLUMN created_at SET NOT NULL;
+
+UPDATE reviews SET created_at = NOW() WHERE created_at IS NULL;
+
+ALTER TABLE reviews ALTER COLUMN created_at SET NOT NULL;
+
+UPDATE messages SET created_at = NOW() WHERE created_at IS NULL;
+
+ALTER TABLE messages ALTER COLUMN created_at SET NOT NULL;
+
+UPDATE community_codes SET created_at = NOW() WHERE created_at IS NULL;
+
+ALTER TABLE community_codes ALTER COLUMN created_at SET NOT NULL;
+
+SELECT 'Migration 023 complete! Keyset sort keys are non-null.' as status;
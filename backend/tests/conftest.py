@@ -0,0 +1,63 @@
+"""
+Kloset Kifayah Backend - Test Configuration
+
+Unit tests run without a Supabase project: settings come from placeholder
+environment variables, and the database client is replaced with a fake
+that records queries.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("SUPABASE_URL", "https://test.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon-key")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service-role-key")
+os.environ.setdefault("SUPABASE_JWT_SECRET", "test-jwt-secret-with-at-least-32-bytes")
+
+import pytest
+
+from app.core.config import get_settings
+
+
+@pytest.fixture(autouse=True)
+def fresh_settings():
+    """Re-read settings for every test so monkeypatched env vars apply."""
+    get_settings.cache_clear()
+    yield
+    get_settings.cache_clear()
+
+
+class FakeQuery:
+    """Records PostgREST builder calls and returns canned data on execute()."""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.calls = []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return method
+
+    async def execute(self):
+        self.client.executed.append(self)
+        return self.client.respond(self)
+
+
+class FakePostgrest:
+    """Stand-in for the async admin client; `respond(query)` builds responses."""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.executed = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        query = FakeQuery(self, name)
+        query.calls.append(("rpc", (name, params), {}))
+        return query
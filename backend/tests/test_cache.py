@@ -0,0 +1,152 @@
+"""
+Kloset Kifayah Backend - Response Cache Tests
+"""
+import asyncio
+
+import pytest
+
+from app.core import cache as cache_module
+from app.core.cache import Cache, MemoryCache, cache_key
+
+
+class Clock:
+    """Replaces time.monotonic() in the cache module."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "monotonic", clock)
+    return clock
+
+
+def test_cache_key_is_stable_across_parameter_order():
+    assert cache_key("browse", page=1, category="abaya") == cache_key("browse", category="abaya", page=1)
+    assert cache_key("browse", page=1) != cache_key("browse", page=2)
+    assert cache_key("categories") == "categories"
+
+
+@pytest.mark.asyncio
+async def test_memory_entries_expire_after_ttl(clock):
+    backend = MemoryCache()
+    await backend.set("k", "v", ttl=30, tags=["listing:1"])
+
+    clock.now += 29
+    assert await backend.get("k") == "v"
+
+    clock.now += 1
+    assert await backend.get("k") is None
+    # Expired entries leave the tag index too
+    assert backend._tags == {}
+
+
+@pytest.mark.asyncio
+async def test_invalidate_tags_drops_only_tagged_entries(clock):
+    backend = MemoryCache()
+    await backend.set("detail", "a", 60, tags=["listing:1"])
+    await backend.set("browse", "b", 60, tags=["listing:1", "listing:2"])
+    await backend.set("other", "c", 60, tags=["listing:2"])
+
+    await backend.invalidate_tags(["listing:1"])
+
+    assert await backend.get("detail") is None
+    assert await backend.get("browse") is None
+    assert await backend.get("other") == "c"
+
+
+@pytest.mark.asyncio
+async def test_overwrite_replaces_old_tags(clock):
+    backend = MemoryCache()
+    await backend.set("k", "old", 60, tags=["user:1"])
+    await backend.set("k", "new", 60, tags=["user:2"])
+
+    await backend.invalidate_tags(["user:1"])
+
+    assert await backend.get("k") == "new"
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_evicts_least_recently_used(clock):
+    backend = MemoryCache(max_entries=2)
+    await backend.set("a", "1", 60)
+    await backend.set("b", "2", 60)
+    await backend.get("a")
+    await backend.set("c", "3", 60)
+
+    assert await backend.get("a") == "1"
+    assert await backend.get("b") is None
+    assert await backend.get("c") == "3"
+
+
+@pytest.mark.asyncio
+async def test_non_positive_ttl_is_not_stored(clock):
+    cache = Cache(MemoryCache())
+    await cache.set("k", {"a": 1}, ttl=0)
+
+    assert await cache.get("k") is None
+
+
+@pytest.mark.asyncio
+async def test_get_or_set_coalesces_concurrent_misses(clock):
+    cache = Cache(MemoryCache())
+    calls = 0
+    release = asyncio.Event()
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return {"items": [1, 2]}
+
+    waiters = [asyncio.create_task(cache.get_or_set("k", loader, ttl=60)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == [{"items": [1, 2]}] * 5
+    assert calls == 1
+    assert cache._inflight == {}
+    # Later reads are served from the cache
+    assert await cache.get_or_set("k", loader, ttl=60) == {"items": [1, 2]}
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_get_or_set_failure_reaches_every_waiter_and_is_not_cached(clock):
+    cache = Cache(MemoryCache())
+    release = asyncio.Event()
+
+    async def failing():
+        await release.wait()
+        raise RuntimeError("database down")
+
+    waiters = [asyncio.create_task(cache.get_or_set("k", failing, ttl=60)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    async def loader():
+        return "fresh"
+
+    assert await cache.get_or_set("k", loader, ttl=60) == "fresh"
+
+
+@pytest.mark.asyncio
+async def test_backend_errors_do_not_fail_reads(clock):
+    class BrokenBackend(MemoryCache):
+        async def get(self, key):
+            raise ConnectionError("cache unreachable")
+
+    cache = Cache(BrokenBackend())
+
+    async def loader():
+        return 42
+
+    assert await cache.get_or_set("k", loader, ttl=60) == 42
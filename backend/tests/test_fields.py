@@ -0,0 +1,46 @@
+"""
+Kloset Kifayah Backend - Sparse Fieldset Tests
+"""
+import pytest
+from fastapi import HTTPException
+
+from app.api.fields import LISTING_COLUMNS, columns, sparse_columns
+
+ALLOWED = ("id", "title", "price_per_day", "created_at")
+
+
+def test_columns_joins_names():
+    assert columns(("id", "title")) == "id, title"
+
+
+@pytest.mark.parametrize("fields", [None, ""])
+def test_no_fields_selects_everything_allowed(fields):
+    assert sparse_columns(fields, ALLOWED) == "id, title, price_per_day, created_at"
+
+
+def test_requested_fields_keep_allowed_order():
+    assert sparse_columns("price_per_day,title", ALLOWED) == "id, title, price_per_day"
+
+
+def test_required_columns_are_always_selected():
+    selected = sparse_columns("title", ALLOWED, required=("id", "created_at"))
+
+    assert selected == "id, title, created_at"
+
+
+def test_whitespace_and_duplicates_are_ignored():
+    assert sparse_columns(" title , title,, ", ALLOWED) == "id, title"
+
+
+def test_unknown_fields_are_rejected():
+    with pytest.raises(HTTPException) as exc:
+        sparse_columns("title,password,owner_id", ALLOWED)
+
+    assert exc.value.status_code == 400
+    assert exc.value.detail == "Unknown fields: owner_id, password"
+
+
+def test_embeds_cannot_be_requested():
+    # Only base-table columns; an embed would widen the select
+    with pytest.raises(HTTPException):
+        sparse_columns("owner:profiles(*)", LISTING_COLUMNS)
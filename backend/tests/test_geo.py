@@ -0,0 +1,101 @@
+"""
+Kloset Kifayah Backend - Geo Utility Tests
+"""
+import math
+
+import numpy as np
+import pytest
+
+from app.utils.geo import (
+    EARTH_RADIUS_KM,
+    REGION_CENTERS,
+    bounding_box,
+    get_nearby_regions,
+    haversine_distance,
+    haversine_distances,
+    k_nearest,
+)
+
+TORONTO = REGION_CENTERS["GTA"]
+OTHERS = [REGION_CENTERS[name] for name in ("Ottawa", "Mississauga", "London", "Markham", "Hamilton")]
+LATS = [lat for lat, _ in OTHERS]
+LONS = [lon for _, lon in OTHERS]
+
+
+def test_haversine_distances_match_scalar_version():
+    distances = haversine_distances(*TORONTO, LATS, LONS)
+
+    expected = [haversine_distance(*TORONTO, lat, lon) for lat, lon in OTHERS]
+    np.testing.assert_allclose(distances, expected, rtol=1e-12)
+
+
+def test_haversine_distances_known_values():
+    assert haversine_distances(0.0, 0.0, [0.0], [0.0])[0] == 0.0
+    # A quarter of the equator
+    assert haversine_distances(0.0, 0.0, [0.0], [90.0])[0] == pytest.approx(math.pi * EARTH_RADIUS_KM / 2)
+    # Antipodes stay finite (rounding can push the haversine term past 1)
+    assert haversine_distances(45.0, 10.0, [-45.0], [-170.0])[0] == pytest.approx(math.pi * EARTH_RADIUS_KM)
+
+
+def test_haversine_distances_empty_input():
+    assert haversine_distances(*TORONTO, [], []).shape == (0,)
+
+
+def test_k_nearest_orders_nearest_first():
+    indices, distances = k_nearest(*TORONTO, LATS, LONS, k=3)
+
+    # Mississauga, Markham, Hamilton
+    assert indices.tolist() == [1, 3, 4]
+    assert np.all(np.diff(distances) >= 0)
+
+
+def test_k_nearest_respects_radius():
+    indices, distances = k_nearest(*TORONTO, LATS, LONS, k=10, radius_km=30)
+
+    assert indices.tolist() == [1, 3]
+    assert np.all(distances <= 30)
+
+
+@pytest.mark.parametrize("k, radius_km", [(0, None), (3, 0.001)])
+def test_k_nearest_can_return_nothing(k, radius_km):
+    indices, distances = k_nearest(*TORONTO, LATS, LONS, k=k, radius_km=radius_km)
+
+    assert indices.size == 0
+    assert distances.size == 0
+
+
+def test_k_nearest_breaks_ties_by_input_order():
+    indices, _ = k_nearest(0.0, 0.0, [1.0, -1.0, 1.0, 2.0], [0.0, 0.0, 0.0, 0.0], k=3)
+
+    assert indices.tolist() == [0, 1, 2]
+
+
+@pytest.mark.parametrize("lat, lon, radius_km", [(43.65, -79.38, 25), (60.0, 10.0, 200), (-33.9, 151.2, 5)])
+def test_bounding_box_contains_the_radius(lat, lon, radius_km):
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+
+    # Points on the circle all fall inside the box
+    bearings = np.radians(np.arange(0, 360, 5))
+    angular = radius_km / EARTH_RADIUS_KM
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2 = np.arcsin(np.sin(lat1) * math.cos(angular) + np.cos(lat1) * math.sin(angular) * np.cos(bearings))
+    lon2 = lon1 + np.arctan2(
+        np.sin(bearings) * math.sin(angular) * np.cos(lat1),
+        math.cos(angular) - np.sin(lat1) * np.sin(lat2),
+    )
+    assert np.all(np.degrees(lat2) >= min_lat - 1e-9)
+    assert np.all(np.degrees(lat2) <= max_lat + 1e-9)
+    assert np.all(np.degrees(lon2) >= min_lon - 1e-9)
+    assert np.all(np.degrees(lon2) <= max_lon + 1e-9)
+
+
+def test_bounding_box_near_pole_spans_all_longitudes():
+    min_lat, max_lat, min_lon, max_lon = bounding_box(89.9, 0.0, 50)
+
+    assert max_lat == 90.0
+    assert (min_lon, max_lon) == (-180.0, 180.0)
+    assert min_lat < 89.9
+
+
+def test_get_nearby_regions():
+    assert set(get_nearby_regions(*TORONTO, radius_km=30)) == {"GTA", "Mississauga", "Markham", "Vaughan"}
@@ -0,0 +1,106 @@
+"""
+Kloset Kifayah Backend - Batch Loader Tests
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.api import loaders as loaders_module
+from app.api.loaders import MAX_BATCH_SIZE, BatchLoader
+
+from conftest import FakePostgrest
+
+
+class Database:
+    """Fake admin client serving rows whose id is in the requested batch."""
+
+    def __init__(self, monkeypatch, existing):
+        self.existing = set(existing)
+        self.error = None
+        self.client = FakePostgrest(self.respond)
+        monkeypatch.setattr(loaders_module, "get_supabase_admin_async", lambda: self.client)
+
+    def respond(self, query):
+        if self.error is not None:
+            raise self.error
+        (_, (key, batch), _), = [call for call in query.calls if call[0] == "in_"]
+        return SimpleNamespace(data=[{key: value, "name": f"row {value}"} for value in batch if value in self.existing])
+
+    @property
+    def batches(self):
+        return [call[1][1] for query in self.client.executed for call in query.calls if call[0] == "in_"]
+
+
+@pytest.fixture
+def database(monkeypatch):
+    return Database(monkeypatch, existing=[str(i) for i in range(250)])
+
+
+@pytest.mark.asyncio
+async def test_loads_in_one_tick_share_one_query(database):
+    loader = BatchLoader("profiles", "id, name")
+
+    first, second, missing = await asyncio.gather(loader.load("1"), loader.load(2), loader.load("nope"))
+
+    assert first == {"id": "1", "name": "row 1"}
+    assert second == {"id": "2", "name": "row 2"}
+    assert missing is None
+    assert database.batches == [["1", "2", "nope"]]
+    query = database.client.executed[0]
+    assert query.table == "profiles"
+    assert ("select", ("id, name",), {}) in query.calls
+
+
+@pytest.mark.asyncio
+async def test_repeated_keys_are_deduplicated_and_memoised(database):
+    loader = BatchLoader("profiles")
+
+    rows = await loader.load_many(["1", "1", "2", "1"])
+    assert [row["id"] for row in rows] == ["1", "1", "2", "1"]
+
+    await loader.load("2")
+    assert database.batches == [["1", "2"]]
+
+
+@pytest.mark.asyncio
+async def test_large_batches_are_split(database):
+    loader = BatchLoader("listings")
+
+    rows = await loader.load_many(str(i) for i in range(MAX_BATCH_SIZE * 2 + 1))
+
+    assert all(row is not None for row in rows)
+    assert [len(batch) for batch in database.batches] == [MAX_BATCH_SIZE, MAX_BATCH_SIZE, 1]
+
+
+@pytest.mark.asyncio
+async def test_primed_rows_skip_the_query(database):
+    loader = BatchLoader("profiles")
+    loader.prime({"id": "7", "name": "already fetched"})
+
+    assert await loader.load("7") == {"id": "7", "name": "already fetched"}
+    assert database.batches == []
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_reaches_waiters_and_can_be_retried(database):
+    loader = BatchLoader("profiles")
+    database.error = ConnectionError("database down")
+
+    results = await asyncio.gather(loader.load("1"), loader.load("2"), return_exceptions=True)
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+    database.error = None
+    assert await loader.load("1") == {"id": "1", "name": "row 1"}
+    assert database.batches[-1] == ["1"]
+
+
+@pytest.mark.asyncio
+async def test_loads_in_later_ticks_get_their_own_batch(database):
+    loader = BatchLoader("profiles")
+
+    await loader.load("1")
+    await asyncio.gather(loader.load("2"), loader.load("3"))
+
+    assert database.batches == [["1"], ["2", "3"]]
+    assert loader._tasks == set()
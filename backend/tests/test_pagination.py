@@ -0,0 +1,142 @@
+"""
+Kloset Kifayah Backend - Pagination Tests
+"""
+import pytest
+from fastapi import HTTPException
+
+from app.api.pagination import (
+    MAX_UUID,
+    MIN_UUID,
+    Pagination,
+    decode_cursor,
+    encode_cursor,
+    quote_filter_value,
+)
+
+ROW_ID = "0b6f3b52-6f0c-4c1f-9a55-3c2f0a1d9e11"
+
+
+class RecordingQuery:
+    """Collects the builder calls Pagination.apply() makes."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def method(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return method
+
+
+def test_cursor_round_trip():
+    values = {"s": "created_at", "v": "2024-05-01T10:00:00+00:00", "id": ROW_ID}
+    cursor = encode_cursor(values)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == values
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "bnVsbA", "WzEsMl0"])
+def test_decode_cursor_rejects_malformed(cursor):
+    # Garbage, JSON null and a JSON list are all refused
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+def test_cursor_must_match_sort_column():
+    cursor = encode_cursor({"s": "price_per_day", "v": 10, "id": ROW_ID})
+
+    with pytest.raises(HTTPException) as exc:
+        Pagination(1, 20, cursor=cursor, sort_column="created_at")
+    assert exc.value.status_code == 400
+
+
+def test_cursor_requires_uuid_id():
+    cursor = encode_cursor({"s": "created_at", "v": "2024-05-01", "id": "1 OR 1=1"})
+
+    with pytest.raises(HTTPException):
+        Pagination(1, 20, cursor=cursor)
+
+
+def test_quote_filter_value_escapes_reserved_characters():
+    assert quote_filter_value("2024-05-01T10:00:00+00:00") == '"2024-05-01T10:00:00+00:00"'
+    assert quote_filter_value('a,b"c\\d') == '"a,b\\"c\\\\d"'
+
+
+def test_apply_without_cursor_orders_and_windows():
+    pagination = Pagination(3, 10)
+    query = pagination.apply(RecordingQuery())
+
+    assert query.calls == [
+        ("order", ("created_at",), {"desc": True}),
+        ("order", ("id",), {"desc": True}),
+        ("range", (20, 30), {}),
+    ]
+    assert pagination.include_total is True
+
+
+@pytest.mark.parametrize("descending, op", [(True, "lt"), (False, "gt")])
+def test_apply_with_cursor_uses_keyset_filter(descending, op):
+    value = "2024-05-01T10:00:00+00:00"
+    cursor = encode_cursor({"s": "created_at", "v": value, "id": ROW_ID})
+    pagination = Pagination(1, 10, cursor=cursor, descending=descending)
+    query = pagination.apply(RecordingQuery())
+
+    quoted = quote_filter_value(value)
+    assert query.calls[0] == (
+        "or_",
+        (f"created_at.{op}.{quoted},and(created_at.eq.{quoted},id.{op}.{ROW_ID})",),
+        {},
+    )
+    assert query.calls[-1] == ("range", (0, 10), {})
+    assert pagination.include_total is False
+
+
+def test_seek_without_row_id_skips_ties():
+    newest_first = Pagination(1, 10)
+    newest_first.seek("2024-05-01")
+    assert newest_first.cursor_id == MIN_UUID
+
+    oldest_first = Pagination(1, 10, descending=False)
+    oldest_first.seek("2024-05-01")
+    assert oldest_first.cursor_id == MAX_UUID
+
+
+def test_response_trims_look_ahead_row_and_encodes_next_cursor():
+    rows = [{"id": f"00000000-0000-0000-0000-00000000000{i}", "created_at": f"2024-05-0{i}"} for i in range(1, 4)]
+    pagination = Pagination(1, 2)
+    body = pagination.response(rows, total=7)
+
+    assert body["items"] == rows[:2]
+    assert body["total"] == 7
+    assert decode_cursor(body["next_cursor"]) == {
+        "s": "created_at",
+        "v": "2024-05-02",
+        "id": rows[1]["id"],
+    }
+
+
+def test_response_last_page_has_no_cursor():
+    rows = [{"id": ROW_ID, "created_at": "2024-05-01"}]
+    body = Pagination(1, 2).response(rows, total=1)
+
+    assert body["next_cursor"] is None
+
+
+def test_response_refuses_null_sort_key():
+    rows = [{"id": ROW_ID, "created_at": None}, {"id": MAX_UUID, "created_at": None}]
+
+    with pytest.raises(ValueError):
+        Pagination(1, 1).response(rows)
+
+
+def test_offset_cursor_for_non_keyset_orders():
+    rows = [{"id": str(i)} for i in range(3)]
+    first = Pagination(1, 2, sort_column="relevance", keyset=False)
+    cursor = first.response(rows)["next_cursor"]
+
+    second = Pagination(1, 2, cursor=cursor, sort_column="relevance", keyset=False)
+    assert second.offset == 2
+    assert second.cursor_id is None
@@ -0,0 +1,195 @@
+"""
+Kloset Kifayah Backend - Realtime Broker Tests
+"""
+import asyncio
+
+import pytest
+
+from app.core import realtime as realtime_module
+from app.core.realtime import Broker, ConnectionLimitExceeded, MemoryBackend, RedisBackend
+
+
+def make_broker(**kwargs) -> Broker:
+    return Broker(MemoryBackend(), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_published_events_reach_every_connection_of_the_user():
+    broker = make_broker()
+    phone = await broker.subscribe("alice")
+    laptop = await broker.subscribe("alice")
+    other = await broker.subscribe("bob")
+
+    await broker.publish(["alice"], {"type": "message.new"})
+
+    for subscription in (phone, laptop):
+        event = await subscription.next()
+        assert event["type"] == "message.new"
+        assert event["id"]
+    assert other._queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_event_ids_sort_in_publish_order():
+    broker = make_broker()
+    for index in range(5):
+        await broker.publish(["alice"], {"n": index})
+
+    ids = [event["id"] for event in broker._history["alice"]]
+    assert ids == sorted(ids)
+
+
+@pytest.mark.asyncio
+async def test_replay_returns_events_after_last_id():
+    broker = make_broker()
+    for index in range(4):
+        await broker.publish(["alice"], {"n": index})
+    history = list(broker._history["alice"])
+
+    assert [event["n"] for event in broker.replay("alice", history[1]["id"])] == [2, 3]
+    assert broker.replay("alice", history[-1]["id"]) == []
+
+
+@pytest.mark.asyncio
+async def test_replay_needs_resync_once_the_id_has_been_evicted():
+    broker = make_broker(replay_size=3)
+    for index in range(5):
+        await broker.publish(["alice"], {"n": index})
+
+    first_id = "0-000000"
+    assert broker.replay("alice", first_id) is None
+    assert [event["n"] for event in broker._history["alice"]] == [2, 3, 4]
+    assert broker.replay("nobody", first_id) is None
+
+
+@pytest.mark.asyncio
+async def test_replay_history_keeps_most_recent_users():
+    broker = make_broker(replay_users=2)
+    await broker.publish(["alice"], {"n": 1})
+    await broker.publish(["bob"], {"n": 2})
+    await broker.publish(["alice"], {"n": 3})
+    await broker.publish(["carol"], {"n": 4})
+
+    assert list(broker._history) == ["alice", "carol"]
+
+
+@pytest.mark.asyncio
+async def test_connection_limit_is_per_user():
+    broker = make_broker(max_connections=2)
+    first = await broker.subscribe("alice")
+    await broker.subscribe("alice")
+
+    with pytest.raises(ConnectionLimitExceeded):
+        await broker.subscribe("alice")
+    await broker.subscribe("bob")
+
+    # Closing a connection frees its slot; unsubscribing twice is harmless
+    broker.unsubscribe(first)
+    broker.unsubscribe(first)
+    assert broker.connection_count("alice") == 1
+    await broker.subscribe("alice")
+
+
+@pytest.mark.asyncio
+async def test_concurrent_subscribes_cannot_overshoot_the_limit():
+    broker = make_broker(max_connections=2)
+
+    results = await asyncio.gather(*(broker.subscribe("alice") for _ in range(5)), return_exceptions=True)
+
+    assert sum(not isinstance(result, Exception) for result in results) == 2
+    assert sum(isinstance(result, ConnectionLimitExceeded) for result in results) == 3
+    assert broker.connection_count("alice") == 2
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_closed_when_its_queue_fills():
+    broker = make_broker(max_queue=2)
+    subscription = await broker.subscribe("alice")
+
+    for index in range(3):
+        await broker.publish(["alice"], {"n": index})
+
+    assert subscription.closed
+    assert await subscription.next() is None
+
+
+@pytest.mark.asyncio
+async def test_publish_failures_are_swallowed():
+    class FailingBackend(MemoryBackend):
+        async def publish(self, user_ids, event):
+            raise ConnectionError("redis down")
+
+    broker = Broker(FailingBackend())
+    await broker.publish(["alice"], {"type": "message.new"})
+
+
+@pytest.mark.asyncio
+async def test_close_ends_every_subscription():
+    broker = make_broker()
+    subscriptions = [await broker.subscribe("alice"), await broker.subscribe("bob")]
+
+    await broker.close()
+
+    assert all(subscription.closed for subscription in subscriptions)
+    assert broker.connection_count("alice") == 0
+
+
+class FakePubSub:
+    """Yields the queued messages, then drops the connection."""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.channels = []
+        self.closed = False
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+
+    async def listen(self):
+        for message in self.messages:
+            yield {"data": message}
+        raise ConnectionError("connection reset")
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeRedis:
+    """Hands out a new pubsub connection per (re)subscribe."""
+
+    def __init__(self, connections):
+        self.connections = connections
+        self.opened = []
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        self.opened.append(self.connections.pop(0))
+        return self.opened[-1]
+
+
+@pytest.mark.asyncio
+async def test_redis_listener_skips_bad_messages_and_resubscribes(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+        if len(sleeps) == 3:
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(realtime_module.asyncio, "sleep", fake_sleep)
+
+    # Skip __init__: it only builds the real Redis client
+    backend = RedisBackend.__new__(RedisBackend)
+    backend.channel = "kk:events"
+    backend._client = FakeRedis([FakePubSub(['{"users": ["bob"], "event": {"n": 2}}']), FakePubSub([])])
+
+    delivered = []
+    backend.deliver = lambda user_id, event: delivered.append((user_id, event))
+
+    first = FakePubSub(['{"users": ["alice"], "event": {"n": 1}}', "not json", '{"event": {}}'])
+    with pytest.raises(asyncio.CancelledError):
+        await backend._listen(first)
+
+    assert delivered == [("alice", {"n": 1}), ("bob", {"n": 2})]
+    assert first.closed
+    assert [pubsub.channels for pubsub in backend._client.opened] == [["kk:events"], ["kk:events"]]
+    assert sleeps == [1.0, 1.0, 2.0]
@@ -0,0 +1,182 @@
+"""
+Kloset Kifayah Backend - Token Verification Tests
+"""
+import importlib
+import json
+import time
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi import HTTPException
+
+from app.core.security import RemoteVerificationRequired, decode_token, user_from_claims, verify_token
+
+# app.core re-exports the bearer scheme as `security`, shadowing the module
+security = importlib.import_module("app.core.security")
+
+SECRET = "test-jwt-secret-with-at-least-32-bytes"
+USER_ID = "6f1c2b9e-3d4a-4e5f-8a7b-1c2d3e4f5a6b"
+
+
+def claims(**overrides):
+    now = int(time.time())
+    values = {"sub": USER_ID, "aud": "authenticated", "exp": now + 3600, "email": "a@example.com", "role": "authenticated"}
+    values.update(overrides)
+    return values
+
+
+@pytest.fixture(autouse=True)
+def jwt_secret(monkeypatch):
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", SECRET)
+
+
+@pytest.mark.asyncio
+async def test_hs256_token_is_verified_locally():
+    token = jwt.encode(claims(), SECRET, algorithm="HS256")
+
+    decoded = await decode_token(token)
+
+    assert decoded["sub"] == USER_ID
+    assert user_from_claims(decoded)["email"] == "a@example.com"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("token_claims, key", [
+    (claims(), "wrong-secret-with-at-least-32-bytes!!"),
+    (claims(exp=int(time.time()) - 60), SECRET),
+    (claims(aud="anon"), SECRET),
+    ({k: v for k, v in claims().items() if k != "sub"}, SECRET),
+])
+async def test_invalid_hs256_tokens_are_rejected(token_claims, key):
+    token = jwt.encode(token_claims, key, algorithm="HS256")
+
+    with pytest.raises(jwt.InvalidTokenError):
+        await decode_token(token)
+    with pytest.raises(HTTPException) as exc:
+        await verify_token(token)
+    assert exc.value.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_expiry_leeway_applies():
+    token = jwt.encode(claims(exp=int(time.time()) - 5), SECRET, algorithm="HS256")
+
+    assert (await decode_token(token))["sub"] == USER_ID
+
+
+@pytest.mark.asyncio
+async def test_hs256_without_secret_needs_remote_verification(monkeypatch):
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", "")
+    token = jwt.encode(claims(), SECRET, algorithm="HS256")
+
+    with pytest.raises(RemoteVerificationRequired):
+        await decode_token(token)
+
+
+class Jwks:
+    """Serves a JWKS document for the keys it holds and counts fetches."""
+
+    def __init__(self, monkeypatch):
+        self.keys = {}
+        self.fetches = 0
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(self.handle))
+        monkeypatch.setattr(security, "get_http_client", lambda: self.client)
+        monkeypatch.setattr(security, "_jwks_keys", {})
+        monkeypatch.setattr(security, "_jwks_fetched_at", 0.0)
+
+    def handle(self, request):
+        assert request.url.path == "/auth/v1/.well-known/jwks.json"
+        self.fetches += 1
+        keys = []
+        for kid, private_key in self.keys.items():
+            jwk = json.loads(jwt.algorithms.ECAlgorithm.to_jwk(private_key.public_key()))
+            keys.append({**jwk, "kid": kid, "alg": "ES256", "use": "sig"})
+        return httpx.Response(200, json={"keys": keys})
+
+    def add_key(self, kid):
+        self.keys[kid] = ec.generate_private_key(ec.SECP256R1())
+        return self.keys[kid]
+
+    def token(self, kid, **overrides):
+        return jwt.encode(claims(**overrides), self.keys[kid], algorithm="ES256", headers={"kid": kid})
+
+
+@pytest.fixture
+def jwks(monkeypatch):
+    return Jwks(monkeypatch)
+
+
+@pytest.mark.asyncio
+async def test_es256_token_is_verified_against_cached_jwks(jwks):
+    jwks.add_key("key-1")
+
+    assert (await decode_token(jwks.token("key-1")))["sub"] == USER_ID
+    assert (await decode_token(jwks.token("key-1")))["sub"] == USER_ID
+    assert jwks.fetches == 1
+
+
+@pytest.mark.asyncio
+async def test_rotated_key_triggers_a_refetch(jwks, monkeypatch):
+    jwks.add_key("key-1")
+    await decode_token(jwks.token("key-1"))
+
+    jwks.add_key("key-2")
+    # Past the minimum refresh interval
+    monkeypatch.setattr(security, "_jwks_fetched_at", time.monotonic() - 60)
+
+    assert (await decode_token(jwks.token("key-2")))["sub"] == USER_ID
+    assert jwks.fetches == 2
+
+
+@pytest.mark.asyncio
+async def test_unknown_kid_falls_back_to_remote_verification(jwks, monkeypatch):
+    jwks.add_key("key-1")
+    await decode_token(jwks.token("key-1"))
+    unknown = jwks.add_key("key-3")
+    del jwks.keys["key-3"]
+    token = jwt.encode(claims(), unknown, algorithm="ES256", headers={"kid": "key-3"})
+
+    with pytest.raises(RemoteVerificationRequired):
+        await decode_token(token)
+    # Refetches for unknown kids are rate limited
+    assert jwks.fetches == 1
+
+    async def remote(token):
+        return {"id": USER_ID, "email": "remote@example.com"}
+
+    monkeypatch.setattr(security, "verify_token_remote", remote)
+    assert (await verify_token(token))["email"] == "remote@example.com"
+
+
+@pytest.mark.asyncio
+async def test_jwks_outage_falls_back_to_remote_verification(jwks, monkeypatch):
+    jwks.add_key("key-1")
+    token = jwks.token("key-1")
+
+    def unavailable(request):
+        raise httpx.ConnectError("auth unreachable")
+
+    jwks.client = httpx.AsyncClient(transport=httpx.MockTransport(unavailable))
+
+    with pytest.raises(RemoteVerificationRequired):
+        await decode_token(token)
+
+
+@pytest.mark.asyncio
+async def test_tampered_es256_token_is_rejected(jwks):
+    jwks.add_key("key-1")
+    header, payload, signature = jwks.token("key-1").split(".")
+    forged = jwt.encode(claims(sub="someone-else"), SECRET, algorithm="HS256").split(".")[1]
+
+    with pytest.raises(jwt.InvalidSignatureError):
+        await decode_token(f"{header}.{forged}.{signature}")
+
+
+@pytest.mark.asyncio
+async def test_unsupported_algorithm_needs_remote_verification():
+    token = jwt.encode(claims(), None, algorithm="none")
+
+    with pytest.raises(RemoteVerificationRequired):
+        await decode_token(token)
@@ -0,0 +1,125 @@
+"""
+Kloset Kifayah Backend - View Counter Tests
+"""
+import pytest
+
+from app.services import view_counter as view_counter_module
+from app.services.view_counter import MAX_BACKOFF_INTERVALS, ViewCounter
+
+from conftest import FakePostgrest
+
+
+class Database:
+    """Fake admin client whose RPC calls succeed or fail on demand."""
+
+    def __init__(self, monkeypatch):
+        self.failing = False
+        self.client = FakePostgrest(self.respond)
+        monkeypatch.setattr(view_counter_module, "get_supabase_admin_async", lambda: self.client)
+
+    def respond(self, query):
+        if self.failing:
+            raise ConnectionError("database down")
+        return None
+
+    @property
+    def calls(self):
+        return [query.calls[0][1] for query in self.client.executed]
+
+
+@pytest.fixture
+def database(monkeypatch):
+    return Database(monkeypatch)
+
+
+@pytest.mark.asyncio
+async def test_flush_sends_one_batched_increment(database):
+    counter = ViewCounter()
+    for listing_id in ["b", "a", "b", "c", "b"]:
+        counter.record(listing_id)
+
+    assert await counter.flush() == 3
+    assert database.calls == [("increment_view_counts", {
+        "p_listing_ids": ["a", "b", "c"],
+        "p_counts": [1, 3, 1],
+    })]
+    # Nothing left to write
+    assert await counter.flush() == 0
+    assert len(database.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_counts_for_retry(database):
+    counter = ViewCounter()
+    counter.record("a")
+    database.failing = True
+
+    with pytest.raises(ConnectionError):
+        await counter.flush()
+    counter.record("a")
+
+    database.failing = False
+    await counter.flush()
+    assert database.calls[-1][1] == {"p_listing_ids": ["a"], "p_counts": [2]}
+
+
+@pytest.mark.asyncio
+async def test_flush_delay_backs_off_while_failing(database):
+    counter = ViewCounter(flush_interval=10.0)
+    database.failing = True
+
+    delays = []
+    for _ in range(8):
+        counter.record("a")
+        with pytest.raises(ConnectionError):
+            await counter.flush()
+        delays.append(counter.next_flush_delay)
+
+    assert delays == [20.0, 40.0, 80.0, 160.0, 320.0, 320.0, 320.0, 320.0]
+    assert delays[-1] == 10.0 * MAX_BACKOFF_INTERVALS
+
+    database.failing = False
+    await counter.flush()
+    assert counter.next_flush_delay == 10.0
+
+
+def test_early_flush_only_while_healthy():
+    counter = ViewCounter(max_pending=2)
+    counter.record("a")
+    assert not counter._wakeup.is_set()
+    counter.record("b")
+    assert counter._wakeup.is_set()
+
+    counter._wakeup.clear()
+    counter._failures = 1
+    counter.record("c")
+    assert not counter._wakeup.is_set()
+
+
+def test_buffer_cap_drops_views_of_new_listings():
+    counter = ViewCounter(max_pending=2, max_buffered=3)
+    for listing_id in ["a", "b", "c", "d", "d", "a"]:
+        counter.record(listing_id)
+
+    assert dict(counter._pending) == {"a": 2, "b": 1, "c": 1}
+    assert counter.dropped == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_trims_to_most_viewed(database):
+    counter = ViewCounter(max_pending=10, max_buffered=2)
+    for listing_id in ["a", "a", "a", "b"]:
+        counter.record(listing_id)
+
+    def record_during_flush(query):
+        # Views that arrive while the RPC is in flight join the retry
+        counter.record("c")
+        counter.record("c")
+        raise ConnectionError("database down")
+
+    database.client.respond = record_during_flush
+    with pytest.raises(ConnectionError):
+        await counter.flush()
+
+    assert dict(counter._pending) == {"a": 3, "c": 2}
+    assert counter.dropped == 1